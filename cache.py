@@ -0,0 +1,190 @@
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+Logger = logging.getLogger(__name__)
+
+# Query parameters that do not change the page (matched with fnmatch)
+TRACKING_PARAMS = ("utm_*", "ref", "ref_", "pf_rd_*", "pd_rd_*", "_encoding", "qid", "sr")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url:str, ignored_params:Sequence[str]=TRACKING_PARAMS) -> str:
+    """
+    Canonical form of url for cache keys: lowercase scheme and host, no default port, no fragment,
+    no tracking parameters (nor Amazon's trailing /ref=... path segment) and sorted query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/ref=[^/]*$", "", parts.path) or "/"
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not any(fnmatch.fnmatchcase(name, pattern) for pattern in ignored_params))
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+class CacheEntry(NamedTuple):
+    url: str
+    body: str
+    stored_at: float
+    expires_at: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    def validators(self) -> dict:
+        """Conditional request headers to revalidate the entry with."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class ResponseCache:
+    """
+    On disk cache of page bodies, keyed on the normalized url (see normalize_url), zlib compressed in a SQLite file.
+    rules: (url pattern, ttl in seconds) pairs matched in order with fnmatch against the normalized url;
+           the first match wins and default_ttl applies otherwise. A ttl of None keeps the url out of the cache,
+           a ttl of 0 stores it but always revalidates it.
+    max_bytes: size budget of the compressed bodies; the least recently used entries are evicted beyond it
+    offline: serve every cached entry as fresh whatever its age (e.g. to re-run an extraction during development)
+    Stale entries stay in the cache with their ETag/Last-Modified, so the HTTP path can revalidate them.
+    Safe to use from several threads.
+        methods:
+            ttl(url)
+            get(url)
+            put(url, body, etag, last_modified)
+            refresh(url)
+            evict()
+            close()
+    """
+    def __init__(self, path:str, rules:Sequence[Tuple[str, Optional[float]]]=(), default_ttl:Optional[float]=15 * 60,
+                 max_bytes:int=256 * 1024 * 1024, offline:bool=False, ignored_params:Sequence[str]=TRACKING_PARAMS):
+        self.path = path
+        self.rules = list(rules)
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.ignored_params = ignored_params
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _key(self, url:str) -> Tuple[str, str]:
+        normalized = normalize_url(url, self.ignored_params)
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest(), normalized
+
+    def ttl(self, url:str) -> Optional[float]:
+        normalized = normalize_url(url, self.ignored_params)
+        for pattern, ttl in self.rules:
+            if fnmatch.fnmatchcase(normalized, pattern):
+                return ttl
+        return self.default_ttl
+
+    def get(self, url:str) -> Optional[CacheEntry]:
+        """Returns the cached entry for url (fresh or stale), or None."""
+        key, normalized = self._key(url)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, stored_at, expires_at, etag, last_modified FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            body, stored_at, expires_at, etag, last_modified = row
+            fresh = self.offline or now < expires_at
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return CacheEntry(normalized, zlib.decompress(body).decode("utf-8"), stored_at, expires_at, etag, last_modified, fresh)
+
+    def put(self, url:str, body:str, etag:str=None, last_modified:str=None):
+        ttl = self.ttl(url)
+        if ttl is None:
+            return
+        key, normalized = self._key(url)
+        compressed = zlib.compress(body.encode("utf-8"), 6)
+        now = time.time()
+        with self.lock:
+            previous = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, url, body, size, stored_at, expires_at, accessed_at, etag, last_modified) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, normalized, compressed, len(compressed), now, now + ttl, now, etag, last_modified))
+            self.total_bytes += len(compressed) - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url:str):
+        """Marks the entry as fresh again for its ttl, after the server answered 304 Not Modified."""
+        ttl = self.ttl(url)
+        key, _ = self._key(url)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE responses SET stored_at = ?, expires_at = ? WHERE key = ?", (now, now + (ttl or 0), key))
+
+    def _evict(self):
+        evicted = []
+        cursor = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+        for key, size in cursor:
+            if self.total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        cursor.close()
+        with self.connection:
+            self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        Logger.info(f"Response cache evicted {len(evicted)} entries, {self.total_bytes} bytes left")
+
+    def evict(self):
+        """Drops least recently used entries until the cache fits in max_bytes."""
+        with self.lock:
+            self._evict()
+
+    def close(self):
+        if self.connection is not None:
+            Logger.info(f"Response cache closed after {self.hits} hits and {self.misses} misses")
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
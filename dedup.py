@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+Logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Bloom filter sized for capacity keys at the given false positive rate.
+    A negative answer is always right, so it can answer "never seen" without touching the backend.
+    """
+    def __init__(self, capacity:int=1_000_000, error_rate:float=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.lock = threading.Lock()
+
+    def _positions(self, key:str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key:str):
+        positions = list(self._positions(key))
+        with self.lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key:str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class DedupStore:
+    """
+    Remembers which keys (deal ids, labels) were already seen, optionally with a value (e.g. a fingerprint).
+    ttl: seconds after which a key counts as unseen again, so the deal gets refreshed (None: never)
+    bloom: put a BloomFilter in front of the backend for fast negative lookups
+    Backends implement _get(key), _put(key, value, seen_at), _keys() and prune().
+        methods:
+            get(key)
+            seen(key)
+            add(key, value)
+            check_and_add(key, value)
+    """
+    def __init__(self, ttl:float=None, bloom:bool=True, bloom_capacity:int=1_000_000):
+        self.ttl = ttl
+        self.bloom_capacity = bloom_capacity
+        self.bloom = BloomFilter(bloom_capacity) if bloom else None
+
+    def _load_bloom(self):
+        if self.bloom is not None:
+            # Filled before it replaces the current one, which get() keeps reading meanwhile
+            bloom = BloomFilter(self.bloom_capacity)
+            for key in self._keys():
+                bloom.add(key)
+            self.bloom = bloom
+
+    def _expired(self, seen_at:float) -> bool:
+        return self.ttl is not None and time.time() - seen_at > self.ttl
+
+    def get(self, key:str) -> Optional[Tuple[object, float]]:
+        """Returns (value, seen_at) if key was seen and has not expired, otherwise None."""
+        if self.bloom is not None and key not in self.bloom:
+            return None
+        entry = self._get(key)
+        if entry is None or self._expired(entry[1]):
+            return None
+        return entry
+
+    def seen(self, key:str) -> bool:
+        return self.get(key) is not None
+
+    def add(self, key:str, value=None):
+        self._put(key, value, time.time())
+        if self.bloom is not None:
+            self.bloom.add(key)
+
+    def check_and_add(self, key:str, value=None) -> bool:
+        """Returns True if key was already seen (and not expired); otherwise records it and returns False."""
+        if self.seen(key):
+            return True
+        self.add(key, value)
+        return False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class MemoryDedupStore(DedupStore):
+    """In memory backend, bounded to the max_entries most recently added keys."""
+    def __init__(self, max_entries:int=100_000, ttl:float=None):
+        super().__init__(ttl=ttl, bloom=False)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def _get(self, key):
+        return self.entries.get(key)
+
+    def _put(self, key, value, seen_at):
+        self.entries[key] = (value, seen_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _keys(self) -> Iterable[str]:
+        return self.entries.keys()
+
+    def prune(self):
+        while self.entries and self._expired(next(iter(self.entries.values()))[1]):
+            self.entries.popitem(last=False)
+
+class SQLiteDedupStore(DedupStore):
+    """
+    On disk backend, so seen keys survive restarts.
+    Expired keys, and the oldest ones beyond max_entries, are deleted every prune_every additions
+    (and on open), and the Bloom filter is rebuilt from the remaining keys.
+    The store can be used from several threads (e.g. Pipeline workers).
+    """
+    def __init__(self, path:str, ttl:float=None, max_entries:int=None, prune_every:int=1000, bloom:bool=True, bloom_capacity:int=1_000_000):
+        super().__init__(ttl=ttl, bloom=bloom, bloom_capacity=bloom_capacity)
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self.added = 0
+        self.lock = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, value TEXT, seen_at REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS seen_seen_at ON seen (seen_at)")
+        self.prune()
+
+    def _get(self, key):
+        with self.lock:
+            return self.connection.execute("SELECT value, seen_at FROM seen WHERE key = ?", (key,)).fetchone()
+
+    def _put(self, key, value, seen_at):
+        with self.lock:
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO seen (key, value, seen_at) VALUES (?, ?, ?)", (key, value, seen_at))
+            self.added += 1
+            if self.added % self.prune_every == 0:
+                self.prune()
+
+    def _keys(self) -> Iterable[str]:
+        return (row[0] for row in self.connection.execute("SELECT key FROM seen"))
+
+    def prune(self):
+        with self.lock:
+            with self.connection:
+                if self.ttl is not None:
+                    self.connection.execute("DELETE FROM seen WHERE seen_at < ?", (time.time() - self.ttl,))
+                if self.max_entries is not None:
+                    self.connection.execute("DELETE FROM seen WHERE key NOT IN (SELECT key FROM seen ORDER BY seen_at DESC LIMIT ?)", (self.max_entries,))
+            self._load_bloom()
+            Logger.info(f"Dedup store pruned, {self.connection.execute('SELECT COUNT(*) FROM seen').fetchone()[0]} keys left")
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+def fingerprint(record:dict, fields:Sequence[str], normalize:Dict[str, Callable]=None) -> str:
+    """Short hash of the given fields of a record, each passed through normalize[field] first if set."""
+    normalize = normalize or {}
+    values = [record.get(field) for field in fields]
+    values = [normalize[field](value) if field in normalize and isinstance(value, str) else value for field, value in zip(fields, values)]
+    payload = json.dumps(values, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+
+class ChangeTracker:
+    """
+    Decides which cards need their detail page fetched again.
+    A card needs a refresh when its key was never marked, when the fingerprint of its fields changed
+    since the last mark, or when the mark is older than the store ttl (freshness TTL).
+    Call mark(key, record) once the details were fetched, so failed fetches are retried on the next poll.
+    normalize: field -> function applied to its value before fingerprinting, for values that change on every
+               load without the deal changing (e.g. {"link": cache.normalize_url} for links with ref= parameters)
+    """
+    def __init__(self, store:DedupStore, fields:Sequence[str], normalize:Dict[str, Callable]=None):
+        self.store = store
+        self.fields = fields
+        self.normalize = normalize or {}
+
+    def needs_refresh(self, key:str, record:dict) -> bool:
+        entry = self.store.get(key)
+        return entry is None or entry[0] != fingerprint(record, self.fields, self.normalize)
+
+    def mark(self, key:str, record:dict):
+        self.store.add(key, fingerprint(record, self.fields, self.normalize))
@@ -0,0 +1,341 @@
+import atexit
+import copy
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Sequence, Tuple
+
+import requests
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.options import Options
+
+Logger = logging.getLogger(__name__)
+
+# Chrome for Testing (Chrome 115 and later) and the chromedriver storage used before it
+CFT_BASE_URL = "https://googlechromelabs.github.io/chrome-for-testing"
+LEGACY_BASE_URL = "https://chromedriver.storage.googleapis.com"
+MANIFEST_NAME = "latest-patch-versions-per-build-with-downloads.json"
+FIRST_CFT_MAJOR = 115
+
+LEGACY_PLATFORMS = {"linux64": "linux64", "mac-x64": "mac64", "mac-arm64": "mac_arm64", "win32": "win32", "win64": "win32"}
+
+CHROME_BINARIES = {
+    "linux": ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"],
+    "darwin": [
+        "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+        "/Applications/Chromium.app/Contents/MacOS/Chromium",
+    ],
+}
+
+VERSION_PATTERN = re.compile(r"(\d+)\.(\d+)\.(\d+)\.(\d+)")
+
+def platform_name() -> str:
+    """Chrome for Testing name of the running platform (linux64, mac-x64, mac-arm64, win32, win64)."""
+    machine = platform.machine().lower()
+    if sys.platform.startswith("win"):
+        return "win64" if machine in ("amd64", "x86_64", "arm64") else "win32"
+    if sys.platform == "darwin":
+        return "mac-arm64" if machine == "arm64" else "mac-x64"
+    return "linux64"
+
+def build_of(version:str) -> str:
+    """The major.minor.build part of a Chrome version; a chromedriver for a build works with all its patches."""
+    return ".".join(version.split(".")[:3])
+
+class DriverManager:
+    """
+    Finds a chromedriver matching the installed Chrome and starts drivers with it.
+    Everything is cached under cache_dir, so a warm start does no network request and runs no subprocess:
+        state.json      Chrome version probe (valid while the Chrome binary is unchanged, or probe_ttl seconds
+                        when there is no binary to check, e.g. the Windows registry probe),
+                        the manifest ETag and the index of installed drivers per Chrome build and platform
+        manifest.json   Chrome for Testing manifest, revalidated after manifest_ttl seconds
+        blobs/<sha256>/ chromedriver binaries, stored by the hash of their content
+    base_url and legacy_base_url point at the download servers, so a local stand-in server can replace them.
+    chrome_version skips the probe (e.g. when Chrome runs elsewhere).
+    start(options, standby=True) also starts a second driver with the same options in the background,
+    which the next start with equal options gets right away (restarts and recycles skip the cold start).
+    Standby drivers need options without a fixed --user-data-dir, which two browsers cannot share.
+        methods:
+            chrome_version()
+            driver_path()
+            start(options, standby)
+            prewarm(options)
+            close()
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_dir:str=None, base_url:str=CFT_BASE_URL, legacy_base_url:str=LEGACY_BASE_URL,
+                 platform:str=None, chrome_version:str=None, chrome_binaries:Sequence[str]=None,
+                 manifest_ttl:float=24 * 60 * 60, probe_ttl:float=60 * 60, timeout:float=30):
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrome")
+        self.base_url = base_url.rstrip("/")
+        self.legacy_base_url = legacy_base_url.rstrip("/")
+        self.platform = platform or platform_name()
+        self.fixed_chrome_version = chrome_version
+        self.chrome_binaries = chrome_binaries
+        self.manifest_ttl = manifest_ttl
+        self.probe_ttl = probe_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.lock = threading.RLock()
+        self.standby = []
+        self.executor = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.state = self._load_json(self._path("state.json")) or {}
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls) -> "DriverManager":
+        """The manager used by scrapers that were not given one."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.cache_dir, *parts)
+
+    def _load_json(self, path:str):
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_json(self, path:str, data):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    def _save_state(self):
+        self._save_json(self._path("state.json"), self.state)
+
+    # Chrome version
+
+    def _run(self, command:list) -> str:
+        try:
+            return subprocess.run(command, capture_output=True, text=True, timeout=self.timeout).stdout
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    def _chrome_binary(self, binary:str=None) -> Optional[str]:
+        candidates = [binary] if binary else self.chrome_binaries or CHROME_BINARIES.get(sys.platform, CHROME_BINARIES["linux"])
+        for candidate in candidates:
+            path = shutil.which(candidate) or (candidate if os.path.isfile(candidate) else None)
+            if path is not None:
+                return os.path.realpath(path)
+        return None
+
+    def _probe(self, binary:Optional[str]) -> Optional[str]:
+        if binary is not None:
+            match = VERSION_PATTERN.search(self._run([binary, "--version"]))
+            return match.group(0) if match else None
+        if sys.platform.startswith("win"):
+            for root in ("HKEY_CURRENT_USER", "HKEY_LOCAL_MACHINE"):
+                match = VERSION_PATTERN.search(self._run(["reg", "query", rf"{root}\Software\Google\Chrome\BLBeacon", "/v", "version"]))
+                if match:
+                    return match.group(0)
+        return None
+
+    def chrome_version(self, binary:str=None) -> str:
+        """Version of the installed Chrome (binary: a Chrome executable to use instead of the default ones)."""
+        if self.fixed_chrome_version is not None:
+            return self.fixed_chrome_version
+        with self.lock:
+            binary = None if sys.platform.startswith("win") and not binary else self._chrome_binary(binary)
+            mtime = os.path.getmtime(binary) if binary is not None else None
+            probe = self.state.get("probe")
+            if probe and probe["binary"] == binary and (
+                    probe["mtime"] == mtime if binary is not None else time.time() - probe["probed_at"] < self.probe_ttl):
+                return probe["version"]
+
+            version = self._probe(binary)
+            if version is None:
+                raise ChromeNotFoundError("Chrome not installed, please install Chrome and retry")
+            Logger.info(f"Chrome version detected: {version}")
+            self.state["probe"] = {"binary": binary, "mtime": mtime, "version": version, "probed_at": time.time()}
+            self._save_state()
+            return version
+
+    def forget_probe(self):
+        """Drops the cached Chrome version, e.g. after Chrome updated itself."""
+        with self.lock:
+            self.state.pop("probe", None)
+            self._save_state()
+
+    # Driver versions
+
+    def _manifest(self, force:bool=False) -> dict:
+        path = self._path("manifest.json")
+        manifest = self._load_json(path)
+        fetched_at = self.state.get("manifest_fetched_at", 0)
+        if manifest is not None and not force and time.time() - fetched_at < self.manifest_ttl:
+            return manifest
+
+        headers = {"If-None-Match": self.state["manifest_etag"]} if manifest is not None and "manifest_etag" in self.state else {}
+        try:
+            response = self.session.get(f"{self.base_url}/{MANIFEST_NAME}", headers=headers, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+                manifest = response.json()
+                self._save_json(path, manifest)
+                self.state["manifest_etag"] = response.headers.get("ETag")
+                Logger.info(f"Chrome for Testing manifest updated ({len(manifest.get('builds', {}))} builds)")
+            self.state["manifest_fetched_at"] = time.time()
+            self._save_state()
+        except (requests.RequestException, ValueError) as e:
+            if manifest is None:
+                raise DriverDownloadError(f"Chrome for Testing manifest not available: {e}")
+            Logger.warning(f"Using a stale Chrome for Testing manifest: {e}")
+        return manifest
+
+    def _resolve(self, build:str) -> Tuple[str, str]:
+        """Returns the (chromedriver version, download url) for a Chrome build."""
+        if int(build.split(".")[0]) < FIRST_CFT_MAJOR:
+            response = self.session.get(f"{self.legacy_base_url}/LATEST_RELEASE_{build}", timeout=self.timeout)
+            response.raise_for_status()
+            version = response.text.strip()
+            return version, f"{self.legacy_base_url}/{version}/chromedriver_{LEGACY_PLATFORMS[self.platform]}.zip"
+
+        entry = self._manifest().get("builds", {}).get(build)
+        if entry is None:
+            entry = self._manifest(force=True).get("builds", {}).get(build)
+        if entry is None:
+            raise DriverDownloadError(f"No chromedriver published for Chrome {build}")
+        for download in entry.get("downloads", {}).get("chromedriver", []):
+            if download["platform"] == self.platform:
+                return entry["version"], download["url"]
+        raise DriverDownloadError(f"No chromedriver {entry['version']} for {self.platform}")
+
+    # Binary cache
+
+    def _blob_path(self, digest:str) -> str:
+        name = "chromedriver.exe" if self.platform.startswith("win") else "chromedriver"
+        return self._path("blobs", digest, name)
+
+    def _install(self, url:str) -> Tuple[str, int]:
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            members = [name for name in archive.namelist() if os.path.basename(name) in ("chromedriver", "chromedriver.exe")]
+            if not members:
+                raise DriverDownloadError(f"No chromedriver in {url}")
+            data = archive.read(members[0])
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.chmod(temporary, 0o755)
+            os.replace(temporary, path)
+        return digest, len(data)
+
+    def driver_path(self, binary:str=None) -> str:
+        """Path of a chromedriver for the installed Chrome, downloaded only when not in the cache yet."""
+        with self.lock:
+            build = build_of(self.chrome_version(binary))
+            key = f"{build}/{self.platform}"
+            entry = self.state.get("drivers", {}).get(key)
+            if entry is not None:
+                path = self._blob_path(entry["sha256"])
+                if os.path.isfile(path) and os.path.getsize(path) == entry["size"]:
+                    return path
+                Logger.warning(f"Cached chromedriver for {key} is missing or damaged, downloading it again")
+
+            version, url = self._resolve(build)
+            Logger.info(f"Downloading chromedriver {version} from {url}")
+            digest, size = self._install(url)
+            self.state.setdefault("drivers", {})[key] = {"version": version, "sha256": digest, "size": size}
+            self._save_state()
+            Logger.info(f"Chromedriver {version} cached as {digest[:12]}")
+            return self._blob_path(digest)
+
+    # Drivers
+
+    def _launch(self, options:Options) -> webdriver.Chrome:
+        binary = options.binary_location or None
+        try:
+            return webdriver.Chrome(executable_path=self.driver_path(binary), options=options)
+        except SessionNotCreatedException as e:
+            # Usually Chrome updated itself since the probe: probe again and retry once with a matching driver
+            Logger.info(f"Driver session not created, probing Chrome again: {e.msg}")
+            self.forget_probe()
+            return webdriver.Chrome(executable_path=self.driver_path(binary), options=options)
+
+    def _options_key(self, options:Options) -> str:
+        return json.dumps(options.to_capabilities(), sort_keys=True, default=str)
+
+    def prewarm(self, options:Options) -> Future:
+        """Starts a standby driver with options in the background."""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="driver-standby")
+            future = self.executor.submit(self._launch, copy.deepcopy(options))
+            self.standby.append((self._options_key(options), future))
+            return future
+
+    def _take_standby(self, options:Options) -> Optional[webdriver.Chrome]:
+        key = self._options_key(options)
+        with self.lock:
+            for i, (standby_key, future) in enumerate(self.standby):
+                if standby_key == key:
+                    del self.standby[i]
+                    break
+            else:
+                return None
+        try:
+            return future.result()
+        except Exception as e:
+            Logger.warning(f"Standby driver failed to start: {e}")
+            return None
+
+    def start(self, options:Options, standby:bool=False) -> webdriver.Chrome:
+        """Returns a started driver, the standby one for these options if there is one."""
+        driver = self._take_standby(options)
+        if driver is None:
+            driver = self._launch(options)
+        else:
+            Logger.info("Using the standby driver")
+        if standby:
+            self.prewarm(options)
+        return driver
+
+    def close(self):
+        """Quits the standby drivers."""
+        with self.lock:
+            standby, self.standby = self.standby, []
+            executor, self.executor = self.executor, None
+        for _, future in standby:
+            try:
+                future.result().quit()
+            except Exception:
+                pass
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class ChromeNotFoundError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+class DriverDownloadError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,167 @@
+import re
+from typing import Dict, List, Optional
+
+from bs4.element import Tag
+
+# Runs the schema in the page: arguments are the container selector (or null) and a list of [name, selector, attribute]
+# Without a container the page is the only one: like the soup root in ExtractionSchema.extract, its own fields
+# read the text of the root element and have no attributes (the document node itself has a null textContent)
+EXTRACT_SCRIPT = """
+var containerSelector = arguments[0], fields = arguments[1];
+var containers = containerSelector ? Array.prototype.slice.call(document.querySelectorAll(containerSelector)) : [document.documentElement];
+return containers.map(function (container) {
+    return fields.map(function (field) {
+        var node = field[1] ? container.querySelector(field[1]) : container;
+        if (!node || !field[1] && !containerSelector && field[2]) {
+            return null;
+        }
+        return field[2] ? node.getAttribute(field[2]) : node.textContent;
+    });
+});
+"""
+
+_COMPOUND = re.compile(r'^([A-Za-z][\w-]*|\*)?((?:[.#][\w-]+|\[[\w-]+(?:=(?:"[^"]*"|\'[^\']*\'|[^\]]*))?\])*)$')
+_PART = re.compile(r'([.#])([\w-]+)|\[([\w-]+)(?:=("[^"]*"|\'[^\']*\'|[^\]]*))?\]')
+
+class Selector:
+    """
+    Small CSS selector subset, matched against BeautifulSoup tags without walking the tree.
+    Supported: tag names, .class, #id, [attr], [attr=value] and the descendant combinator (space),
+    e.g. "div.DealCardDynamic-module__card a[href]".
+    The same string is valid CSS, so it can also be handed to document.querySelector.
+    """
+    def __init__(self, selector:str):
+        self.selector = selector
+        self.compounds = tuple(self._compile(part) for part in selector.split())
+        if not self.compounds:
+            raise ValueError("Empty selector")
+
+    @staticmethod
+    def _compile(compound:str):
+        match = _COMPOUND.match(compound)
+        if match is None:
+            raise ValueError(f"Unsupported selector: {compound}")
+        tag = match.group(1) if match.group(1) != "*" else None
+        classes, attrs = [], []
+        for prefix, name, attr, value in _PART.findall(match.group(2)):
+            if prefix == ".":
+                classes.append(name)
+            elif prefix == "#":
+                attrs.append(("id", name))
+            else:
+                attrs.append((attr, value.strip("'\"") if value else None))
+        return tag, tuple(classes), tuple(attrs)
+
+    @staticmethod
+    def _matches_compound(node:Tag, compound) -> bool:
+        tag, classes, attrs = compound
+        if tag is not None and node.name != tag:
+            return False
+        if classes:
+            node_classes = node.get("class") or []
+            if isinstance(node_classes, str):
+                node_classes = node_classes.split()
+            if any(_class not in node_classes for _class in classes):
+                return False
+        for key, value in attrs:
+            if not node.has_attr(key):
+                return False
+            if value is not None and attribute_value(node, key) != value:
+                return False
+        return True
+
+    def matches(self, node:Tag) -> bool:
+        if not self._matches_compound(node, self.compounds[-1]):
+            return False
+        ancestor = node.parent
+        for compound in reversed(self.compounds[:-1]):
+            while ancestor is not None and not self._matches_compound(ancestor, compound):
+                ancestor = ancestor.parent
+            if ancestor is None:
+                return False
+            ancestor = ancestor.parent
+        return True
+
+    def __repr__(self):
+        return f"Selector({self.selector!r})"
+
+class Field:
+    """
+    One value of an extracted record.
+    selector: where to look, relative to the container (None means the container itself)
+    attribute: attribute to read from the first matching element (None means its text)
+    default: value used when nothing matches
+    """
+    def __init__(self, selector:Optional[str]=None, attribute:Optional[str]=None, default=None):
+        self.selector = Selector(selector) if selector else None
+        self.attribute = attribute
+        self.default = default
+
+    def value(self, node:Tag):
+        if self.attribute is None:
+            return node.text
+        if not node.has_attr(self.attribute):
+            return self.default
+        return attribute_value(node, self.attribute)
+
+class ExtractionSchema:
+    """
+    Compiled extraction schema: a container selector and a set of named fields.
+    extract(root) walks the tree once and returns one record (dict) per container, in document order.
+    The subtree of a container is not descended any further once all of its fields are resolved.
+    Without a container, the root itself is the only container (e.g. a product detail page).
+    """
+    def __init__(self, fields:Dict[str, Field], container:Optional[str]=None):
+        self.fields = fields
+        self.container = Selector(container) if container else None
+        self._own_fields = [(name, field) for name, field in fields.items() if field.selector is None]
+        self._nested_fields = [(name, field) for name, field in fields.items() if field.selector is not None]
+
+    def _open(self, node:Tag) -> dict:
+        return {name: field.value(node) for name, field in self._own_fields}
+
+    def _finish(self, record:dict) -> dict:
+        return {name: record[name] if name in record else field.default for name, field in self.fields.items()}
+
+    def script_arguments(self) -> list:
+        """Arguments for EXTRACT_SCRIPT, to run the schema in the browser with a single execute_script."""
+        container = self.container.selector if self.container else None
+        return [container, [[name, field.selector.selector if field.selector else None, field.attribute] for name, field in self.fields.items()]]
+
+    def from_script(self, rows:list) -> List[dict]:
+        """Builds the records from the rows returned by EXTRACT_SCRIPT, filling in defaults."""
+        return [{name: field.default if value is None else value for (name, field), value in zip(self.fields.items(), row)} for row in rows]
+
+    def extract(self, root:Tag) -> List[dict]:
+        records = []
+        if self.container is None:
+            record = self._open(root)
+            records.append(record)
+        else:
+            record = None
+
+        stack = [(child, record) for child in reversed(tag_children(root))]
+        while stack:
+            node, record = stack.pop()
+            if record is None:
+                if self.container.matches(node):
+                    record = self._open(node)
+                    records.append(record)
+            else:
+                for name, field in self._nested_fields:
+                    if name not in record and field.selector.matches(node):
+                        record[name] = field.value(node)
+            if record is not None and len(record) == len(self.fields):
+                continue
+            stack.extend((child, record) for child in reversed(tag_children(node)))
+
+        return [self._finish(record) for record in records]
+
+def tag_children(node:Tag) -> List[Tag]:
+    return [child for child in node.contents if isinstance(child, Tag)]
+
+def attribute_value(node:Tag, key:str) -> str:
+    value = node[key]
+    if isinstance(value, list):
+        return " ".join(value)
+    return value
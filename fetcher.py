@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import ResponseCache
+
+Logger = logging.getLogger(__name__)
+
+class HttpFetcher:
+    """
+    Plain HTTP fetch path for pages that do not need a browser, over a pooled keep-alive session.
+    Responses that look JS-gated or incomplete are rejected (get returns None),
+    so the caller can fall back to the browser.
+    With a ResponseCache, fresh cached pages are returned without a request, stale ones are revalidated
+    with their ETag/Last-Modified and complete responses are stored.
+        methods:
+            sync_cookies(cookies)
+            get(url, required)
+            looks_complete(response, required)
+    """
+    gated_markers = ("/errors/validateCaptcha", "api-services-support@amazon.com")
+
+    def __init__(self, user_agent:str=None, pool_size:int=10, timeout:float=10, min_length:int=2048, cache:ResponseCache=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.min_length = min_length
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "it-IT,it;q=0.9,en;q=0.8",
+        })
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent.replace("HeadlessChrome", "Chrome")
+
+    def sync_cookies(self, cookies:Iterable[dict]):
+        """Copies cookies in the selenium get_cookies() format into the session."""
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+
+    def looks_complete(self, response:requests.Response, required:Iterable[str]=()) -> bool:
+        if response.status_code != 200:
+            return False
+        if "html" not in response.headers.get("Content-Type", ""):
+            return False
+        text = response.text
+        if len(text) < self.min_length:
+            return False
+        if any(marker in text for marker in self.gated_markers):
+            return False
+        return all(marker in text for marker in required)
+
+    def get(self, url:str, required:Iterable[str]=()) -> Optional[str]:
+        """
+        Returns the page source, or None if the request failed or the response looks JS-gated or incomplete.
+        required: substrings that a complete page must contain (e.g. the id of the element to scrape)
+        """
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and entry.fresh and all(marker in entry.body for marker in required):
+            return entry.body
+
+        try:
+            response = self.session.get(url, headers=entry.validators() if entry is not None else None, timeout=self.timeout)
+        except requests.RequestException as e:
+            Logger.info(f"HTTP fetch of {url} failed: {e}")
+            return None
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(url)
+            # Not modified, but the cached page may be one that lacks the required markers
+            return entry.body if all(marker in entry.body for marker in required) else None
+        if not self.looks_complete(response, required):
+            Logger.info(f"HTTP fetch of {url} incomplete (status {response.status_code})")
+            return None
+        if self.cache is not None:
+            self.cache.put(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.text
+
+class TokenBucket:
+    """
+    Asyncio token bucket: allows rate acquisitions per second on average, with bursts of up to burst.
+    """
+    def __init__(self, rate:float, burst:int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ConcurrentFetcher:
+    """
+    Runs work(item) for many independent items concurrently and streams the results back as they complete.
+    work runs in a thread pool (e.g. an HttpFetcher.get, parse and extract) and returns the record,
+    or None if the page could not be used; exceptions are retried with jittered exponential backoff, a None is not.
+    concurrency: maximum number of items in flight
+    rate, burst: token bucket applied per host (taken from url(item))
+    retries: retries after the first attempt
+    backoff: base delay in seconds, doubled at each retry and multiplied by a random factor in [0.5, 1.5)
+    Results are (item, record, error) tuples; record is None and error is set when work returned None or every attempt failed.
+    """
+    def __init__(self, work:Callable, url:Callable=lambda item: item, concurrency:int=8, rate:float=4, burst:int=4, retries:int=2, backoff:float=0.5):
+        self.work = work
+        self.url = url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+
+    async def _run_one(self, item, semaphore, buckets, executor):
+        loop = asyncio.get_running_loop()
+        host = urlsplit(self.url(item)).netloc
+        if host not in buckets:
+            buckets[host] = TokenBucket(self.rate, self.burst)
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            async with semaphore:
+                await buckets[host].acquire()
+                try:
+                    record = await loop.run_in_executor(executor, self.work, item)
+                except Exception as e:
+                    error = e
+                else:
+                    if record is None:
+                        # The page was fetched but is incomplete or gated: retrying would get the same page
+                        return item, None, ValueError(f"No record for {self.url(item)}")
+                    return item, record, None
+            Logger.info(f"Attempt {attempt + 1} for {self.url(item)} failed: {error}")
+        return item, None, error
+
+    async def stream(self, items:Iterable):
+        """Async generator of (item, record, error) tuples, in completion order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        buckets = {}
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            tasks = [asyncio.ensure_future(self._run_one(item, semaphore, buckets, executor)) for item in items]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def iter_records(self, items:Iterable):
+        """Synchronous version of stream, for callers outside of an event loop."""
+        loop = asyncio.new_event_loop()
+        results = self.stream(items)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
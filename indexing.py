@@ -0,0 +1,211 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+import Levenshtein
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+try:
+    from rapidfuzz.distance import Levenshtein as RapidLevenshtein
+    from rapidfuzz.process import cdist
+except ImportError:
+    cdist = None
+
+class SoupIndex:
+    """
+    Inverted index over a parsed page, built once per soup.
+    Class tokens, ids and data-*/aria-* attributes are mapped to the document-order positions
+    of the elements that carry them, so lookups become set intersections instead of full-tree scans.
+    Every element also keeps the position of its last descendant, so a lookup can be scoped to
+    any element of the tree (e.g. the one kept by filter_elements(keep_soup=True)) with a bisect.
+    Filters on attributes that are not indexed are applied on the (already narrowed) candidates.
+    """
+    indexed_prefixes = ("data-", "aria-")
+
+    def __init__(self, soup:BeautifulSoup):
+        self.root = soup
+        self.elements: List[Tag] = []
+        self.ends: List[int] = []
+        self.classes: Dict[str, List[int]] = defaultdict(list)
+        self.attributes: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        self._positions: Dict[int, int] = {}
+        self._sets = {}
+        self._vocabularies = {}
+        self._similar = {}
+        self._build()
+
+    def _build(self):
+        open_elements = []
+        for position, element in enumerate(self.root.find_all()):
+            while open_elements and self.elements[open_elements[-1]] is not element.parent:
+                self.ends[open_elements.pop()] = position - 1
+            open_elements.append(position)
+
+            self.elements.append(element)
+            self.ends.append(position)
+            self._positions[id(element)] = position
+
+            for key, value in element.attrs.items():
+                if key == "class":
+                    for token in (value if isinstance(value, list) else value.split()):
+                        self.classes[token].append(position)
+                elif isinstance(value, str) and (key == "id" or key.startswith(self.indexed_prefixes)):
+                    self.attributes[key][value].append(position)
+
+        for position in open_elements:
+            self.ends[position] = len(self.elements) - 1
+
+    def _scope_range(self, scope):
+        if scope is self.root:
+            return 0, len(self.elements)
+        position = self._positions.get(id(scope))
+        if position is None or self.elements[position] is not scope:
+            return None
+        return position + 1, self.ends[position] + 1
+
+    def _posting(self, key, value) -> Optional[List[int]]:
+        if not isinstance(value, str):
+            return None
+        if key == "class":
+            return self.classes.get(value, [])
+        if key == "id" or key.startswith(self.indexed_prefixes):
+            return self.attributes[key].get(value, []) if key in self.attributes else []
+        return None
+
+    def _posting_set(self, key, value, posting):
+        cache_key = (key, value)
+        if cache_key not in self._sets:
+            self._sets[cache_key] = set(posting)
+        return self._sets[cache_key]
+
+    def _vocabulary(self, key) -> Optional[Dict[int, List[str]]]:
+        """Distinct values of an indexed attribute, grouped by length."""
+        if key not in self._vocabularies:
+            if key == "class":
+                postings = self.classes
+            elif key == "id" or key.startswith(self.indexed_prefixes):
+                postings = self.attributes.get(key, {})
+            else:
+                return None
+            vocabulary = defaultdict(list)
+            for token in postings:
+                if token:
+                    vocabulary[len(token)].append(token)
+            self._vocabularies[key] = vocabulary
+        return self._vocabularies[key]
+
+    def _similar_positions(self, key, value:str, threshold:float) -> Optional[Set[int]]:
+        """
+        Positions of the elements whose value for key is within threshold (Levenshtein distance / token length).
+        Since the distance is at least the length difference, only tokens whose length lies in
+        [len(value) / (1 + threshold), len(value) / (1 - threshold)] are compared, all in one batch.
+        """
+        cache_key = (key, value, threshold)
+        if cache_key in self._similar:
+            return self._similar[cache_key]
+        vocabulary = self._vocabulary(key)
+        if vocabulary is None or not isinstance(value, str):
+            return None
+
+        min_length = len(value) / (1 + threshold)
+        max_length = len(value) / (1 - threshold) if threshold < 1 else float("inf")
+        candidates = [token for length, tokens in vocabulary.items() if min_length <= length <= max_length for token in tokens]
+        if cdist is not None and candidates:
+            distances = cdist([value], candidates, scorer=RapidLevenshtein.distance)[0]
+        else:
+            distances = [Levenshtein.distance(value, token) for token in candidates]
+
+        postings = self.classes if key == "class" else self.attributes[key]
+        positions = set()
+        for token, distance in zip(candidates, distances):
+            if distance / len(token) <= threshold:
+                positions.update(postings[token])
+        self._similar[cache_key] = positions
+        return positions
+
+    def find_similar(self, scope, filters:dict, threshold:float) -> List[Tag]:
+        """
+        Same as find_all, but values only need to be similar (see _similar_positions):
+        "class" matches if any class token is similar, any other key if the whole value is.
+        """
+        scope_range = self._scope_range(scope)
+        if scope_range is None:
+            return [element for element in scope.find_all() if all(similar(element, key, value, threshold) for key, value in filters.items())]
+        start, stop = scope_range
+
+        candidates = None
+        unindexed = {}
+        for key, value in filters.items():
+            positions = self._similar_positions(key, value, threshold)
+            if positions is None:
+                unindexed[key] = value
+            elif candidates is None:
+                candidates = {position for position in positions if start <= position < stop}
+            else:
+                candidates &= positions
+
+        if candidates is None:
+            elements = self.elements[start:stop]
+        else:
+            elements = [self.elements[position] for position in sorted(candidates)]
+
+        if unindexed:
+            elements = [element for element in elements if all(similar(element, key, value, threshold) for key, value in unindexed.items())]
+        return elements
+
+    def find_all(self, scope, filters:dict) -> List[Tag]:
+        """
+        Returns the descendants of scope matching every filter, in document order.
+        filters maps attribute names (already normalized, e.g. "class", "data-deal-id") to values;
+        "class" matches a single class token, any other key matches the attribute value exactly.
+        Scopes outside of the indexed tree fall back to a linear scan.
+        """
+        scope_range = self._scope_range(scope)
+        if scope_range is None:
+            return [element for element in scope.find_all() if all(matches(element, key, value) for key, value in filters.items())]
+        start, stop = scope_range
+
+        postings = []
+        unindexed = {}
+        for key, value in filters.items():
+            posting = self._posting(key, value)
+            if posting is None:
+                unindexed[key] = value
+            else:
+                postings.append((key, value, posting))
+
+        if postings:
+            postings.sort(key=lambda item: len(item[2]))
+            _, _, smallest = postings[0]
+            candidates = smallest[bisect_left(smallest, start):bisect_right(smallest, stop - 1)]
+            for key, value, posting in postings[1:]:
+                if not candidates:
+                    break
+                posting_set = self._posting_set(key, value, posting)
+                candidates = [position for position in candidates if position in posting_set]
+            elements = [self.elements[position] for position in candidates]
+        else:
+            elements = self.elements[start:stop]
+
+        if unindexed:
+            elements = [element for element in elements if all(matches(element, key, value) for key, value in unindexed.items())]
+        return elements
+
+def matches(element:Tag, key:str, value) -> bool:
+    if not element.has_attr(key):
+        return False
+    if key == "class":
+        classes = element[key]
+        return value in (classes if isinstance(classes, list) else classes.split())
+    return element[key] == value
+
+def similar(element:Tag, key:str, value:str, threshold:float) -> bool:
+    if not element.has_attr(key):
+        return False
+    if key == "class":
+        classes = element[key]
+        tokens = classes if isinstance(classes, list) else classes.split()
+    else:
+        tokens = [element[key]] if isinstance(element[key], str) else []
+    return any(Levenshtein.distance(value, token) / len(token) <= threshold for token in tokens if token)
@@ -1,139 +1,186 @@
+import argparse
+import os
+import threading
 import time
 from scraper import WebScraper, WebScraperUser
+from extraction import ExtractionSchema, Field
+from cache import ResponseCache, normalize_url
+from dedup import ChangeTracker, SQLiteDedupStore
+from fetcher import ConcurrentFetcher
+from parallel import ParallelExtractor
+from pipeline import Pipeline
+from normalize import log_failures, normalize_records
+from replay import RecordingWebScraper, ReplayWebScraper
 from utils import log
+from waits import all_of, dom_quiescent, network_idle
 
-def run(scraper: WebScraper):
-    def navigate_to_page(x):
-        deals_link = "https://www.amazon.it/deals?deals-widget=%257B%2522version%2522%253A1%252C%2522viewIndex%2522%253A0%252C%2522presetId%2522%253A%2522deals-collection-lightning-deals%2522%252C%2522dealType%2522%253A%2522LIGHTNING_DEAL%2522%252C%2522sorting%2522%253A%2522BY_DISCOUNT_ASCENDING%2522%257D"
-        scraper.navigate_to(deals_link)
+DEAL_CARD_SCHEMA = ExtractionSchema(
+    container=".DealCardDynamic-module__card_byn3MbtqkJHcIi783X3tE",
+    fields={
+        "label": Field(attribute="aria-label", default="NaN"),
+        "deal_id": Field(attribute="data-deal-id"),
+        "percentage": Field(".BadgeAutomatedLabel-module__badgeAutomatedLabel_2Teem9LTaUlj6gBh5R45wd", default="NaN"),
+        "text": Field(".DealMessaging-module__dealMessaging_1EIwT6BUaB6vCKvPVEbAEV", default="NaN"),
+        "link": Field(".DealLink-module__dealLink_3v4tPYOP4qJj9bdiy0xAT", attribute="href", default="NaN"),
+    })
 
-        for _ in range(x):
-            _, elements = scraper.filter_elements(_class="a-last", get_web_elements=True)
-            scraper.click_button(elements[0])
-            time.sleep(1)
-        scraper.reset_soup()
+DEAL_DETAILS_SCHEMA = ExtractionSchema(
+    fields={
+        "rating": Field("#acrCustomerReviewText.a-size-base", default="NaN"),
+        "price": Field(".reinventPricePriceToPayMargin span", default="NaN"),
+    })
 
+# Listing pages, when they are parsed (recording and replaying), are parsed down to the cards and the buttons
+LISTING_SCOPE = (DEAL_CARD_SCHEMA.container.selector, ".a-last", "#sp-cc-rejectall-link")
 
-    def get_deals_divs():
-        items, _ = scraper.filter_elements(
-            _class="DealCardDynamic-module__card_byn3MbtqkJHcIi783X3tE")
-        return items
+# Product pages are reused for a few minutes, listings are always loaded again
+CACHE_RULES = [("*/deals*", None), ("*/dp/*", 5 * 60)]
 
-    def get_deal_data(div):
-        label = div.get('aria-label', "NaN")
-        try:
-            data_deal_id = div.attrs['data-deal-id']
-            if data_deal_id in ids:
-                already_visited = True
-            else:
-                already_visited = False
-                ids.add(data_deal_id)
-            scraper.filter_elements(keep_soup=True, data_deal_id=data_deal_id)
-        except:
-            return {
-                "label":label,
-                "percentage":"NaN",
-                "text":"NaN",
-                "link": "NaN",
-                "already_visited": already_visited
-                }
-        
-        soup, _ = scraper.filter_elements(_class="DealLink-module__dealLink_3v4tPYOP4qJj9bdiy0xAT")
-        try:
-            link = soup[0].attrs['href']
-        except:
-            link = "NaN"
-
-        soup, _ = scraper.filter_elements(_class="BadgeAutomatedLabel-module__badgeAutomatedLabel_2Teem9LTaUlj6gBh5R45wd")
-        try:
-            percentage = soup[0].text
-        except:
-            percentage = "NaN"
-
-        soup, _ = scraper.filter_elements(_class="DealMessaging-module__dealMessaging_1EIwT6BUaB6vCKvPVEbAEV")
-        try:
-            text = soup[0].text
-        except:
-            text = "NaN"
-
-        scraper.reset_soup()
-        return {
-            "label":label,
-            "percentage":percentage,
-            "text":text,
-            "link": link,
-            "already_visited": already_visited
-            }
+# The next page is loaded once its requests are done and the cards stopped changing
+PAGE_LOADED = all_of(network_idle(300), dom_quiescent(300))
 
-    def get_deal_data_2(link):
-        try:
-            scraper.navigate_to(link)
-        except:
-            return {
-                "rating":"NaN",
-                "price":"NaN"
-                }
-        
-        soup, _ = scraper.filter_elements(id="acrCustomerReviewText", _class="a-size-base")
-        try:
-            rating = soup[0].text
-        except:
-            rating = "NaN"
-
-        soup, _ = scraper.filter_elements(_class="reinventPricePriceToPayMargin")
-        try:
-            price = soup[0].snap.text
-        except:
-            price = "NaN"
-
-        return {
-            "rating":rating,
-            "price":price
-            }
-
-    def gather_enhanced_data(i):
-        navigate_to_page(i)
-
-        if i == 0:
-            # Accept cookies
-            _, elements = scraper.filter_elements(id="sp-cc-rejectall-link", get_web_elements=True)
-            scraper.click_button(elements[0])
-
-        divs = get_deals_divs()
-        # scraper.save(f"divs{i}.txt", [str(div) for div in divs])
-
-        items = [get_deal_data(div) for div in divs]
-        # scraper.save(f"items{i}.txt", items)
+def run(scraper: WebScraper):
+    deals_link = "https://www.amazon.it/deals?deals-widget=%257B%2522version%2522%253A1%252C%2522viewIndex%2522%253A0%252C%2522presetId%2522%253A%2522deals-collection-lightning-deals%2522%252C%2522dealType%2522%253A%2522LIGHTNING_DEAL%2522%252C%2522sorting%2522%253A%2522BY_DISCOUNT_ASCENDING%2522%257D"
 
-        enhanced_items = [item | get_deal_data_2(item['link']) for item in items]
-        scraper.save(f"enhanced_items{i}.txt", enhanced_items)
+    def next_page():
+        scraper.click_button(scraper.find_web_elements(".a-last")[0], wait=PAGE_LOADED)
 
+    # Keeps the listing position between iterations, so page i+1 is one click away from page i.
+    # The cards are extracted in the browser, so the listing pages are not parsed
+    pages = scraper.paginator(deals_link, next_page, only=LISTING_SCOPE, parse=False)
+
+    def navigate_to_page(x):
+        pages.go_to(x)
 
-    total_t = time.time()
-    delta_t = None
-    i = 0
-    max_failed = 3
-    ids = set()
 
-    while True:
-        if max_failed == 0:
-            log("MAX FAILED REACHED")
-            break
+    def get_deals_data():
+        items = scraper.extract(DEAL_CARD_SCHEMA, in_browser=True)
+        for item in items:
+            item["already_visited"] = item["deal_id"] is not None and seen.seen(item["deal_id"])
+        return items
 
-        if delta_t is None or time.strftime("%M:%S", time.gmtime(time.time() - delta_t)) == '00:10':
-            log(f"ITERATION {i+1} |{'-'*100}")
+    def get_deal_data_2(link):
+        # In its own tab, so the listing stays on the page the paginator left it on
+        with browser, scraper.new_tab():
             try:
-                gather_enhanced_data(i)
+                scraper.fetch(link, required=("productTitle",))
+            except:
+                return {}
+            return scraper.extract(DEAL_DETAILS_SCHEMA)[0]
+
+    def get_deals_data_2(cards):
+        """
+        Returns (item, details) for each (item, changed) card: the detail pages of the changed ones are
+        fetched concurrently over HTTP first, the ones that need the browser are then visited one by one.
+        Unchanged cards get no details, so only their card fields are saved.
+        """
+        items = [item for item, changed in cards if changed]
+        with browser:
+            http_fetcher = scraper.http_fetcher()
+        def get_details(item):
+            html = http_fetcher.get(item['link'], required=("productTitle",))
+            if html is None:
+                return None
+            # Parsed in a worker process while this thread goes on fetching
+            return extractor.submit(html)
+
+        fetcher = ConcurrentFetcher(work=get_details, url=lambda item: item['link'])
+        with_link = [item for item in items if item['link'].startswith("http")]
+        without_link = [item for item in items if not item['link'].startswith("http")]
+        pairs = []
+        failed = []
+        for item, details, error in fetcher.iter_records(with_link):
+            if error is not None:
+                failed.append(item)
+                continue
+            try:
+                pairs.append((item, details.result()[0]))
             except Exception as e:
-                max_failed -= 1
-                log(f"FAILED! ERROR: {e}")
+                # A page the worker could not parse is read again through the browser
+                log(f"\tError while extracting {item['link']}: {e}")
+                failed.append(item)
+        # The browser only takes over once every HTTP fetch is done, so it never holds them up
+        for item in failed + without_link:
+            pairs.append((item, get_deal_data_2(item['link'])))
+        pairs.extend((item, {}) for item, changed in cards if not changed)
+        return pairs
+
+    def normalize_deals(pairs):
+        # The prices, discounts and ratings of the whole page are parsed as columns
+        items = [item for item, _ in pairs]
+        details = [details for _, details in pairs]
+        cards, enhanced = normalize_records(items), normalize_records(details)
+        log_failures(cards, items)
+        log_failures(enhanced, details, labels=[item["label"] for item in items])
+        return items, cards.batch.merge(enhanced.batch)
+
+    def gather_cards(i):
+        log(f"ITERATION {i+1} |{'-'*100}")
+        with browser:
+            navigate_to_page(i)
+
+            if i == 0:
+                # Accept cookies
+                scraper.click_button(scraper.find_web_elements("#sp-cc-rejectall-link")[0])
+
+            items = get_deals_data()
+        # scraper.save(f"items{i}.txt", items)
 
-            log(f"\tDelta Time elapsed: {time.strftime('%H:%M:%S', time.gmtime(time.time() - (delta_t or total_t)))}\
-                \tTotal time elapsed: {time.strftime('%H:%M:%S', time.gmtime(time.time() - total_t))}")
-            delta_t = time.time()
+        # Only deals whose card changed (or whose details are too old) get their detail page fetched,
+        # the others are still saved with their card fields, so the store sees them as live
+        cards = [(item, item["deal_id"] is None or tracker.needs_refresh(item["deal_id"], item)) for item in items]
+        log(f"\t{sum(changed for _, changed in cards)} of {len(items)} deals changed")
+        return cards
+
+    def save_enhanced_data(page):
+        items, batch = page
+        for item, enhanced_item in zip(items, batch):
+            sink.write(enhanced_item)
+            scraper.save(elements=enhanced_item, sink=store)
+            if item["deal_id"] is not None and (enhanced_item.rating is not None or enhanced_item.price is not None):
+                tracker.mark(item["deal_id"], item)
+
+    def iterations():
+        # A listing page every 10 seconds at most, while the previous ones are still being detailed and saved;
+        # a replay is not throttled, it runs at parse speed
+        interval = 0 if isinstance(scraper, ReplayWebScraper) else 10
+        i = 0
+        while pipeline.failed["cards"] < max_failed:
+            started = time.time()
+            yield i
             i += 1
-        time.sleep(0.8)
+            time.sleep(max(0, interval - (time.time() - started)))
+        log("MAX FAILED REACHED")
+
+    # The browser is shared by the cards stage and the browser fallback of the details stage
+    browser = threading.Lock()
+    max_failed = 3
+    pipeline = Pipeline(queue_size=2) \
+        .stage("cards", gather_cards) \
+        .stage("details", get_deals_data_2) \
+        .stage("normalize", normalize_deals) \
+        .stage("save", save_enhanced_data)
+
+    with scraper.open_sink("enhanced_items") as sink, scraper.open_store("deals.db") as store, \
+            SQLiteDedupStore(os.path.join("scraped", "seen.db"), ttl=24 * 60 * 60) as seen, \
+            ParallelExtractor(DEAL_DETAILS_SCHEMA, backend=scraper.parser.backend) as extractor:
+        tracker = ChangeTracker(seen, fields=("label", "percentage", "text", "link"), normalize={"link": normalize_url})
+        pipeline.run(iterations())
         
 
 if __name__ == "__main__":
-    user = WebScraperUser(run=run, headless=True, log_level=2)
+    parser = argparse.ArgumentParser(description="Scrapes the Amazon lightning deals")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="ARCHIVE", help="record the pages read into a replay archive")
+    mode.add_argument("--replay", metavar="ARCHIVE", help="serve the pages from a replay archive, without a browser")
+    parser.add_argument("--delays", action="store_true", help="with --replay, wait the recorded load time of each page")
+    arguments = parser.parse_args()
+
+    options = {}
+    if arguments.record:
+        options = {"scraper_class": RecordingWebScraper, "record": arguments.record}
+    elif arguments.replay:
+        options = {"scraper_class": ReplayWebScraper, "replay": arguments.replay, "delays": arguments.delays}
+
+    with ResponseCache(os.path.join("scraped", "cache.db"), rules=CACHE_RULES) as cache:
+        user = WebScraperUser(run=run, headless=True, log_level=2, resources="extraction-only", cache=cache, **options)
@@ -0,0 +1,201 @@
+import logging
+import re
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from records import (ALIASES, FIELDS, NUMERIC_COLUMNS, DealBatch, _missing, parse_count, parse_flag, parse_percentage,
+                     parse_price, parse_text)
+
+Logger = logging.getLogger(__name__)
+
+# Longer strings are parsed one at a time, so one odd value does not widen the character matrix of the whole batch
+MAX_WIDTH = 64
+# Up to this many digits the mantissa is an exact float64, so dividing it by a power of ten rounds like float();
+# longer numbers are parsed one at a time
+MAX_DIGITS = 15
+
+DOT, COMMA, PERCENT = ord("."), ord(","), ord("%")
+# Thousands separators besides "." and ",": apostrophe, no-break space, narrow no-break space
+GROUP_SEPARATORS = (ord("'"), 0xa0, 0x202f)
+# The characters \s matches in the patterns of records.py (none is above U+3000)
+SPACES = tuple(code for code in range(0x3001) if chr(code).isspace())
+POWERS = 10 ** np.arange(MAX_DIGITS + 1, dtype=np.int64)
+# \d also matches the digits of other scripts, which only the scalar parsers handle
+OTHER_DIGIT = re.compile(r"(?![0-9])\d")
+
+class NumberColumn(NamedTuple):
+    values: np.ndarray  # float64, 0 where not valid
+    valid: np.ndarray  # bool
+    failed: np.ndarray  # indexes of the rows with a value that holds no number
+
+class Normalized(NamedTuple):
+    batch: DealBatch
+    failed: Dict[str, List[int]]  # field -> indexes of the records whose value could not be parsed
+
+def _shift(mask:np.ndarray, offset:int) -> np.ndarray:
+    """mask[:, j + offset] at column j (False past the end)."""
+    shifted = np.zeros_like(mask)
+    shifted[:, :-offset] = mask[:, offset:]
+    return shifted
+
+def _any_of(codes:np.ndarray, characters) -> np.ndarray:
+    return np.isin(codes, characters)
+
+def _at(mask:np.ndarray, index:np.ndarray) -> np.ndarray:
+    """mask[row, index[row]] of each row (False where index is negative)."""
+    return np.take_along_axis(mask, np.maximum(index, 0)[:, None], axis=1)[:, 0] & (index >= 0)
+
+def _count(mask:np.ndarray) -> np.ndarray:
+    return np.count_nonzero(mask, axis=1)
+
+def _last(mask:np.ndarray, width:int) -> np.ndarray:
+    """Index of the last True of each row, -1 if none."""
+    return np.where(mask.any(axis=1), width - 1 - np.argmax(mask[:, ::-1], axis=1), -1)
+
+def _parse_codes(codes:np.ndarray, percentage:bool):
+    """
+    Parses the number of each row of a (rows, width) matrix of code points as records.parse_price does
+    (the first match of NUMBER_PATTERN) or, with percentage, as records.parse_percentage does (the first match
+    of PERCENTAGE_PATTERN), converted with the rules of records.number_value.
+    Returns (values, ok, retry): the rows of retry are left to the scalar parser (a percentage whose first "%"
+    has no number before it but that has more "%", or more than MAX_DIGITS digits).
+    """
+    rows, width = codes.shape
+    positions = np.arange(width)
+    digit = (codes >= ord("0")) & (codes <= ord("9"))
+    dot = codes == DOT
+    comma = codes == COMMA
+    space = _any_of(codes, SPACES)
+
+    if percentage:
+        # (\d+(?:[.,]\d+)?)\s*% : no match can span a "%", so the first one ends at the first "%" if any does
+        percent = codes == PERCENT
+        first_percent = np.where(percent.any(axis=1), np.argmax(percent, axis=1), -1)
+        # The last character before the "%" and its spaces is the last digit of the number
+        end = _last((positions < first_percent[:, None]) & ~space, width)
+        ok = _at(digit, end)
+        # The digits ending there and, after a "." or "," preceded by a digit, the digits before it
+        start = _last(~digit & (positions < end[:, None]), width) + 1
+        separated = _at(dot | comma, start - 1) & _at(digit, start - 2)
+        start = np.where(separated, _last(~digit & (positions < (start - 2)[:, None]), width) + 1, start)
+        token = (positions >= start[:, None]) & (positions <= end[:, None])
+        retry = ~ok & (_count(percent) > 1)
+    else:
+        # Spaces only separate thousands: before exactly three digits
+        grouping = space & _shift(digit, 1) & _shift(digit, 2) & _shift(digit, 3) & ~_shift(digit, 4)
+        allowed = digit | dot | comma | _any_of(codes, GROUP_SEPARATORS) | grouping
+        start = np.argmax(digit, axis=1)
+        after = positions >= start[:, None]
+        stop = after & ~allowed
+        stop_at = np.where(stop.any(axis=1), np.argmax(stop, axis=1), width)
+        run = after & (positions < stop_at[:, None])
+        # Trailing separators are not part of the number
+        end = _last(digit & run, width)
+        token = run & (positions <= end[:, None])
+        ok = digit.any(axis=1)
+        retry = np.zeros(rows, dtype=bool)
+
+    digits = digit & token
+    dots, commas = dot & token, comma & token
+    dot_count, comma_count = _count(dots), _count(commas)
+    last_dot, last_comma = _last(dots, width), _last(commas, width)
+    digits_after_dot = _count(digits & (positions > last_dot[:, None]))
+    both = (dot_count > 0) & (comma_count > 0)
+    decimal = np.select(
+        [both, comma_count == 1, (dot_count == 1) & (digits_after_dot != 3)],
+        [np.maximum(last_dot, last_comma), last_comma, last_dot], -1)
+    # With both separators the last one is the decimal one, and a second one of it is not a number
+    ok &= ~(both & (np.where(last_comma > last_dot, comma_count, dot_count) > 1))
+
+    count = _count(digits)
+    scale = _count(digits & (positions > decimal[:, None]) & (decimal[:, None] >= 0))
+    # Power of ten of each digit: the number of digits of the token after it
+    exponents = np.where(digits, count[:, None].astype(np.int8) - np.cumsum(digits, axis=1, dtype=np.int8), 0)
+    retry |= ok & (count > MAX_DIGITS)
+    ok &= (count > 0) & (count <= MAX_DIGITS)
+    exponents = np.minimum(exponents, MAX_DIGITS)
+    mantissa = np.where(digits, (codes.astype(np.int64) - ord("0")) * POWERS[exponents], 0).sum(axis=1)
+    # An exact integer over an exact power of ten rounds like float() of the decimal string
+    values = np.where(ok, mantissa / POWERS[np.minimum(scale, MAX_DIGITS)], 0.0)
+    return values, ok, retry
+
+def _parse_numbers(values:Sequence, percentage:bool, parse_one:Callable) -> NumberColumn:
+    rows = len(values)
+    result = np.zeros(rows)
+    valid = np.zeros(rows, dtype=bool)
+    missing = np.zeros(rows, dtype=bool)
+    strings = []
+    string_rows = []
+    for i, value in enumerate(values):
+        if _missing(value):
+            missing[i] = True
+        elif not isinstance(value, str) or len(value) > MAX_WIDTH or OTHER_DIGIT.search(value):
+            number = parse_one(value)
+            if number is not None:
+                result[i], valid[i] = number, True
+        else:
+            strings.append(value)
+            string_rows.append(i)
+
+    if strings:
+        codes = np.array(strings, dtype=str)
+        codes = codes.view(np.uint32).reshape(len(strings), -1)
+        parsed, ok, retry = _parse_codes(codes, percentage)
+        result[string_rows], valid[string_rows] = parsed, ok
+        for j in np.flatnonzero(retry):
+            number = parse_one(strings[j])
+            if number is not None:
+                result[string_rows[j]], valid[string_rows[j]] = number, True
+    return NumberColumn(result, valid, np.flatnonzero(~valid & ~missing))
+
+def parse_prices(values:Sequence) -> NumberColumn:
+    """Vectorized parse_price: "1.234,56 €", "€ 19,99", "1,234.56" -> 1234.56, 19.99, 1234.56"""
+    return _parse_numbers(values, False, parse_price)
+
+def parse_percentages(values:Sequence) -> NumberColumn:
+    """Vectorized parse_percentage: "-35%", "Sconto del 12,5 %" -> 35.0, 12.5"""
+    return _parse_numbers(values, True, parse_percentage)
+
+def parse_counts(values:Sequence) -> NumberColumn:
+    """Vectorized parse_count: "1.024 valutazioni" -> 1024.0 (whole numbers, still as float64)"""
+    column = _parse_numbers(values, False, parse_count)
+    return column._replace(values=np.floor(column.values))
+
+# How each numeric field of DealRecord is parsed from a whole column
+COLUMN_PARSERS = {"percentage": parse_percentages, "price": parse_prices, "rating": parse_counts}
+
+DTYPES = {"d": np.float64, "q": np.int64, "b": np.int8}
+
+def normalize_records(records:Sequence[dict]) -> Normalized:
+    """
+    Converts a batch of extracted records (raw localized strings, "NaN" for missing values) into a DealBatch,
+    parsing each numeric field as a whole column with parse_prices, parse_percentages and parse_counts.
+    Values that are set but hold no number are left missing and reported in failed.
+    """
+    batch = DealBatch()
+    failed = {}
+    for name in FIELDS:
+        alias = ALIASES.get(name)
+        column = [record.get(name, record.get(alias)) for record in records]
+        if name not in NUMERIC_COLUMNS:
+            batch.set_column(name, [parse_text(value) for value in column])
+            continue
+        if name in COLUMN_PARSERS:
+            parsed = COLUMN_PARSERS[name](column)
+            values, valid = parsed.values, parsed.valid
+            if len(parsed.failed):
+                failed[name] = parsed.failed.tolist()
+        else:
+            flags = [parse_flag(value) for value in column]
+            values = np.array([bool(flag) for flag in flags])
+            valid = np.array([flag is not None for flag in flags], dtype=bool)
+        batch.set_column(name, values.astype(DTYPES[NUMERIC_COLUMNS[name]]).tobytes(), valid.tobytes())
+    return Normalized(batch, failed)
+
+def log_failures(normalized:Normalized, records:Sequence[dict], labels:Sequence[str]=None):
+    """Logs the values that could not be parsed, with the label of their record (labels, or the records' own)."""
+    for name, rows in normalized.failed.items():
+        Logger.warning(f"{len(rows)} of {len(records)} {name} values not parsed: " + ", ".join(
+            f"{(labels[row] if labels is not None else records[row].get('label'))!r}: "
+            f"{records[row].get(name, records[row].get(ALIASES.get(name)))!r}" for row in rows[:10]))
@@ -0,0 +1,54 @@
+import logging
+from typing import Callable, Optional
+
+Logger = logging.getLogger(__name__)
+
+class Paginator:
+    """
+    Keeps the position of a paginated listing across calls, so reaching page n costs as few transitions as possible.
+    url: url of the first page
+    navigate: loads a url in the browser (e.g. WebScraper.navigate_to)
+    next_page: moves the browser from the current page to the next one (e.g. clicks the "next" link)
+    refresh: re-reads the page once positioned (e.g. WebScraper.reset_soup)
+    current_url: returns the url the browser is on, used to notice that it navigated elsewhere in the meantime
+    page_url: optional, builds the url of page n when the page index is encoded in the url or widget state;
+              pages are then loaded directly instead of stepping through the previous ones
+    go_to(n) moves forward from the current page when possible and only starts over from the first page
+    when going back or when the browser left the listing.
+    """
+    def __init__(self, url:str, navigate:Callable, next_page:Callable, refresh:Callable, current_url:Callable,
+                 page_url:Optional[Callable[[str, int], str]]=None):
+        self.url = url
+        self.navigate = navigate
+        self.next_page = next_page
+        self.refresh = refresh
+        self.current_url = current_url
+        self.page_url = page_url
+        self.page = None
+        self.position_url = None
+        self.transitions = 0
+
+    def lost(self) -> bool:
+        """True if the browser is not on the page this paginator left it on."""
+        return self.page is None or self.current_url() != self.position_url
+
+    def go_to(self, page:int):
+        start_transitions = self.transitions
+        stale = True
+        if self.lost() or page != self.page and (self.page_url is not None or page < self.page):
+            self.navigate(self.page_url(self.url, page) if self.page_url is not None else self.url)
+            self.transitions += 1
+            self.page = page if self.page_url is not None else 0
+            stale = False
+        while self.page < page:
+            self.next_page()
+            self.transitions += 1
+            self.page += 1
+            stale = True
+        if stale:
+            self.refresh()
+        self.position_url = self.current_url()
+        Logger.info(f"On page {page} after {self.transitions - start_transitions} transitions")
+
+    def next(self):
+        self.go_to(0 if self.page is None else self.page + 1)
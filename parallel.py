@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from extraction import ExtractionSchema
+from indexing import SoupIndex
+from parsing import available_backend, parse_html
+
+Logger = logging.getLogger(__name__)
+
+# Set once in each worker process by _init_worker
+_schema = None
+_filters = None
+_backend = None
+
+def _init_worker(payload:bytes):
+    global _schema, _filters, _backend
+    _schema, _filters, _backend = pickle.loads(payload)
+
+def _element_record(element) -> dict:
+    return {"tag": element.name, "attrs": dict(element.attrs), "text": element.get_text(" ", strip=True)}
+
+def _extract_page(html:str) -> List[dict]:
+    soup = parse_html(html, _backend)
+    if _schema is not None:
+        records = _schema.extract(soup)
+    else:
+        records = [_element_record(element) for element in SoupIndex(soup).find_all(soup, _filters)]
+    soup.decompose()
+    return records
+
+def _ready() -> int:
+    return os.getpid()
+
+def _extract_chunk(pages:List[str]) -> List[List[dict]]:
+    return [_extract_page(html) for html in pages]
+
+def normalize_filters(filters:Dict[str, str]) -> Dict[str, str]:
+    """Turns filter_elements style keyword filters (_class, data_deal_id, ...) into attribute names."""
+    return {"class" if key in ("_class", "class_", "class") else key.replace("_", "-"): value for key, value in filters.items()}
+
+class ParallelExtractor:
+    """
+    Parses page sources and extracts records from them in a process pool, so parsing uses every core
+    instead of holding the GIL of the scraping process.
+    Either schema (an ExtractionSchema, records as from WebScraper.extract) or filters (filter_elements style
+    keyword filters, each matching element as {"tag", "attrs", "text"}) is applied to each page.
+    The schema and filters are pickled once, into each worker when it starts, so tasks only carry page source
+    strings in and compact records out, never parsed trees.
+    Workers are spawned rather than forked (the scraping process runs threads, which fork does not carry over
+    safely), and all of them are started in the constructor, so the first pages do not wait for the interpreters.
+    workers: number of processes (default: one per core)
+    chunk_size: pages per task in extract_many, to amortize the inter-process round trip on small pages
+        methods:
+            submit(html)
+            extract(html)
+            extract_many(pages)
+            close()
+    """
+    def __init__(self, schema:Optional[ExtractionSchema]=None, filters:Dict[str, str]=None, backend:str=None,
+                 workers:int=None, chunk_size:int=4):
+        if (schema is None) == (filters is None):
+            raise ValueError("Pass either a schema or filters")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        payload = pickle.dumps((schema, normalize_filters(filters) if filters is not None else None, available_backend(backend)))
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker, initargs=(payload,))
+        for future in [self.executor.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+        Logger.info(f"Parallel extractor started with {self.workers} workers")
+
+    def submit(self, html:str) -> Future:
+        """Returns a Future of the records of one page."""
+        return self.executor.submit(_extract_page, html)
+
+    def extract(self, html:str) -> List[dict]:
+        return self.submit(html).result()
+
+    def extract_many(self, pages:Iterable[str]) -> Iterator[List[dict]]:
+        """Yields the records of each page, in the order of pages, sending chunk_size pages per task."""
+        pages = iter(pages)
+        chunks = iter(lambda: [html for _, html in zip(range(self.chunk_size), pages)], [])
+        for records in self.executor.map(_extract_chunk, chunks):
+            yield from records
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
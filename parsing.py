@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Union
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+
+from extraction import Selector
+
+Logger = logging.getLogger(__name__)
+
+# Fastest first: lxml is a C parser, html.parser is pure Python, html5lib is the slowest
+BACKENDS = ("lxml", "html.parser", "html5lib")
+
+def available_backend(preferred:Optional[str]=None) -> str:
+    """
+    Returns the preferred BeautifulSoup tree builder if installed, otherwise the fastest installed one.
+    """
+    candidates = ((preferred,) if preferred else ()) + BACKENDS
+    for backend in candidates:
+        try:
+            BeautifulSoup("", backend)
+            return backend
+        except FeatureNotFound:
+            if backend == preferred:
+                Logger.warning(f"Parser backend {backend} not installed, falling back")
+    return "html.parser"
+
+def scope_selectors(selectors:Sequence[Union[str, Selector]]) -> tuple:
+    """The selector strings of selectors, which can mix strings and Selector objects."""
+    return tuple(selector.selector if isinstance(selector, Selector) else selector for selector in selectors)
+
+class ScopeStrainer(SoupStrainer):
+    """
+    Keeps only the subtrees of the elements matching any of selectors (e.g. the deal card containers),
+    so the rest of the page is never turned into Tag objects.
+    Selectors are single compounds of the Selector subset (tag, .class, #id, [attr], [attr=value]), as strings
+    or Selector objects (e.g. a schema's container): ancestors are not built yet when an element is parsed,
+    so descendant combinators cannot be checked.
+    """
+    def __init__(self, selectors:Sequence[Union[str, Selector]]):
+        super().__init__()
+        self.selectors = scope_selectors(selectors)
+        self.compounds = []
+        for selector in self.selectors:
+            compounds = Selector(selector).compounds
+            if len(compounds) != 1:
+                raise ValueError(f"Scoped parsing needs selectors without descendant combinators: {selector}")
+            self.compounds.append(compounds[0])
+
+    def _matches(self, name:str, attrs:dict) -> bool:
+        for tag, classes, attributes in self.compounds:
+            if tag is not None and name != tag:
+                continue
+            node_classes = attrs.get("class") or ()
+            if isinstance(node_classes, str):
+                node_classes = node_classes.split()
+            if any(_class not in node_classes for _class in classes):
+                continue
+            if all(key in attrs and (value is None or attrs[key] == value) for key, value in attributes):
+                return True
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return self._matches(name, attrs or {})
+
+    def allow_string_creation(self, string) -> bool:
+        return False
+
+    def __repr__(self):
+        return f"ScopeStrainer({self.selectors!r})"
+
+def parse_html(html:str, backend:Optional[str]=None, only:Optional[Sequence[str]]=None) -> BeautifulSoup:
+    """Parses html; with only (container selectors, see ScopeStrainer), just the matching subtrees."""
+    backend = backend or available_backend()
+    if only and backend == "html5lib":
+        Logger.warning("html5lib cannot parse scoped, parsing the whole page")
+        only = None
+    return BeautifulSoup(html, backend, parse_only=ScopeStrainer(only) if only else None)
+
+class SoupParser:
+    """
+    Parses page sources into BeautifulSoup trees, caching them by a hash of the source (and the scope),
+    so an unchanged page is never parsed twice.
+    backend: "lxml", "html.parser" or "html5lib" (default: the fastest installed)
+    cache_size: how many distinct pages are kept parsed (least recently used ones are dropped)
+    parse(html, only) builds only the subtrees matching the only selectors (see ScopeStrainer).
+    release(soup) drops a tree that is no longer needed from the cache and decomposes it, so its memory
+    is freed right away instead of whenever the garbage collector gets to its parent/child reference cycles.
+    """
+    def __init__(self, backend:Optional[str]=None, cache_size:int=4):
+        self.backend = available_backend(backend)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.digest = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash(html:str) -> bytes:
+        return hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def parse(self, html:str, only:Optional[Sequence[str]]=None) -> BeautifulSoup:
+        digest = self.hash(html) + "\0".join(scope_selectors(only)).encode("utf-8") if only else self.hash(html)
+        with self._lock:
+            self.digest = digest
+            if digest in self.cache:
+                self.cache.move_to_end(digest)
+                return self.cache[digest]
+
+        soup = parse_html(html, self.backend, only)
+        with self._lock:
+            self.cache[digest] = soup
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return soup
+
+    def release(self, soup, decompose:bool=True):
+        """
+        Drops soup from the cache and decomposes it (with decompose=False the tree is only dropped,
+        for when elements of it are still in use).
+        """
+        with self._lock:
+            for digest, cached in list(self.cache.items()):
+                if cached is soup:
+                    del self.cache[digest]
+                    if digest == self.digest:
+                        self.digest = None
+        if decompose:
+            soup.decompose()
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.digest = None
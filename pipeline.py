@@ -0,0 +1,151 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Iterable, List
+
+Logger = logging.getLogger(__name__)
+
+# Marks the end of the input on a queue
+_DONE = object()
+
+class Stage:
+    def __init__(self, name:str, function:Callable, workers:int=1, many:bool=False):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.many = many
+
+class Pipeline:
+    """
+    Producer/consumer engine: items flow through stages (e.g. fetch -> parse -> extract -> sink) connected by
+    bounded queues of queue_size items, each stage with its own worker threads, so the browser loads the next page
+    while the previous one is parsed and saved. A full queue blocks the stage feeding it (backpressure),
+    so a page is only loaded when the stage after it can take it.
+    A stage function takes an item and returns the item for the next stage, or None to drop it;
+    with many=True it returns an iterable of items (e.g. the records of a page).
+    A function that raises drops its item: the error is logged, counted in failed[stage] and passed to
+    on_error(stage, item, error) if given.
+    Functions of stages that share the browser must not drive it at the same time (use a lock, or one worker).
+    run(items) feeds items in and returns the non None outputs of the last stage. On KeyboardInterrupt it stops
+    the workers once their current item is done and raises it again, so WebScraperUser can close the browser.
+        methods:
+            stage(name, function, workers, many)
+            run(items)
+            stop()
+    """
+    def __init__(self, queue_size:int=4, on_error:Callable=None, poll_interval:float=0.1):
+        self.queue_size = queue_size
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.stages = []
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.processed = {}
+        self.failed = {}
+        self.busy = {}
+
+    def stage(self, name:str, function:Callable, workers:int=1, many:bool=False) -> "Pipeline":
+        self.stages.append(Stage(name, function, workers, many))
+        self.processed[name] = self.failed[name] = 0
+        self.busy[name] = 0.0
+        return self
+
+    def _put(self, target:queue.Queue, item) -> bool:
+        while not self.stopping.is_set():
+            try:
+                target.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, source:queue.Queue):
+        while not self.stopping.is_set():
+            try:
+                return source.get(timeout=self.poll_interval)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _feed(self, items:Iterable, target:queue.Queue, workers:int):
+        try:
+            for item in items:
+                if not self._put(target, item):
+                    return
+        except Exception as e:
+            Logger.error(f"Pipeline input failed: {e}")
+        for _ in range(workers):
+            self._put(target, _DONE)
+
+    def _work(self, stage:Stage, source:queue.Queue, target:queue.Queue, running:list, next_workers:int):
+        while True:
+            item = self._get(source)
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                result = stage.function(item)
+                outputs = (result or ()) if stage.many else (() if result is None else (result,))
+                for output in outputs:
+                    if output is not None and not self._put(target, output):
+                        break
+            except Exception as e:
+                Logger.error(f"Pipeline stage {stage.name} failed: {e}")
+                with self.lock:
+                    self.failed[stage.name] += 1
+                if self.on_error is not None:
+                    self.on_error(stage.name, item, e)
+            with self.lock:
+                self.processed[stage.name] += 1
+                self.busy[stage.name] += time.perf_counter() - start
+
+        # The last worker of a stage to finish passes the end of the input on
+        with self.lock:
+            running[0] -= 1
+            last = running[0] == 0
+        if last:
+            for _ in range(next_workers):
+                self._put(target, _DONE)
+
+    def run(self, items:Iterable) -> List:
+        if not self.stages:
+            raise ValueError("The pipeline has no stages")
+        self.stopping.clear()
+        queues = [queue.Queue(self.queue_size) for _ in self.stages] + [queue.Queue()]
+        workers = []
+        for i, stage in enumerate(self.stages):
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            running = [stage.workers]
+            for n in range(stage.workers):
+                workers.append(threading.Thread(target=self._work, name=f"{stage.name}-{n}", daemon=True,
+                                                args=(stage, queues[i], queues[i + 1], running, next_workers)))
+        feeder = threading.Thread(target=self._feed, name="feeder", daemon=True, args=(items, queues[0], self.stages[0].workers))
+        for thread in workers:
+            thread.start()
+        feeder.start()
+
+        results = []
+        started = time.perf_counter()
+        try:
+            while True:
+                result = self._get(queues[-1])
+                if result is _DONE:
+                    break
+                results.append(result)
+        except KeyboardInterrupt:
+            Logger.info("Pipeline interrupted, stopping the workers")
+            self.stop()
+            raise
+        finally:
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            Logger.info(f"Pipeline ran for {elapsed:.1f}s; " + ", ".join(
+                f"{stage.name}: {self.processed[stage.name]} items, {self.failed[stage.name]} failed, busy {self.busy[stage.name]:.1f}s"
+                for stage in self.stages))
+        return results
+
+    def stop(self):
+        """Stops the workers after their current item; items still queued are dropped."""
+        self.stopping.set()
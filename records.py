@@ -0,0 +1,253 @@
+import re
+from array import array
+from dataclasses import dataclass, fields
+from typing import Iterable, Iterator, List, Optional
+
+# Values the extraction schemas and the old records use for a missing field
+MISSING_VALUES = (None, "", "NaN")
+
+# A number with Italian/EU (1.234,56) or English (1,234.56) separators, spaces only as thousands separators
+NUMBER_PATTERN = re.compile(r"\d(?:[\d.,'\u00a0\u202f]|\s(?=\d{3}(?!\d)))*")
+PERCENTAGE_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+SPACES = re.compile(r"[\s'\u00a0\u202f]")
+
+def _missing(value) -> bool:
+    return value in MISSING_VALUES or isinstance(value, float) and value != value
+
+def number_value(token:str) -> Optional[float]:
+    """
+    Converts a number token to a float, telling the decimal separator from the thousands separators:
+    with both "." and "," the last one is the decimal separator, a lone "," is decimal (1,5 -> 1.5),
+    a lone "." followed by exactly three digits or repeated groups separate thousands (1.024 -> 1024).
+    """
+    token = SPACES.sub("", token).rstrip(".,")
+    if not token:
+        return None
+    comma, dot = token.rfind(","), token.rfind(".")
+    if comma >= 0 and dot >= 0:
+        decimal = "," if comma > dot else "."
+    elif comma >= 0:
+        decimal = "," if token.count(",") == 1 else None
+    elif dot >= 0:
+        decimal = "." if token.count(".") == 1 and len(token) - dot - 1 != 3 else None
+    else:
+        decimal = None
+    for separator in ".,":
+        if separator != decimal:
+            token = token.replace(separator, "")
+    if decimal == ",":
+        token = token.replace(",", ".")
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+def parse_price(value) -> Optional[float]:
+    """"1.234,56 €", "€ 19,99" -> 1234.56, 19.99 (the first number of the text)"""
+    if _missing(value):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER_PATTERN.search(value)
+    return number_value(match.group()) if match else None
+
+def parse_percentage(value) -> Optional[float]:
+    """"-35%", "Sconto del 35%" -> 35.0 (the discount, without its sign)"""
+    if _missing(value):
+        return None
+    if isinstance(value, (int, float)):
+        return abs(float(value))
+    match = PERCENTAGE_PATTERN.search(value)
+    return number_value(match.group(1)) if match else None
+
+def parse_count(value) -> Optional[int]:
+    """"1.024 valutazioni" -> 1024"""
+    if _missing(value):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = NUMBER_PATTERN.search(value)
+    number = number_value(match.group()) if match else None
+    return int(number) if number is not None else None
+
+def parse_flag(value) -> Optional[bool]:
+    """A field that is set when an element exists (e.g. the coupon badge class) -> True"""
+    if _missing(value):
+        return None
+    return value if isinstance(value, bool) else True
+
+def parse_text(value) -> Optional[str]:
+    return None if _missing(value) else str(value)
+
+@dataclass(slots=True)
+class DealRecord:
+    """
+    One deal, with typed fields and None for missing values instead of "NaN" strings.
+    percentage: discount in percent; price: price to pay; rating: number of ratings
+    from_dict(record) builds it from an extracted record (raw localized strings are parsed, see parse_price,
+    parse_percentage, parse_count); merge(other) returns a copy with the fields other has set;
+    to_dict() leaves missing fields out, and is what the sinks write.
+        methods:
+            from_dict(record)
+            merge(other)
+            to_dict()
+    """
+    deal_id: Optional[str] = None
+    label: Optional[str] = None
+    link: Optional[str] = None
+    text: Optional[str] = None
+    percentage: Optional[float] = None
+    price: Optional[float] = None
+    rating: Optional[int] = None
+    coupon: Optional[bool] = None
+    already_visited: Optional[bool] = None
+    error: Optional[bool] = None
+
+    @classmethod
+    def from_dict(cls, record:dict) -> "DealRecord":
+        return cls(*(parse(record.get(name, record.get(ALIASES.get(name)))) for name, parse in PARSERS.items()))
+
+    def merge(self, other) -> "DealRecord":
+        if isinstance(other, dict):
+            other = DealRecord.from_dict(other)
+        return DealRecord(*(theirs if theirs is not None else mine
+                            for mine, theirs in zip(self._values(), other._values())))
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in FIELDS)
+
+    def to_dict(self) -> dict:
+        return {name: value for name in FIELDS if (value := getattr(self, name)) is not None}
+
+FIELDS = tuple(field.name for field in fields(DealRecord))
+
+# How each field is read from an extracted record
+PARSERS = {
+    "deal_id": parse_text,
+    "label": parse_text,
+    "link": parse_text,
+    "text": parse_text,
+    "percentage": parse_percentage,
+    "price": parse_price,
+    "rating": parse_count,
+    "coupon": parse_flag,
+    "already_visited": parse_flag,
+    "error": parse_flag,
+}
+
+# Names the v2 card schema gives to the same fields
+ALIASES = {"percentage": "deal_label_1", "text": "deal_label_2"}
+
+# Typecodes of the numeric columns of DealBatch ("b" columns hold booleans)
+NUMERIC_COLUMNS = {"percentage": "d", "price": "d", "rating": "q", "coupon": "b", "already_visited": "b", "error": "b"}
+
+class DealBatch:
+    """
+    Columnar batch of DealRecords for bulk handling: text fields are lists, numeric and boolean fields
+    are typed arrays with a validity mask (1 where the value is set), so a million records take a few
+    machine words each instead of a dict of strings.
+    Indexing and iterating give DealRecords back; to_arrow() builds a pyarrow Table (pyarrow is optional).
+    merge(other) is the columnar merge of two batches of the same deals (e.g. cards and their details).
+        methods:
+            append(record)
+            extend(records)
+            set_column(name, values, valid)
+            column(name)
+            numeric(name)
+            merge(other)
+            to_dicts()
+            to_arrow()
+    """
+    def __init__(self, records:Iterable=()):
+        self.text = {name: [] for name in FIELDS if name not in NUMERIC_COLUMNS}
+        self.values = {name: array(typecode) for name, typecode in NUMERIC_COLUMNS.items()}
+        self.valid = {name: bytearray() for name in NUMERIC_COLUMNS}
+        self.extend(records)
+
+    def append(self, record):
+        if isinstance(record, dict):
+            record = DealRecord.from_dict(record)
+        for name, column in self.text.items():
+            column.append(getattr(record, name))
+        for name, column in self.values.items():
+            value = getattr(record, name)
+            column.append(0 if value is None else value)
+            self.valid[name].append(value is not None)
+
+    def extend(self, records:Iterable):
+        for record in records:
+            self.append(record)
+
+    def set_column(self, name:str, values, valid=None):
+        """
+        Replaces a whole column: values is a list for text fields; for numeric fields it is a sequence
+        or the bytes of the column in machine format (e.g. numpy's tobytes()), with valid as a sequence of 0/1 or bytes.
+        """
+        if name in self.text:
+            self.text[name] = list(values)
+        else:
+            self.values[name] = array(NUMERIC_COLUMNS[name], values)
+            self.valid[name] = bytearray(valid)
+
+    def __len__(self) -> int:
+        return len(self.text["label"])
+
+    def _value(self, name:str, i:int):
+        if name in self.text:
+            return self.text[name][i]
+        if not self.valid[name][i]:
+            return None
+        value = self.values[name][i]
+        return bool(value) if NUMERIC_COLUMNS[name] == "b" else value
+
+    def __getitem__(self, i:int) -> DealRecord:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("DealBatch index out of range")
+        return DealRecord(*(self._value(name, i) for name in FIELDS))
+
+    def __iter__(self) -> Iterator[DealRecord]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name:str) -> list:
+        """The values of a field, None where missing."""
+        if name in self.text:
+            return list(self.text[name])
+        return [self._value(name, i) for i in range(len(self))]
+
+    def numeric(self, name:str):
+        """The (values, validity mask) arrays of a numeric field, without copying."""
+        return self.values[name], self.valid[name]
+
+    def merge(self, other:"DealBatch") -> "DealBatch":
+        """A batch with, row by row, the fields other has set and the fields of this batch otherwise."""
+        if len(other) != len(self):
+            raise ValueError(f"Cannot merge a batch of {len(other)} records into one of {len(self)}")
+        merged = DealBatch()
+        for name, column in self.text.items():
+            merged.set_column(name, [theirs if theirs is not None else mine for mine, theirs in zip(column, other.text[name])])
+        for name, column in self.values.items():
+            theirs, their_valid = other.values[name], other.valid[name]
+            merged.set_column(name, [b if valid else a for a, b, valid in zip(column, theirs, their_valid)],
+                              bytes(a | b for a, b in zip(self.valid[name], their_valid)))
+        return merged
+
+    def to_dicts(self) -> List[dict]:
+        return [record.to_dict() for record in self]
+
+    def to_arrow(self):
+        import numpy
+        import pyarrow
+
+        dtypes = {"d": numpy.float64, "q": numpy.int64, "b": numpy.bool_}
+        columns = {}
+        for name in FIELDS:
+            if name in self.text:
+                columns[name] = pyarrow.array(self.text[name], type=pyarrow.string())
+            else:
+                values = numpy.frombuffer(self.values[name], dtype=dtypes[NUMERIC_COLUMNS[name]], count=len(self))
+                valid = numpy.frombuffer(self.valid[name], dtype=numpy.bool_, count=len(self))
+                columns[name] = pyarrow.array(values, mask=~valid)
+        return pyarrow.table(columns)
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence
+
+from scraper import WebScraper
+from cache import normalize_url
+from pagination import Paginator
+from parsing import SoupParser
+from extraction import ExtractionSchema
+from waits import Condition
+from utils import log
+
+class ArchiveWriter:
+    """
+    Writes a replay archive: a zip file with one deflated entry per distinct page body (pages/<hash>.html,
+    so a page recorded many times is stored once) and index.json, the list of recorded snapshots in order:
+        kind: "navigate" (navigate_to), "refresh" (reset_soup, e.g. after a click) or "fetch" (HTTP path)
+        url: requested url (navigate, fetch) or the url the browser was on (refresh)
+        page: the body entry; elapsed: seconds the page took; cookies: browser cookies (browser snapshots only)
+    The index is written by close(). Safe to use from several threads.
+    """
+    def __init__(self, path:str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self.snapshots = []
+        self.pages = set()
+        self.lock = threading.Lock()
+
+    def add(self, kind:str, url:str, html:str, elapsed:float, cookies:List[dict]=None):
+        data = html.encode("utf-8")
+        page = f"pages/{hashlib.blake2b(data, digest_size=16).hexdigest()}.html"
+        with self.lock:
+            if page not in self.pages:
+                self.zip.writestr(page, data)
+                self.pages.add(page)
+            self.snapshots.append({"kind": kind, "url": url, "page": page, "elapsed": round(elapsed, 3),
+                                   "cookies": cookies, "recorded_at": time.time()})
+
+    def close(self):
+        with self.lock:
+            if self.zip is None:
+                return
+            self.zip.writestr("index.json", json.dumps({"version": 1, "snapshots": self.snapshots}))
+            self.zip.close()
+            self.zip = None
+
+class ArchiveReader:
+    """
+    Serves the snapshots of a replay archive.
+    navigate and fetch snapshots are looked up by normalized url, in recording order, repeating the last one;
+    refresh snapshots are served in recording order, since a click does not say where it leads.
+    """
+    def __init__(self, path:str):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self.snapshots = json.loads(self.zip.read("index.json"))["snapshots"]
+        self.by_url = defaultdict(list)
+        self.refreshes = []
+        for snapshot in self.snapshots:
+            if snapshot["kind"] == "refresh":
+                self.refreshes.append(snapshot)
+            else:
+                self.by_url[(snapshot["kind"], normalize_url(snapshot["url"]))].append(snapshot)
+        self.served = defaultdict(int)
+        self.refreshes_served = 0
+        self.lock = threading.Lock()
+
+    def find(self, kind:str, url:str) -> Optional[dict]:
+        key = (kind, normalize_url(url))
+        with self.lock:
+            snapshots = self.by_url.get(key)
+            if not snapshots:
+                return None
+            snapshot = snapshots[min(self.served[key], len(snapshots) - 1)]
+            self.served[key] += 1
+            return snapshot
+
+    def next_refresh(self) -> Optional[dict]:
+        with self.lock:
+            if self.refreshes_served >= len(self.refreshes):
+                return None
+            self.refreshes_served += 1
+            return self.refreshes[self.refreshes_served - 1]
+
+    def html(self, snapshot:dict) -> str:
+        with self.lock:
+            return self.zip.read(snapshot["page"]).decode("utf-8")
+
+    def close(self):
+        self.zip.close()
+
+class RecordingFetcher:
+    """Wraps an HttpFetcher and records the pages it returns."""
+    def __init__(self, fetcher, archive:ArchiveWriter):
+        self.fetcher = fetcher
+        self.archive = archive
+
+    def get(self, url:str, required:Iterable[str]=()) -> Optional[str]:
+        start = time.perf_counter()
+        html = self.fetcher.get(url, required)
+        if html is not None:
+            self.archive.add("fetch", url, html, time.perf_counter() - start)
+        return html
+
+    def __getattr__(self, name):
+        return getattr(self.fetcher, name)
+
+class ReplayFetcher:
+    """HttpFetcher stand-in serving the fetch snapshots of an archive; pages that were not recorded return None."""
+    def __init__(self, archive:ArchiveReader, delays:bool=False):
+        self.archive = archive
+        self.delays = delays
+
+    def get(self, url:str, required:Iterable[str]=()) -> Optional[str]:
+        snapshot = self.archive.find("fetch", url)
+        if snapshot is None:
+            return None
+        if self.delays:
+            time.sleep(snapshot["elapsed"])
+        return self.archive.html(snapshot)
+
+    def sync_cookies(self, cookies:Iterable[dict]):
+        pass
+
+class RecordingWebScraper(WebScraper):
+    """
+    WebScraper that records every page it reads into a replay archive (see ArchiveWriter) while scraping as usual.
+    record: path of the archive, written when the scraper quits
+    """
+    def __init__(self, *args, record:str, **kwargs):
+        self.archive = ArchiveWriter(record)
+        self.last_html = None
+        super().__init__(*args, **kwargs)
+
+    def _load_html(self, html:str, only:Sequence[str]=None):
+        self.last_html = html
+        super()._load_html(html, only)
+
+    def _record(self, kind:str, url:str, start:float):
+        self.archive.add(kind, url, self.last_html, time.perf_counter() - start, self.driver.get_cookies())
+
+    def navigate_to(self, url, *args, **kwargs):
+        start = time.perf_counter()
+        # The page is recorded, so it is read anyway
+        super().navigate_to(url, *args, **{**kwargs, "parse": True})
+        self._record("navigate", url, start)
+
+    def paginator(self, *args, **kwargs) -> Paginator:
+        # The pages after a click are recorded as well, through reset_soup
+        return super().paginator(*args, **{**kwargs, "parse": True})
+
+    def reset_soup(self, only:Sequence[str]=None):
+        start = time.perf_counter()
+        super().reset_soup(only)
+        self._record("refresh", self.current_url(), start)
+
+    def http_fetcher(self):
+        # fetch is recorded here over HTTP and by navigate_to for its browser fallback
+        return RecordingFetcher(super().http_fetcher(), self.archive)
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self.archive.close()
+            if self.log_level >= 2: log(f"Recorded {len(self.archive.snapshots)} pages to {self.archive.path}")
+
+class NoDriverElements:
+    def find(self, by, value) -> list:
+        return []
+
+    def all(self) -> list:
+        return []
+
+    def invalidate(self):
+        pass
+
+class ReplayWebScraper(WebScraper):
+    """
+    WebScraper without a browser, serving the pages of a replay archive recorded by RecordingWebScraper,
+    so extraction runs entirely offline at parse speed.
+    Browser-only arguments (chrome_options, headless, resources, ...) are accepted and ignored.
+    The parsed elements stand in for WebElements: clicks are no-ops, and the page after a click
+    is the next recorded refresh. In browser extraction runs on the soup instead.
+    delays: sleep for the recorded load time of each page, to reproduce slow pages
+    """
+    def __init__(self, *args, replay:str, log_level:int=0, parser:str=None, delays:bool=False, **kwargs):
+        self.writer = None
+        self.log_level = log_level
+        self.parser = SoupParser(parser)
+        self.soup = None
+        self.soup_index = None
+        self.soup_scoped = False
+        self.cache = None
+        self.cookies_synced = True
+        self.pool = None
+        self.page_count = 0
+        self.driver = None
+        self.driver_elements = NoDriverElements()
+        self.archive = ArchiveReader(replay)
+        self.fetcher = ReplayFetcher(self.archive, delays)
+        self.delays = delays
+        self.url = None
+        if self.log_level >= 2: log(f"Replaying {len(self.archive.snapshots)} pages from {replay}")
+
+    def _serve(self, snapshot:Optional[dict], what:str, only:Sequence[str]=None):
+        if snapshot is None:
+            raise ReplayMissError(f"{what} was not recorded in {self.archive.path}")
+        if self.delays:
+            time.sleep(snapshot["elapsed"])
+        self.url = snapshot["url"]
+        self._load_html(self.archive.html(snapshot), only)
+
+    def quit(self):
+        self.archive.close()
+
+    def restart(self):
+        pass
+
+    def wait_for(self, condition:Condition, timeout:float=10) -> bool:
+        return True
+
+    def current_url(self) -> str:
+        return self.url
+
+    @contextmanager
+    def new_tab(self):
+        url = self.url
+        with self._keep_soup():
+            try:
+                yield
+            finally:
+                self.url = url
+
+    def navigate_to(self, url, wait:Condition=None, timeout:float=10, resources=None, cached:bool=False, only:Sequence[str]=None,
+                    parse:bool=True):
+        # Every page is parsed, since extraction and element lookups run on the soup
+        if self.log_level >= 2: log(f'Replaying {url}')
+        self._serve(self.archive.find("navigate", url), url, only)
+        self.page_count += 1
+
+    def fetch(self, url, required=(), only:Sequence[str]=None):
+        html = self.fetcher.get(url, required)
+        if html is None:
+            self.navigate_to(url, only=only)
+            return False
+        self._load_html(html, only)
+        return True
+
+    def http_fetcher(self) -> ReplayFetcher:
+        return self.fetcher
+
+    def reset_soup(self, only:Sequence[str]=None):
+        self._serve(self.archive.next_refresh(), "The page after a click", only)
+
+    def enter_value(self, element, value, enter=True):
+        pass
+
+    def click_button(self, element, wait:Condition=None, timeout:float=10):
+        pass
+
+    def get_web_elements(self, bs_elements):
+        return list(bs_elements)
+
+    def find_web_elements(self, selector:str) -> list:
+        return self.soup.select(selector)
+
+    def paginator(self, *args, **kwargs) -> Paginator:
+        return super().paginator(*args, **{**kwargs, "parse": True})
+
+    def extract(self, schema:ExtractionSchema, in_browser:bool=False):
+        return super().extract(schema, in_browser=False)
+
+
+class ReplayMissError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
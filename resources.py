@@ -0,0 +1,78 @@
+import logging
+from typing import Iterable, Union
+
+from selenium.webdriver.chrome.options import Options
+
+Logger = logging.getLogger(__name__)
+
+def _extension_patterns(*extensions) -> list:
+    # The path ends with the extension, with or without a query string (so "*.js" does not block .json or .jsp)
+    return [pattern for extension in extensions for pattern in (f"*.{extension}", f"*.{extension}?*")]
+
+# Network.setBlockedURLs patterns ("*" matches any sequence of characters) for each resource type
+TYPE_PATTERNS = {
+    "image": _extension_patterns("jpg", "jpeg", "png", "gif", "webp", "avif", "svg", "ico"),
+    "media": _extension_patterns("mp4", "webm", "m3u8", "mp3", "ogg"),
+    "font": _extension_patterns("woff", "woff2", "ttf", "otf", "eot"),
+    "stylesheet": _extension_patterns("css"),
+    "script": _extension_patterns("js"),
+}
+
+TRACKING_PATTERNS = [
+    "*doubleclick.net*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*amazon-adsystem.com*",
+    "*fls-eu.amazon.*",
+    "*unagi.amazon.*",
+    "*/rd/uedata*",
+]
+
+class ResourcePolicy:
+    """
+    Which resources the browser should not download.
+    block_types: resource types among image, media, font, stylesheet, script
+    block_urls: additional url patterns (e.g. ads and tracking hosts)
+    Blocking is done with the DevTools Network.setBlockedURLs command, so it can be changed between navigations.
+    Blocked images are also disabled through the Chrome preferences when the browser starts (apply_preferences),
+    which per-navigation overrides cannot undo.
+    """
+    def __init__(self, block_types:Iterable[str]=(), block_urls:Iterable[str]=()):
+        self.block_types = tuple(block_types)
+        self.block_urls = tuple(block_urls)
+        for block_type in self.block_types:
+            if block_type not in TYPE_PATTERNS:
+                raise ValueError(f"Unknown resource type: {block_type}")
+
+    def blocked_urls(self) -> list:
+        patterns = [pattern for block_type in self.block_types for pattern in TYPE_PATTERNS[block_type]]
+        return patterns + list(self.block_urls)
+
+    def apply_preferences(self, options:Options):
+        if "image" in self.block_types:
+            prefs = dict(options.experimental_options.get("prefs", {}))
+            prefs["profile.managed_default_content_settings.images"] = 2
+            options.add_experimental_option("prefs", prefs)
+
+    def apply(self, driver):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_urls()})
+        Logger.info(f"Blocking {', '.join(self.block_types) or 'no resource types'} and {len(self.block_urls)} url patterns")
+
+PRESETS = {
+    "none": ResourcePolicy(),
+    # Everything the scraper never reads, while keeping scripts and styles so pages render as usual
+    "extraction-only": ResourcePolicy(block_types=("image", "media", "font"), block_urls=TRACKING_PATTERNS),
+    # Only the HTML documents and XHR, for pages that render server side
+    "html-only": ResourcePolicy(block_types=("image", "media", "font", "stylesheet", "script"), block_urls=TRACKING_PATTERNS),
+}
+
+def resource_policy(policy:Union[str, ResourcePolicy, None]) -> ResourcePolicy:
+    """Returns the policy for a preset name, a ResourcePolicy, or None (nothing blocked)."""
+    if policy is None:
+        return PRESETS["none"]
+    if isinstance(policy, ResourcePolicy):
+        return policy
+    if policy not in PRESETS:
+        raise ValueError(f"Unknown resource policy preset: {policy}")
+    return PRESETS[policy]
@@ -1,40 +1,67 @@
 import os
-import Levenshtein
+import copy
+import queue
+import shutil
+import tempfile
+import threading
 import traceback
-from typing import Callable, Union
-from bs4 import BeautifulSoup
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Sequence, Union
+from bs4.element import Tag
 
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, SessionNotCreatedException
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 
-from utils import log, ChromeDownloader, FileWriter, CookiesCRUD#, LocalStorageCRUD
+from utils import log, FileWriter, CookiesCRUD#, LocalStorageCRUD
+from indexing import SoupIndex
+from parsing import SoupParser
+from fetcher import HttpFetcher
+from extraction import ExtractionSchema, EXTRACT_SCRIPT
+from sinks import JsonLinesSink, SQLiteSink
+from pagination import Paginator
+from waits import Condition, wait_for
+from resources import ResourcePolicy, resource_policy
+from driver_manager import DriverManager
+from cache import ResponseCache
 
 class WebScraperUser:
     """
     WebScraperUser class for using WebScraper class in a more user-friendly way.
     To use it, you need to pass a function to the constructor that will use the WebScraper class.
     The function will be called with the WebScraper class as the first argument.
+    If pool_size is given, a WebScraperPool of that many extra browsers is started with the same arguments
+    (those a plain WebScraper takes, see WebScraperPool.scraper_arguments) and made available to the function as scraper.pool.
+    scraper_class replaces WebScraper, e.g. with the RecordingWebScraper or ReplayWebScraper of replay.py.
     """
-    def __init__(self, run:Callable, *args, **kwargs):
+    def __init__(self, run:Callable, *args, pool_size:int=0, scraper_class:type=None, **kwargs):
+        self.scraper = None
+        self.pool = None
         try:
-            self.scraper = WebScraper(*args, **kwargs)
+            self.scraper = (scraper_class or WebScraper)(*args, **kwargs)
+            if pool_size:
+                self.pool = WebScraperPool(pool_size, *args, **{key: value for key, value in kwargs.items()
+                                                                if key in WebScraperPool.scraper_arguments})
+                self.scraper.pool = self.pool
             run(self.scraper)
         except (Exception) as e: 
             traceback.print_exception(type(e), e, e.__traceback__)
         except (KeyboardInterrupt):
             log('Interrupted')
         finally:
-            self.scraper.quit()
+            if self.pool is not None:
+                self.pool.close()
+            if self.scraper is not None:
+                self.scraper.quit()
 
 class WebScraper:
     """
     WebScraper class for scraping websites using Selenium and BeautifulSoup libraries.
     The class is meant to be used as a base class for other classes that will implement the scraping logic.
     The class provides methods for navigating to a website, entering values in inputs, clicking buttons, etc.
-    If chromedriver is not found, it will be downloaded automatically.
+    A chromedriver matching the installed Chrome is downloaded automatically and cached (see driver_manager.py).
     Default options for Chrome are:
         --disable-extensions
         --disable-gpu
@@ -47,6 +74,19 @@ class WebScraper:
     log_level = 0: no logs (default)
     log_level = 1: only errors 
     log_level = 2: errors and info
+
+    parser selects the BeautifulSoup backend ("lxml", "html.parser", "html5lib"), by default the fastest installed.
+    Parsed pages are cached by a hash of their source, so resetting the soup on an unchanged page does not re-parse it.
+    Listing pages can be parsed scoped to their containers (only=selectors), and a replaced soup is decomposed,
+    so memory stays flat over long runs.
+
+    resources is a ResourcePolicy or a preset name ("none", "extraction-only", "html-only") of resources
+    the browser does not download (see resources.py); navigate_to can override it for a single page.
+
+    driver_manager starts the drivers (by default one DriverManager shared by all scrapers). With standby,
+    a second browser is kept running in the background, so restart() does not wait for a cold start.
+
+    cache is an optional ResponseCache (see cache.py) used by fetch, both over HTTP and for its browser fallback.
     """
     default_options = Options()
     default_options.add_argument("--disable-extensions")
@@ -55,45 +95,184 @@ class WebScraper:
     default_options.add_argument("--disable-dev-shm-usage")
     
     
-    def __init__(self, chrome_options:Options=default_options, headless:bool=True, log_level:int=0):
+    def __init__(self, chrome_options:Options=default_options, headless:bool=True, log_level:int=0, parser:str=None,
+                 resources:Union[str, ResourcePolicy]=None, driver_manager:DriverManager=None, standby:bool=False,
+                 cache:ResponseCache=None):
         self.writer = None
         self.log_level = log_level
+        self.parser = SoupParser(parser)
+        self.soup = None
+        self.soup_index = None
+        self.soup_scoped = False
+        self.fetcher = None
+        self.cache = cache
+        self.cookies_synced = False
+        self.pool = None
+        self.page_count = 0
+        self.resources = resource_policy(resources)
+        self.active_resources = None
+        # The options are changed below, and the default ones are shared by every scraper
+        chrome_options = copy.deepcopy(chrome_options)
         if headless:
             chrome_options.add_argument("--headless")
             if self.log_level >= 2: log('Running in headless mode')
+        self.resources.apply_preferences(chrome_options)
 
-        chromedriver_path = os.path.join(os.path.dirname(__file__), 'chrome', 'chromedriver.exe')
-        for i in range(3):
-            try:
-                self.driver = webdriver.Chrome(executable_path=chromedriver_path, options=chrome_options)
-                self.driver.maximize_window()
-                log('Chrome driver started')
-                self.cookieManager = CookiesCRUD(driver=self.driver) 
-                #self.localStorageManager = LocalStorageCRUD(driver=self.driver)
-                break
-            except Exception:
-                
-                if self.log_level >= 1: log("Chromedriver not found, downloading...")
-                try:
-                    ChromeDownloader(log_level=log_level).run()
-                    if self.log_level >= 1: log("Chromedriver downloaded, retrying...")
-                except Exception as e:
-                    if self.log_level >= 1: log(f"Error: {e}")
-                    if self.log_level >= 1: log("Chromedriver download failed, retrying...")
-
-                if i == 2:
-                    raise Exception("Chromedriver downloading failed. Download manually and retry.")
+        self.chrome_options = chrome_options
+        self.standby = standby
+        self.driver_manager = driver_manager or DriverManager.shared()
+        self._start_driver()
+
+    def _start_driver(self):
+        self.driver = self.driver_manager.start(self.chrome_options, standby=self.standby)
+        self.driver.maximize_window()
+        log('Chrome driver started')
+        self.cookieManager = CookiesCRUD(driver=self.driver) 
+        self.driver_elements = DriverElements(driver=self.driver)
+        #self.localStorageManager = LocalStorageCRUD(driver=self.driver)
+        self.active_resources = None
+        self._use_resources(self.resources)
+
+    def restart(self):
+        """Quits the browser and continues on a new one, which is already running when standby is set."""
+        if self.log_level >= 2: log('Restarting Chrome driver')
+        self.driver.quit()
+        self._start_driver()
+        self.page_count = 0
+        self.cookies_synced = False
 
     def quit(self):
         if self.log_level >= 2: log('Closing Chrome driver')
         self.driver.quit()
 
-    def navigate_to(self, url):
+    def wait_for(self, condition:Condition, timeout:float=10) -> bool:
+        """
+        Waits until condition (see waits.py: element_present, elements_rendered, dom_quiescent, network_idle, all_of)
+        is met, for at most timeout seconds. Returns False if it was not met in time.
+        """
+        return wait_for(self.driver, condition, timeout)
+
+    def _use_resources(self, policy:ResourcePolicy):
+        if policy is self.active_resources:
+            return
+        try:
+            policy.apply(self.driver)
+            self.active_resources = policy
+        except Exception as e:
+            if self.log_level >= 1: log(f"Resource policy not applied: {e}")
+
+    def navigate_to(self, url, wait:Condition=None, timeout:float=10, resources:Union[str, ResourcePolicy]=None, cached:bool=False,
+                    only:Sequence[str]=None, parse:bool=True):
+        """
+        Loads url in the browser, optionally waiting for a condition (see wait_for).
+        resources overrides the resource policy for this page only (e.g. "none" for a page that needs its scripts).
+        cached: serve the page from the response cache when it holds a fresh copy, without moving the driver,
+                and store the rendered page otherwise (only for pages that are read, not interacted with)
+        only: parse only the subtrees matching these selectors (see reset_soup)
+        parse: False for a page that is only read in the browser (extract(in_browser=True), find_web_elements):
+               its source is neither transferred nor parsed, and the soup is empty until reset_soup
+        """
+        if cached and self.cache is not None:
+            entry = self.cache.get(url)
+            if entry is not None and entry.fresh:
+                if self.log_level >= 2: log(f'Serving {url} from the cache')
+                self._load_html(entry.body, only)
+                return
+
         if self.log_level >= 2: log(f'Navigating to {url}')
+        self._use_resources(self.resources if resources is None else resource_policy(resources))
         self.driver.get(url)
-        self.driver_elements = self.driver.find_elements_by_xpath('//*')
-        self.reset_soup()
+        if wait is not None:
+            self.wait_for(wait, timeout)
+        self.page_count += 1
+        self.driver_elements.invalidate()
+        self.cookies_synced = False
+        if not parse:
+            self._set_soup(None)
+            return
+        html = self.driver.page_source
+        self._load_html(html, only)
+        if cached and self.cache is not None:
+            self.cache.put(url, html)
+
+    def fetch(self, url, required=(), only:Sequence[str]=None):
+        """
+        Loads url into the soup with a plain HTTP GET over a pooled session carrying the browser's cookies,
+        falling back to navigate_to when the response looks JS-gated or incomplete.
+        required: substrings a complete page must contain (e.g. the id of the element to scrape)
+        The driver does not move when the HTTP path succeeds, so get_web_elements is only meaningful after navigate_to.
+        Returns True if the page was served over HTTP.
+        """
+        html = self.http_fetcher().get(url, required)
+        if html is None:
+            if self.log_level >= 2: log(f'HTTP fetch of {url} incomplete, using the browser')
+            self.navigate_to(url, cached=True, only=only)
+            return False
+        if self.log_level >= 2: log(f'Fetched {url}')
+        self._load_html(html, only)
+        return True
         
+    def http_fetcher(self) -> HttpFetcher:
+        """
+        The pooled HTTP fetcher used by fetch, with the browser's user agent and up to date cookies.
+        Its get() is safe to call from other threads (e.g. a ConcurrentFetcher work function).
+        """
+        if self.fetcher is None:
+            self.fetcher = HttpFetcher(user_agent=self.driver.execute_script("return navigator.userAgent"), cache=self.cache)
+        if not self.cookies_synced:
+            self.fetcher.sync_cookies(self.cookieManager.read_all())
+            self.cookies_synced = True
+        return self.fetcher
+
+    def paginator(self, url, next_page:Callable, page_url:Callable=None, only:Sequence[str]=None, parse:bool=True) -> Paginator:
+        """
+        Returns a Paginator over the listing at url, which keeps its position across go_to(page) calls.
+        next_page() must move the browser to the next page; page_url(url, page), if given, builds page urls directly.
+        only: parse the listing pages scoped to these selectors (see reset_soup)
+        parse: False when the listing pages are only read in the browser (see navigate_to)
+        """
+        refresh = (lambda: self.reset_soup(only)) if parse else (lambda: self._set_soup(None))
+        return Paginator(url, lambda url: self.navigate_to(url, only=only, parse=parse), next_page, refresh,
+                         self.current_url, page_url)
+
+    def current_url(self) -> str:
+        return self.driver.current_url
+
+    @contextmanager
+    def new_tab(self):
+        """
+        Runs the block in a new browser tab, then closes it and returns to the page and soup it left,
+        e.g. to visit a detail page without moving a listing off the position its Paginator keeps.
+        """
+        previous = self.driver.current_window_handle
+        handles = set(self.driver.window_handles)
+        active_resources = self.active_resources
+        with self._keep_soup():
+            self.driver.execute_script("window.open('about:blank')")
+            self.driver.switch_to.window(next(handle for handle in self.driver.window_handles if handle not in handles))
+            # The resource policy is set per tab
+            self.active_resources = None
+            try:
+                yield
+            finally:
+                self.driver.close()
+                self.driver.switch_to.window(previous)
+                self.active_resources = active_resources
+
+    @contextmanager
+    def _keep_soup(self):
+        # The tree of the page is kept for when the block is done, instead of being released by the next page
+        soup, soup_index, soup_scoped = self.soup, self.soup_index, self.soup_scoped
+        self.soup_index = None
+        try:
+            yield
+        finally:
+            kept = soup_index.root if soup_index is not None else None
+            if self.soup_index is not None and self.soup_index.root is not kept:
+                self.parser.release(self.soup_index.root)
+            self.soup, self.soup_index, self.soup_scoped = soup, soup_index, soup_scoped
+            self.driver_elements.invalidate()
+
     def enter_value(self, element, value, enter=True):
         try:
             element.clear()
@@ -102,74 +281,167 @@ class WebScraper:
                 element.send_keys(Keys.ENTER)
         except NoSuchElementException:
             raise NotFoundError("Input not found")
+        finally:
+            # The page may have changed (e.g. a submitted search), so cached handles may be stale
+            self.driver_elements.invalidate()
 
-    def click_button(self, element):
+    def click_button(self, element, wait:Condition=None, timeout:float=10):
         try:
             element.click()
         except NoSuchElementException:
             raise NotFoundError("Button not found") 
+        finally:
+            # The page may have changed (e.g. the next page of a listing), so cached handles may be stale
+            self.driver_elements.invalidate()
+        if wait is not None:
+            self.wait_for(wait, timeout)
 
     def get_web_elements(self, bs_elements):
+        """
+        Maps parsed elements to the WebElements of the same DOM nodes with a single execute_script call.
+        Each element is located by its path of child indexes from <html>, so the mapping is exact;
+        elements whose path does not resolve to a node with the same tag (or all of them, if the script fails)
+        fall back to a CSS selector built from their tag, classes and id (all the matches of the selector,
+        once per selector). The WebElements are returned in the order of bs_elements.
+        Paths are not those of the page in a scoped soup, so its elements always use selectors.
+        """
+        if self.soup_scoped:
+            resolved = [None] * len(bs_elements)
+        else:
+            paths = node_paths(bs_elements)
+            try:
+                resolved = self.driver.execute_script(RESOLVE_PATHS_SCRIPT, [[path, element.name] for path, element in zip(paths, bs_elements)])
+            except Exception as e:
+                if self.log_level >= 1: log(f"Error: {e}")
+                resolved = [None] * len(bs_elements)
+
+        unresolved = sum(webelement is None for webelement in resolved)
+        if unresolved and self.log_level >= 2: log(f"\t{unresolved} elements not resolved by path, using selectors")
         found_selectors = set()
         webelements = []
-        for element in bs_elements:
-            selector = element.name
-            if 'class' in element.attrs:
-                if isinstance(element.attrs['class'], list):
-                    for _class in element.attrs['class']:
-                        selector += '.' + _class
-                else:
-                    selector += '.' + element.attrs['class']
-            if 'id' in element.attrs:
-                selector += '#' + element.attrs['id']
-            
+        for element, webelement in zip(bs_elements, resolved):
+            if webelement is not None:
+                webelements.append(webelement)
+                continue
+            selector = css_selector(element)
             if selector in found_selectors:
                 continue
-            elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
             found_selectors.add(selector)
-            webelements.extend(elements)
-        
+            webelements.extend(self.driver_elements.find(By.CSS_SELECTOR, selector))
+
         if self.log_level >= 2: log(f"\tfound {len(webelements)} web elements")
         return webelements
 
-    def reset_soup(self):
-        self.soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+    def find_web_elements(self, selector:str) -> list:
+        """WebElements matching a CSS selector on the page the browser is on, without going through the soup."""
+        return self.driver_elements.find(By.CSS_SELECTOR, selector)
+
+    def reset_soup(self, only:Sequence[str]=None):
+        """
+        Parses the page the browser is on into the soup.
+        only: selectors of the elements to keep (e.g. the card containers, plus the buttons to click):
+              only their subtrees are built, the rest of the page is skipped while parsing (see parsing.ScopeStrainer)
+        The previous tree is decomposed, so elements taken from it must not be used after the soup changes.
+        """
+        self._load_html(self.driver.page_source, only)
+
+    def _load_html(self, html:str, only:Sequence[str]=None):
+        self._set_soup(self.parser.parse(html, only), bool(only))
+
+    def _set_soup(self, soup, scoped:bool=False):
+        previous = self.soup_index.root if self.soup_index is not None else None
+        self.soup = soup
+        self.soup_scoped = scoped
+        if previous is not soup:
+            self.soup_index = SoupIndex(soup) if soup is not None else None
+            self.driver_elements.invalidate()
+            if previous is not None:
+                self.parser.release(previous)
+
+    def _keep(self, element):
+        # Detaches element from its page, whose tree is then dropped (not decomposed: the other matches may be in use)
+        root = self.soup_index.root
+        element.extract()
+        self.parser.release(root, decompose=False)
+        self.soup = element
+        self.soup_scoped = True
+        self.soup_index = SoupIndex(element)
 
     def filter_elements(self, get_web_elements=False, keep_soup=False, **kwargs):
-        filtered_elements = self.soup.find_all()
+        filters = {}
         for key, value in kwargs.items():
             if key in ["_class", "class"]:
-                key = "class"
-                filtered_elements = [elem for elem in filtered_elements if elem.has_attr(key) and value in elem[key]]
+                filters["class"] = value
             else:
-                key = key.replace("_", "-")
-                filtered_elements = [elem for elem in filtered_elements if elem.has_attr(key) and elem[key] == value]
+                filters[key.replace("_", "-")] = value
+        filtered_elements = self.soup_index.find_all(self.soup, filters)
         if self.log_level >= 2: log(f"found {len(filtered_elements)} elements with {kwargs}")
         #log(filtered_elements)
         if keep_soup:
-            self.soup = filtered_elements[0]
+            self._keep(filtered_elements[0])
         if get_web_elements:
             return filtered_elements, self.get_web_elements(filtered_elements)
         return filtered_elements, None
 
     def filter_similar_elements(self, get_web_elements=False, threshold:float=0.2, keep_soup=False, **kwargs):
-        filtered_elements = self.soup
+        filters = {}
         for key, value in kwargs.items():
-            if key in ["class_", "class"]:
-                key = "class"
-                filtered_elements = [elem for elem in filtered_elements if elem.has_attr(key) and any(Levenshtein.distance(value,x)/len(x) <= threshold for x in elem[key].split())]
+            if key in ["class_", "_class", "class"]:
+                filters["class"] = value
             else:
-                filtered_elements = [elem for elem in filtered_elements if elem.has_attr(key) and Levenshtein.distance(value, elem[key])/len(elem[key]) <= threshold]
+                filters[key.replace("_", "-")] = value
+        filtered_elements = self.soup_index.find_similar(self.soup, filters, threshold)
         
         if self.log_level >= 2: log(f"found {len(filtered_elements)} similar elements with {kwargs}")
         #log(filtered_elements)
         if keep_soup:
-            self.soup = filtered_elements
+            self._keep(filtered_elements[0])
         if get_web_elements:
             return filtered_elements, self.get_web_elements(filtered_elements)
         return filtered_elements, None
     
-    def save(self, file_name:str=None, elements:Union[str, list]=None):
+    def extract(self, schema:ExtractionSchema, in_browser:bool=False):
+        """
+        Extracts the schema records from the current soup.
+        With in_browser=True the schema runs in the page and only the records come back over the wire
+        (no page_source transfer and no parsing); if the script fails, the soup is refreshed and used instead.
+        """
+        if in_browser:
+            try:
+                records = schema.from_script(self.driver.execute_script(EXTRACT_SCRIPT, *schema.script_arguments()))
+                if self.log_level >= 2: log(f"extracted {len(records)} records in browser")
+                return records
+            except Exception as e:
+                if self.log_level >= 1: log(f"Error: {e}")
+                if self.log_level >= 1: log("In browser extraction failed, parsing the page")
+                self.reset_soup()
+        records = schema.extract(self.soup)
+        if self.log_level >= 2: log(f"extracted {len(records)} records")
+        return records
+
+    def open_sink(self, file_name:str, **kwargs) -> JsonLinesSink:
+        """
+        Opens a streaming JSON Lines sink in the scraped folder (segments scraped/<file_name>.00000.jsonl, ...).
+        kwargs are passed to JsonLinesSink (batch_size, flush_interval, max_segment_bytes).
+        """
+        return JsonLinesSink(os.path.join(os.getcwd(), 'scraped', file_name), **kwargs)
+
+    def open_store(self, file_name:str, **kwargs) -> SQLiteSink:
+        """
+        Opens a SQLite results store in the scraped folder; it can be passed to save() as sink.
+        kwargs are passed to SQLiteSink (batch_size, key_fields, observed).
+        """
+        return SQLiteSink(os.path.join(os.getcwd(), 'scraped', file_name), **kwargs)
+
+    def save(self, file_name:str=None, elements:Union[str, list]=None, sink=None):
+        """
+        Saves elements to scraped/<file_name>, rewriting the whole file.
+        If a sink (see open_sink and open_store) is given, the elements are appended to it instead of rewriting a file.
+        """
+        if sink is not None:
+            sink.write_many(elements if isinstance(elements, list) else [elements])
+            return
+
         scraped_dir = os.path.join(os.getcwd(), 'scraped')
         if not os.path.exists(scraped_dir):
             os.mkdir(scraped_dir)
@@ -182,6 +454,236 @@ class WebScraper:
             if self.log_level >= 1: log("Saving failed")
 
 
+class WebScraperPool:
+    """
+    Pool of WebScraper instances, each with its own Chrome process, profile folder and cookies.
+    Scrapers are handed out with checkout()/checkin() (or the session() context manager),
+    or jobs can be queued with submit(job, *args), which runs job(scraper, *args) on the next free scraper
+    and returns a concurrent.futures.Future; map(job, items) does the same for many items.
+    A scraper is recycled (quit and replaced by a fresh one) when it stops responding, when a job raises
+    a WebDriverException, after max_pages navigations, or when its JS heap grows past max_memory bytes;
+    other exceptions of a job (e.g. an extraction error on a bad page) are raised again and the scraper is kept.
+    With spare, one more scraper is kept started in the background and takes the place of the next recycled one.
+    The pooled scrapers are plain WebScrapers, started with the scraper_arguments given to the pool.
+    They run without standby: each one has its own profile folder, which a standby driver cannot share
+    (a recycled scraper starts on a new profile; use spare to have it started in advance).
+    """
+    scraper_arguments = ("chrome_options", "headless", "log_level", "parser", "resources", "driver_manager", "cache")
+
+    def __init__(self, size:int, chrome_options:Options=WebScraper.default_options, headless:bool=True, log_level:int=0, parser:str=None,
+                 resources:Union[str, ResourcePolicy]=None, driver_manager:DriverManager=None, cache:ResponseCache=None,
+                 max_pages:int=200, max_memory:int=None, spare:bool=False):
+        self.size = size
+        self.chrome_options = chrome_options
+        self.headless = headless
+        self.log_level = log_level
+        self.parser = parser
+        self.resources = resources
+        self.driver_manager = driver_manager
+        self.cache = cache
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.profiles_dir = tempfile.mkdtemp(prefix="scraper-pool-")
+        self.scrapers = set()
+        self.idle = queue.Queue()
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.spare = None
+        self.spare_executor = ThreadPoolExecutor(1) if spare else None
+
+        with ThreadPoolExecutor(size) as executor:
+            for scraper in executor.map(lambda _: self._start(), range(size)):
+                self.idle.put(scraper)
+        if self.spare_executor is not None:
+            self.spare = self.spare_executor.submit(self._start)
+        if self.log_level >= 2: log(f"Scraper pool of {size} drivers started")
+
+    def _start(self) -> WebScraper:
+        options = copy.deepcopy(self.chrome_options)
+        profile = tempfile.mkdtemp(dir=self.profiles_dir)
+        options.add_argument(f"--user-data-dir={profile}")
+        scraper = WebScraper(options, headless=self.headless, log_level=self.log_level, parser=self.parser, resources=self.resources,
+                             driver_manager=self.driver_manager, cache=self.cache)
+        scraper.profile = profile
+        with self.lock:
+            self.scrapers.add(scraper)
+        return scraper
+
+    def _stop(self, scraper:WebScraper):
+        with self.lock:
+            self.scrapers.discard(scraper)
+        try:
+            scraper.quit()
+        except Exception as e:
+            if self.log_level >= 1: log(f"Error: {e}")
+        shutil.rmtree(scraper.profile, ignore_errors=True)
+
+    def healthy(self, scraper:WebScraper) -> bool:
+        if scraper.page_count >= self.max_pages:
+            return False
+        try:
+            scraper.driver.current_url
+            if self.max_memory is not None:
+                used = scraper.driver.execute_script("return performance.memory ? performance.memory.usedJSHeapSize : 0")
+                if used > self.max_memory:
+                    return False
+        except Exception:
+            return False
+        return True
+
+    def recycle(self, scraper:WebScraper) -> WebScraper:
+        if self.log_level >= 2: log(f"Recycling scraper after {scraper.page_count} pages")
+        self._stop(scraper)
+        return self._take_spare()
+
+    def _take_spare(self) -> WebScraper:
+        if self.spare_executor is None:
+            return self._start()
+        with self.lock:
+            spare, self.spare = self.spare, self.spare_executor.submit(self._start)
+        try:
+            return spare.result()
+        except Exception as e:
+            if self.log_level >= 1: log(f"Spare scraper failed to start: {e}")
+            return self._start()
+
+    def checkout(self, timeout:float=None) -> WebScraper:
+        scraper = self.idle.get(timeout=timeout)
+        if not self.healthy(scraper):
+            scraper = self.recycle(scraper)
+        return scraper
+
+    def checkin(self, scraper:WebScraper, broken:bool=False):
+        if broken or not self.healthy(scraper):
+            scraper = self.recycle(scraper)
+        self.idle.put(scraper)
+
+    @contextmanager
+    def session(self, timeout:float=None):
+        scraper = self.checkout(timeout)
+        broken = False
+        try:
+            yield scraper
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.checkin(scraper, broken)
+
+    def _work(self):
+        while True:
+            task = self.jobs.get()
+            if task is None:
+                break
+            future, job, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with self.session() as scraper:
+                    future.set_result(job(scraper, *args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, job:Callable, *args) -> Future:
+        if not self.workers:
+            self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self.size)]
+            for worker in self.workers:
+                worker.start()
+        future = Future()
+        self.jobs.put((future, job, args))
+        return future
+
+    def map(self, job:Callable, items) -> list:
+        futures = [self.submit(job, item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        if self.spare_executor is not None:
+            self.spare_executor.shutdown(wait=True)
+        with self.lock:
+            scrapers = list(self.scrapers)
+        for scraper in scrapers:
+            self._stop(scraper)
+        shutil.rmtree(self.profiles_dir, ignore_errors=True)
+        if self.log_level >= 2: log("Scraper pool closed")
+
+
+RESOLVE_PATHS_SCRIPT = """
+return arguments[0].map(function (item) {
+    var node = document.documentElement;
+    for (var i = 0; node && i < item[0].length; i++) {
+        node = node.children[item[0][i]];
+    }
+    return node && node.localName === item[1] ? node : null;
+});
+"""
+
+def node_paths(bs_elements):
+    """
+    Returns, for each element, the indexes of its ancestors (and itself) among their parent's child elements,
+    starting below the <html> element, i.e. the path document.documentElement.children[i]...children[j] leads to it.
+    """
+    sibling_indexes = {}
+    paths = []
+    for element in bs_elements:
+        path = []
+        while element.parent is not None and element.parent.parent is not None:
+            parent = element.parent
+            if id(parent) not in sibling_indexes:
+                sibling_indexes[id(parent)] = {id(child): i for i, child in enumerate(child for child in parent.contents if isinstance(child, Tag))}
+            path.append(sibling_indexes[id(parent)][id(element)])
+            element = parent
+        paths.append(path[::-1])
+    return paths
+
+
+def css_selector(element) -> str:
+    """CSS selector of a parsed element from its tag, classes and id."""
+    selector = element.name
+    if 'class' in element.attrs:
+        if isinstance(element.attrs['class'], list):
+            for _class in element.attrs['class']:
+                selector += '.' + _class
+        else:
+            selector += '.' + element.attrs['class']
+    if 'id' in element.attrs:
+        selector += '#' + element.attrs['id']
+    return selector
+
+
+class DriverElements:
+    """
+    Lazy registry of WebElement handles for the current page.
+    Handles are only requested from chromedriver when a caller asks for them, cached per (by, value),
+    and dropped when the page may have changed (navigation, a click or a value entered, or a new soup).
+        methods:
+            find(by, value)
+            all()
+            invalidate()
+    """
+    def __init__(self, driver):
+        self.driver = driver
+        self.handles = {}
+
+    def find(self, by, value):
+        key = (by, value)
+        if key not in self.handles:
+            self.handles[key] = self.driver.find_elements(by, value)
+        return self.handles[key]
+
+    def all(self):
+        return self.find(By.XPATH, '//*')
+
+    def invalidate(self):
+        self.handles.clear()
+
+
 class NotFoundError(Exception):
     def __init__(self, message):
         super().__init__(message)
@@ -0,0 +1,292 @@
+import glob
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Tuple
+
+Logger = logging.getLogger(__name__)
+
+class JsonLinesSink:
+    """
+    Append-only JSON Lines sink: open once, write(record) as records come, flush() and close() at the end.
+    Records (dicts, or objects with a to_dict method such as DealRecord) are queued and written by a background thread
+    in batches of batch_size records, or every flush_interval seconds, so writes never block the scraping thread on disk I/O.
+    Output goes to numbered segments <path>.00000.jsonl, <path>.00001.jsonl, ... and a new segment is started
+    once the current one exceeds max_segment_bytes. Reopening the same path appends to the last segment,
+    after dropping a partially written last line left by a crash.
+        methods:
+            write(record)
+            write_many(records)
+            flush()
+            close()
+    """
+    def __init__(self, path:str, batch_size:int=100, flush_interval:float=1.0, max_segment_bytes:int=64 * 1024 * 1024):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.queue = queue.Queue()
+        self.error = None
+        self.closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        segments = segment_paths(path)
+        self.segment = len(segments) - 1 if segments else 0
+        self.file = self._open_segment(repair=bool(segments))
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _segment_path(self, segment:int) -> str:
+        return f"{self.path}.{segment:05d}.jsonl"
+
+    def _open_segment(self, repair:bool=False):
+        segment_path = self._segment_path(self.segment)
+        if repair and os.path.exists(segment_path):
+            with open(segment_path, "rb+") as file:
+                data = file.read()
+                end = data.rfind(b"\n") + 1
+                if end != len(data):
+                    Logger.warning(f"Dropping {len(data) - end} bytes of a partial record in {segment_path}")
+                    file.truncate(end)
+        return open(segment_path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.segment += 1
+        self.file = self._open_segment()
+
+    def _write_batch(self, batch:list):
+        if not batch:
+            return
+        try:
+            self.file.write("".join(batch))
+            self.file.flush()
+        finally:
+            batch.clear()
+        if self.file.tell() >= self.max_segment_bytes:
+            self._rotate()
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._safely(self._write_batch, batch)
+                continue
+
+            if isinstance(item, threading.Event):
+                self._safely(self._write_batch, batch)
+                self._safely(os.fsync, self.file.fileno())
+                item.set()
+                continue
+            if item is None:
+                self._safely(self._write_batch, batch)
+                self._safely(os.fsync, self.file.fileno())
+                self.file.close()
+                return
+
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._safely(self._write_batch, batch)
+
+    def _safely(self, function, *args):
+        try:
+            function(*args)
+        except Exception as e:
+            Logger.error(f"Error while writing {self.path}: {e}")
+            self.error = e
+
+    def _check(self):
+        if self.closed:
+            raise SinkClosedError(f"Sink {self.path} is closed")
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def write(self, record):
+        self._check()
+        self.queue.put(json.dumps(as_dict(record), ensure_ascii=False, skipkeys=True) + "\n")
+
+    def write_many(self, records:Iterable):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """Blocks until every record written so far is on disk."""
+        self._check()
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+        self._check()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class SQLiteSink:
+    """
+    SQLite results store with the same write/flush/close interface as JsonLinesSink.
+    Records are buffered and written every batch_size records (or on flush/close) in a single transaction:
+    the deals table is upserted on the record key (the first of key_fields that is set, e.g. data-deal-id or label),
+    keeping first_seen, last_seen and the record as JSON (the fields of a new record replace the stored ones, the
+    fields it lacks are kept, so a card saved without its details keeps them), and one row per record is appended
+    to the observations time series with the observed columns (column name -> record field).
+    The database runs in WAL mode, so readers can query it while the scraper writes.
+    The sink can be written from several threads (e.g. Pipeline workers).
+    """
+    default_observed = {"percentage": "percentage", "price": "price", "rating": "rating"}
+    missing_values = (None, "NaN", "")
+
+    def __init__(self, path:str, batch_size:int=100, key_fields:Tuple[str, ...]=("deal_id", "label"), observed:Dict[str, str]=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.key_fields = key_fields
+        self.observed = observed or self.default_observed
+        self.pending = []
+        self.lock = threading.RLock()
+        for column in self.observed:
+            if not column.isidentifier():
+                raise ValueError(f"Invalid column name: {column}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS deals (
+                    key TEXT PRIMARY KEY,
+                    deal_id TEXT,
+                    label TEXT,
+                    link TEXT,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    data TEXT
+                )""")
+            self.connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS observations (
+                    key TEXT NOT NULL,
+                    observed_at REAL NOT NULL
+                    {"".join(f", {column}" for column in self.observed)}
+                )""")
+            existing = {row[1] for row in self.connection.execute("PRAGMA table_info(observations)")}
+            for column in self.observed:
+                if column not in existing:
+                    self.connection.execute(f"ALTER TABLE observations ADD COLUMN {column}")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS deals_deal_id ON deals (deal_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS deals_last_seen ON deals (last_seen)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS observations_key_time ON observations (key, observed_at)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS observations_time ON observations (observed_at)")
+
+    def _key(self, record:dict):
+        for field in self.key_fields:
+            if record.get(field) not in self.missing_values:
+                return str(record[field])
+        return None
+
+    def _value(self, record:dict, field:str):
+        value = record.get(field)
+        return None if value in self.missing_values else value
+
+    def write(self, record:dict):
+        with self.lock:
+            self.pending.append((time.time(), as_dict(record)))
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def write_many(self, records:Iterable[dict]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        deals = []
+        observations = []
+        for observed_at, record in self.pending:
+            key = self._key(record)
+            if key is None:
+                Logger.warning(f"Skipping a record without {' or '.join(self.key_fields)}")
+                continue
+            deals.append((key, self._value(record, "deal_id"), self._value(record, "label"), self._value(record, "link"),
+                          observed_at, observed_at, json.dumps(record, ensure_ascii=False, skipkeys=True)))
+            observations.append((key, observed_at) + tuple(self._value(record, field) for field in self.observed.values()))
+        self.pending = []
+
+        columns = "".join(f", {column}" for column in self.observed)
+        placeholders = ", ?" * len(self.observed)
+        with self.connection:
+            self.connection.executemany("""
+                INSERT INTO deals (key, deal_id, label, link, first_seen, last_seen, data) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    deal_id = COALESCE(excluded.deal_id, deal_id),
+                    label = COALESCE(excluded.label, label),
+                    link = COALESCE(excluded.link, link),
+                    last_seen = excluded.last_seen,
+                    data = json_patch(COALESCE(data, '{}'), excluded.data)""", deals)
+            self.connection.executemany(f"INSERT INTO observations (key, observed_at{columns}) VALUES (?, ?{placeholders})", observations)
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            self._flush()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def as_dict(record) -> dict:
+    """Records with a to_dict method (e.g. records.DealRecord) are written as their dict."""
+    to_dict = getattr(record, "to_dict", None)
+    return record if to_dict is None else to_dict()
+
+def segment_paths(path:str) -> list:
+    return sorted(glob.glob(glob.escape(path) + ".[0-9][0-9][0-9][0-9][0-9].jsonl"))
+
+def read_jsonl(path:str) -> Iterator[dict]:
+    """Yields the records of every segment of a JsonLinesSink path, skipping a partially written last line."""
+    for segment_path in segment_paths(path):
+        with open(segment_path, encoding="utf-8") as file:
+            for line in file:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+
+
+class SinkClosedError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -0,0 +1,22 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# utils and v2/main call logging.basicConfig(filename=...) at import time, which would append to a
+# log file in the working directory; with a handler already on the root logger those calls do nothing
+logging.getLogger().addHandler(logging.NullHandler())
+logging.getLogger().setLevel(logging.INFO)
+
+@pytest.fixture(autouse=True, scope="session")
+def log_file(tmp_path_factory):
+    handler = logging.FileHandler(tmp_path_factory.mktemp("logs") / "logs.log")
+    handler.setFormatter(logging.Formatter('%(asctime)s, %(levelname)s %(message)s', datefmt='%H:%M:%S'))
+    logging.getLogger().addHandler(handler)
+    yield handler.baseFilename
+    logging.getLogger().removeHandler(handler)
+    handler.close()
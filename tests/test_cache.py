@@ -0,0 +1,91 @@
+import time
+
+import pytest
+import requests
+
+from cache import ResponseCache, normalize_url
+from fetcher import HttpFetcher
+
+def test_tracking_parameters_and_ref_segment_are_dropped():
+    assert normalize_url("HTTPS://www.Amazon.it:443/dp/B0C1/ref=sr_1_3?utm_source=x&qid=17&pf_rd_p=a#reviews") == \
+        "https://www.amazon.it/dp/B0C1"
+
+def test_query_parameters_are_sorted():
+    assert normalize_url("https://www.amazon.it/s?k=tv&i=electronics") == "https://www.amazon.it/s?i=electronics&k=tv"
+
+def test_seller_and_variant_parameters_are_kept():
+    # smid selects the seller of the offer and th the variant shown: different pages
+    assert normalize_url("https://www.amazon.it/dp/B0C1?smid=A1&th=1") == "https://www.amazon.it/dp/B0C1?smid=A1&th=1"
+    assert normalize_url("https://www.amazon.it/dp/B0C1?smid=A1") != normalize_url("https://www.amazon.it/dp/B0C1?smid=A2")
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+def test_entries_go_stale_after_their_ttl(tmp_path, clock):
+    with ResponseCache(str(tmp_path / "cache.db"), rules=[("*/deals*", None), ("*/dp/*", 300), ("*/cart*", 0)]) as cache:
+        assert cache.ttl("https://www.amazon.it/dp/B01") == 300 and cache.ttl("https://www.amazon.it/s?k=tv") == 15 * 60
+        cache.put("https://www.amazon.it/deals", "listing")
+        cache.put("https://www.amazon.it/cart", "cart")
+        cache.put("https://www.amazon.it/dp/B01?ref=x", "product", etag='"v1"')
+        assert cache.get("https://www.amazon.it/deals") is None
+        assert not cache.get("https://www.amazon.it/cart").fresh
+        entry = cache.get("https://www.amazon.it/dp/B01")
+        assert entry.fresh and entry.body == "product" and entry.validators() == {"If-None-Match": '"v1"'}
+        clock[0] += 301
+        assert not cache.get("https://www.amazon.it/dp/B01").fresh
+        cache.refresh("https://www.amazon.it/dp/B01")
+        assert cache.get("https://www.amazon.it/dp/B01").fresh
+
+def test_offline_cache_serves_stale_entries(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    with ResponseCache(path, default_ttl=60) as cache:
+        cache.put("https://www.amazon.it/dp/B01", "product")
+    clock[0] += 3600
+    with ResponseCache(path, default_ttl=60, offline=True) as cache:
+        assert cache.get("https://www.amazon.it/dp/B01").fresh
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    bodies = {name: "".join(chr(0x4e00 + (i * 7919 + ord(name)) % 20000) for i in range(400)) for name in "abcd"}
+    with ResponseCache(str(tmp_path / "cache.db")) as cache:
+        for name in "abc":
+            clock[0] += 1
+            cache.put(f"https://www.amazon.it/dp/{name}", bodies[name])
+        size = cache.total_bytes // 3
+        cache.max_bytes = 3 * size + size // 2
+        clock[0] += 1
+        cache.get("https://www.amazon.it/dp/a")
+        clock[0] += 1
+        cache.put("https://www.amazon.it/dp/d", bodies["d"])
+        assert [cache.get(f"https://www.amazon.it/dp/{name}") is not None for name in "abcd"] == [True, False, True, True]
+        assert cache.total_bytes <= cache.max_bytes
+
+def response(status, body="", content_type="text/html; charset=utf-8", headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result._content = body.encode("utf-8")
+    result.encoding = "utf-8"
+    result.headers.update({"Content-Type": content_type, **(headers or {})})
+    return result
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+def test_not_modified_pages_still_need_the_required_markers(tmp_path, clock):
+    with ResponseCache(str(tmp_path / "cache.db"), default_ttl=60) as cache:
+        fetcher = HttpFetcher(cache=cache, min_length=10)
+        # A page rendered by the browser fallback, without the product title
+        cache.put("https://www.amazon.it/dp/B01", "<html>captcha page</html>", etag='"v1"')
+        clock[0] += 120
+        fetcher.session = FakeSession(response(304), response(304))
+        assert fetcher.get("https://www.amazon.it/dp/B01", required=("productTitle",)) is None
+        assert fetcher.session.requests[0][1] == {"If-None-Match": '"v1"'}
+        assert fetcher.get("https://www.amazon.it/dp/B01") == "<html>captcha page</html>"
@@ -0,0 +1,63 @@
+import time
+
+from cache import normalize_url
+from dedup import BloomFilter, ChangeTracker, MemoryDedupStore, SQLiteDedupStore, fingerprint
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"deal-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_sqlite_store_survives_a_restart(tmp_path):
+    path = str(tmp_path / "seen.db")
+    with SQLiteDedupStore(path) as store:
+        assert not store.check_and_add("a1", "fingerprint")
+        assert store.check_and_add("a1")
+    with SQLiteDedupStore(path) as store:
+        assert store.get("a1")[0] == "fingerprint"
+        assert not store.seen("b2")
+
+def test_sqlite_store_prunes_expired_and_oldest_keys(tmp_path):
+    with SQLiteDedupStore(str(tmp_path / "seen.db"), ttl=60, max_entries=3, prune_every=5) as store:
+        store._put("old", None, time.time() - 120)
+        assert not store.seen("old")
+        for i in range(4):
+            store.add(f"deal-{i}")
+        assert store.connection.execute("SELECT COUNT(*) FROM seen").fetchone()[0] == 3
+        assert not store.seen("deal-0") and store.seen("deal-3")
+
+def test_memory_store_is_bounded():
+    store = MemoryDedupStore(max_entries=2)
+    for key in "abc":
+        store.add(key)
+    assert [store.seen(key) for key in "abc"] == [False, True, True]
+
+def test_change_tracker_refreshes_changed_or_expired_cards():
+    store = MemoryDedupStore(ttl=60)
+    tracker = ChangeTracker(store, ("percentage", "text", "link"), normalize={"link": normalize_url})
+    card = {"deal_id": "a1", "percentage": "-30%", "text": "Offerta a tempo", "link": "https://www.amazon.it/dp/B01/ref=dl_1?pd_rd_w=x"}
+    assert tracker.needs_refresh("a1", card)
+    tracker.mark("a1", card)
+    # Tracking parameters change on every load, the deal does not
+    assert not tracker.needs_refresh("a1", dict(card, link="https://www.amazon.it/dp/B01/ref=dl_7?pd_rd_w=y&ref_=z"))
+    assert tracker.needs_refresh("a1", dict(card, link="https://www.amazon.it/dp/B02"))
+    assert tracker.needs_refresh("a1", dict(card, percentage="-35%"))
+    store._put("a1", fingerprint(card, tracker.fields, tracker.normalize), time.time() - 120)
+    assert tracker.needs_refresh("a1", card)
+
+def test_keys_stay_visible_while_the_bloom_filter_is_rebuilt(tmp_path):
+    with SQLiteDedupStore(str(tmp_path / "seen.db")) as store:
+        store.add("a1")
+        seen_during_rebuild = []
+        keys = store._keys
+        def slow_keys():
+            for key in keys():
+                seen_during_rebuild.append(store.seen("a1"))
+                yield key
+        store._keys = slow_keys
+        store.prune()
+        assert seen_during_rebuild == [True] and store.seen("a1")
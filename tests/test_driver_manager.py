@@ -0,0 +1,145 @@
+import http.server
+import io
+import json
+import os
+import stat
+import sys
+import threading
+import zipfile
+
+import pytest
+from selenium.common.exceptions import SessionNotCreatedException
+
+import driver_manager
+from driver_manager import MANIFEST_NAME, DriverDownloadError, DriverManager
+
+pytestmark = pytest.mark.skipif(sys.platform.startswith("win"), reason="the fake Chrome is a shell script")
+
+def driver_zip(folder="chromedriver-linux64/", content=b""):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(f"{folder}LICENSE.chromedriver", "license")
+        archive.writestr(f"{folder}chromedriver", b"#!/bin/sh\necho fake chromedriver " + content + b"\n")
+    return buffer.getvalue()
+
+class DownloadServer:
+    """Local stand-in for the Chrome for Testing and legacy chromedriver download servers."""
+    def __init__(self):
+        self.requests = []
+        self.files = {}
+        self.builds = {}
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                body, etag = server.files.get(self.path, (None, None))
+                if body is None:
+                    self.send_error(404)
+                    return
+                if etag is not None and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def publish(self, build, version):
+        self.files[f"/cft/{version}/chromedriver-linux64.zip"] = (driver_zip(content=version.encode()), None)
+        self.builds[build] = {"version": version, "downloads": {"chromedriver": [
+            {"platform": "linux64", "url": f"{self.url}/cft/{version}/chromedriver-linux64.zip"}]}}
+        self.files[f"/cft/{MANIFEST_NAME}"] = (json.dumps({"builds": self.builds}).encode(), f'"{len(self.builds)}"')
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def server():
+    server = DownloadServer()
+    yield server
+    server.close()
+
+def fake_chrome(path, version):
+    with open(path, "w") as file:
+        file.write(f"#!/bin/sh\necho 'Google Chrome {version} '\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return str(path)
+
+def manager(tmp_path, server, chrome):
+    return DriverManager(cache_dir=str(tmp_path / "cache"), base_url=f"{server.url}/cft", legacy_base_url=f"{server.url}/legacy",
+                         platform="linux64", chrome_binaries=[chrome])
+
+def test_downloads_unpacks_and_caches_the_driver(tmp_path, server):
+    server.publish("120.0.6099", "120.0.6099.109")
+    chrome = fake_chrome(tmp_path / "chrome", "120.0.6099.71")
+    path = manager(tmp_path, server, chrome).driver_path()
+    with open(path, "rb") as file:
+        assert b"fake chromedriver 120.0.6099.109" in file.read()
+    assert os.access(path, os.X_OK)
+    assert server.requests == [f"/cft/{MANIFEST_NAME}", "/cft/120.0.6099.109/chromedriver-linux64.zip"]
+
+    # A warm start reads the probe and the driver index from the cache: no request
+    warm = manager(tmp_path, server, chrome)
+    warm._probe = lambda binary: pytest.fail("Chrome probed again")
+    assert warm.driver_path() == path
+    assert len(server.requests) == 2
+
+def test_forget_probe_detects_a_chrome_update(tmp_path, server):
+    server.publish("120.0.6099", "120.0.6099.109")
+    chrome = fake_chrome(tmp_path / "chrome", "120.0.6099.71")
+    drivers = manager(tmp_path, server, chrome)
+    assert drivers.chrome_version() == "120.0.6099.71"
+    # Updated in place, with the same modification time
+    mtime = os.path.getmtime(chrome)
+    fake_chrome(tmp_path / "chrome", "121.0.6167.85")
+    os.utime(chrome, (mtime, mtime))
+    assert drivers.chrome_version() == "120.0.6099.71"
+    drivers.forget_probe()
+    assert drivers.chrome_version() == "121.0.6167.85"
+
+def test_a_failed_session_probes_again_and_retries(tmp_path, server, monkeypatch):
+    server.publish("120.0.6099", "120.0.6099.109")
+    server.publish("121.0.6167", "121.0.6167.85")
+    chrome = fake_chrome(tmp_path / "chrome", "120.0.6099.71")
+    drivers = manager(tmp_path, server, chrome)
+    old_driver = drivers.driver_path()
+    # Chrome updated itself, keeping its modification time: the cached probe is stale
+    mtime = os.path.getmtime(chrome)
+    fake_chrome(tmp_path / "chrome", "121.0.6167.85")
+    os.utime(chrome, (mtime, mtime))
+    started = []
+    def chrome_driver(executable_path, options):
+        started.append(executable_path)
+        if executable_path == old_driver:
+            raise SessionNotCreatedException("This version of ChromeDriver only supports Chrome version 120")
+        return "driver"
+    monkeypatch.setattr(driver_manager.webdriver, "Chrome", chrome_driver)
+    assert drivers._launch(driver_manager.Options()) == "driver"
+    assert started[0] == old_driver and len(started) == 2
+    with open(started[1], "rb") as file:
+        assert b"121.0.6167.85" in file.read()
+    assert drivers.state["probe"]["version"] == "121.0.6167.85"
+
+def test_legacy_builds_and_missing_drivers(tmp_path, server):
+    server.files["/legacy/LATEST_RELEASE_114.0.5735"] = (b"114.0.5735.90", None)
+    server.files["/legacy/114.0.5735.90/chromedriver_linux64.zip"] = (driver_zip(folder=""), None)
+    server.publish("120.0.6099", "120.0.6099.109")
+    legacy = manager(tmp_path, server, fake_chrome(tmp_path / "chrome", "114.0.5735.198"))
+    with open(legacy.driver_path(), "rb") as file:
+        assert file.read().startswith(b"#!/bin/sh")
+    missing = manager(tmp_path / "other", server, fake_chrome(tmp_path / "chrome", "122.0.6261.57"))
+    with pytest.raises(DriverDownloadError):
+        missing.driver_path()
@@ -0,0 +1,135 @@
+import json
+import random
+import shutil
+import subprocess
+
+import pytest
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from extraction import EXTRACT_SCRIPT, ExtractionSchema, Field, Selector
+
+SCHEMA = ExtractionSchema(
+    container="div.card",
+    fields={
+        "label": Field(attribute="aria-label", default="NaN"),
+        "percentage": Field(".badge", default="NaN"),
+        "link": Field("a.link", attribute="href", default="NaN"),
+        "price": Field("span[data-price]", attribute="data-price"),
+    })
+
+def random_page(seed):
+    rng = random.Random(seed)
+    cards = []
+    for i in range(rng.randint(0, 15)):
+        parts = [rng.choice(['<span class="badge">-%d%%</span>' % rng.randint(5, 70), '<p>Offerta</p>', ''])]
+        if rng.random() < 0.8:
+            parts.append(f'<div class="info"><a class="link" href="/dp/{i}">Vai</a><a class="link" href="/dp/x{i}">Altro</a></div>')
+        if rng.random() < 0.5:
+            parts.append(f'<span data-price="{rng.randint(1, 99)},99">prezzo</span>')
+        rng.shuffle(parts)
+        label = f' aria-label="Deal {i}"' if rng.random() < 0.9 else ""
+        cards.append(f'<div class="card extra"{label}>{"".join(parts)}</div>')
+    return f'<html><body><div class="grid"><span class="badge">fuori</span>{"".join(cards)}</div></body></html>'
+
+def reference(soup):
+    records = []
+    for card in soup.select("div.card"):
+        record = {}
+        for name, field in SCHEMA.fields.items():
+            node = card.select_one(field.selector.selector) if field.selector else card
+            if node is None or field.attribute is not None and not node.has_attr(field.attribute):
+                record[name] = field.default
+            else:
+                record[name] = node.text if field.attribute is None else node[field.attribute]
+        records.append(record)
+    return records
+
+def test_extract_matches_css_select():
+    for seed in range(50):
+        soup = BeautifulSoup(random_page(seed), "html.parser")
+        assert SCHEMA.extract(soup) == reference(soup)
+
+def test_page_schema_without_container():
+    schema = ExtractionSchema(fields={"rating": Field("#acrCustomerReviewText", default="NaN"), "price": Field(".price span")})
+    soup = BeautifulSoup('<div id="acrCustomerReviewText">1.024 voti</div><div class="price"><span>9,99 €</span></div>', "html.parser")
+    assert schema.extract(soup) == [{"rating": "1.024 voti", "price": "9,99 €"}]
+
+def test_selectors():
+    soup = BeautifulSoup('<div class="a b" data-x="1"><span id="s">t</span></div>', "html.parser")
+    span = soup.find("span")
+    assert Selector("div.a span#s").matches(span)
+    assert not Selector("div.c span").matches(span)
+    assert Selector("[data-x=1]").matches(soup.div) and Selector("[data-x]").matches(soup.div)
+    assert SCHEMA.script_arguments()[0] == "div.card"
+
+def test_script_rows_get_the_field_defaults():
+    rows = [["Deal 1", "-30%", "/dp/1", None], [None, None, None, "9,99"]]
+    assert SCHEMA.from_script(rows) == [
+        {"label": "Deal 1", "percentage": "-30%", "link": "/dp/1", "price": None},
+        {"label": "NaN", "percentage": "NaN", "link": "NaN", "price": "9,99"},
+    ]
+
+# A DOM stand-in with just what EXTRACT_SCRIPT uses; selectors are matched by soupsieve on the Python side
+DOM_SHIM = """
+const input = JSON.parse(require("fs").readFileSync(0, "utf-8"));
+class Element {
+    constructor(node) {
+        this.node = node;
+        this.children = node.children.map(child => typeof child === "string" ? child : new Element(child));
+    }
+    get textContent() {
+        return this.children.map(child => typeof child === "string" ? child : child.textContent).join("");
+    }
+    getAttribute(name) {
+        return name in this.node.attrs ? this.node.attrs[name] : null;
+    }
+    descendants() {
+        return this.children.filter(child => typeof child !== "string").flatMap(child => [child, ...child.descendants()]);
+    }
+    querySelectorAll(selector) {
+        return this.descendants().filter(element => input.matches[selector].includes(element.node.id));
+    }
+    querySelector(selector) {
+        return this.querySelectorAll(selector)[0] || null;
+    }
+}
+const root = new Element(input.tree);
+const document = {
+    documentElement: root,
+    textContent: null,
+    querySelectorAll: selector => [root, ...root.descendants()].filter(element => input.matches[selector].includes(element.node.id)),
+    querySelector: selector => document.querySelectorAll(selector)[0] || null,
+};
+const extract = new Function("document", "args", "return (function () {" + input.script + "}).apply(null, args);");
+console.log(JSON.stringify(extract(document, input.arguments)));
+"""
+
+def run_in_node(schema, html):
+    soup = BeautifulSoup(html, "html.parser")
+    ids = {}
+
+    def tree(tag):
+        ids[id(tag)] = len(ids)
+        attrs = {name: " ".join(value) if isinstance(value, list) else value for name, value in tag.attrs.items()}
+        return {"id": ids[id(tag)], "attrs": attrs,
+                "children": [tree(child) if isinstance(child, Tag) else str(child) for child in tag.children]}
+
+    arguments = schema.script_arguments()
+    selectors = [arguments[0]] + [field[1] for field in arguments[1]]
+    document = {"tree": tree(soup.html), "script": EXTRACT_SCRIPT, "arguments": arguments,
+                "matches": {selector: [ids[id(tag)] for tag in soup.select(selector)] for selector in selectors if selector}}
+    output = subprocess.run(["node", "-e", DOM_SHIM], input=json.dumps(document), capture_output=True, text=True, check=True).stdout
+    return soup, schema.from_script(json.loads(output))
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_script_matches_extract():
+    for seed in range(10):
+        soup, records = run_in_node(SCHEMA, random_page(seed))
+        assert records == SCHEMA.extract(soup)
+
+    # Without a container the page is the record: its own fields read the root element, not the document node
+    schema = ExtractionSchema(fields={"text": Field(default="NaN"), "lang": Field(attribute="lang", default="NaN"),
+                                      "price": Field(".price span")})
+    soup, records = run_in_node(schema, '<html lang="it"><body><p>Prodotto</p><div class="price"><span>9,99 €</span></div></body></html>')
+    assert records == schema.extract(soup) == [{"text": "Prodotto9,99 €", "lang": "NaN", "price": "9,99 €"}]
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from fetcher import ConcurrentFetcher, HttpFetcher, TokenBucket
+
+PRODUCT = '<html><body><div id="productTitle">Prodotto</div>' + "<p>descrizione</p>" * 200 + "</body></html>"
+
+class StubAdapter(BaseAdapter):
+    """Transport for the fetcher's session: answers from pages and keeps the prepared requests it was sent."""
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        page = self.pages.get(request.url)
+        if isinstance(page, Exception):
+            raise page
+        status, body, content_type = page or (404, "", "text/html")
+        response = requests.Response()
+        response.status_code = status
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers["Content-Type"] = content_type
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+def stubbed(pages, **kwargs):
+    fetcher = HttpFetcher(**kwargs)
+    adapter = StubAdapter(pages)
+    fetcher.session.mount("https://", adapter)
+    return fetcher, adapter
+
+class Work:
+    """Counts calls per item; failures maps an item to the exceptions raised by its first calls."""
+    def __init__(self, failures=None, missing=()):
+        self.failures = {item: list(errors) for item, errors in (failures or {}).items()}
+        self.missing = set(missing)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, item):
+        with self.lock:
+            self.calls[item] += 1
+            errors = self.failures.get(item)
+            if errors:
+                raise errors.pop(0)
+        return None if item in self.missing else {"link": item}
+
+def run(fetcher, items):
+    return {item: (record, error) for item, record, error in fetcher.iter_records(items)}
+
+def test_token_bucket_limits_the_rate_after_the_burst():
+    bucket = TokenBucket(rate=20, burst=2)
+
+    async def acquire(n):
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # Two tokens are available at once, the next four come at 20 per second
+    assert 0.18 <= asyncio.run(acquire(6)) < 1
+
+def test_exceptions_are_retried_until_an_attempt_succeeds():
+    work = Work(failures={"https://a/1": [ConnectionError("reset"), TimeoutError("slow")]})
+    results = run(ConcurrentFetcher(work, retries=2, backoff=0), ["https://a/1"])
+    assert results["https://a/1"] == ({"link": "https://a/1"}, None)
+    assert work.calls["https://a/1"] == 3
+
+def test_last_exception_is_returned_when_every_attempt_fails():
+    work = Work(failures={"https://a/1": [ConnectionError("reset")] * 2 + [TimeoutError("slow")]})
+    record, error = run(ConcurrentFetcher(work, retries=2, backoff=0), ["https://a/1"])["https://a/1"]
+    assert record is None and isinstance(error, TimeoutError)
+    assert work.calls["https://a/1"] == 3
+
+def test_exceptions_are_reported_per_item():
+    items = [f"https://a/{i}" for i in range(6)]
+    work = Work(failures={"https://a/2": [KeyError("price")] * 3})
+    results = run(ConcurrentFetcher(work, retries=1, backoff=0, concurrency=3), items)
+    assert set(results) == set(items)
+    assert isinstance(results["https://a/2"][1], KeyError) and results["https://a/2"][0] is None
+    assert all(results[item] == ({"link": item}, None) for item in items if item != "https://a/2")
+    assert work.calls["https://a/2"] == 2
+
+def test_missing_record_is_not_retried():
+    work = Work(missing={"https://a/1"})
+    start = time.monotonic()
+    record, error = run(ConcurrentFetcher(work, retries=3, backoff=5), ["https://a/1"])["https://a/1"]
+    assert record is None and isinstance(error, ValueError)
+    assert work.calls["https://a/1"] == 1
+    assert time.monotonic() - start < 1
+
+def test_complete_page_is_returned():
+    fetcher, adapter = stubbed({"https://www.amazon.it/dp/B01": (200, PRODUCT, "text/html; charset=utf-8")})
+    assert fetcher.get("https://www.amazon.it/dp/B01", required=("productTitle",)) == PRODUCT
+    assert len(adapter.sent) == 1
+
+@pytest.mark.parametrize("page, required", [
+    ((200, PRODUCT, "text/html"), ("priceblock",)),
+    ((200, '<html><div id="productTitle"></div></html>', "text/html"), ("productTitle",)),
+    ((200, PRODUCT.replace("</body>", '<form action="/errors/validateCaptcha"></form></body>'), "text/html"), ()),
+    ((200, '{"title": "Prodotto"}' + " " * 4096, "application/json"), ()),
+    ((503, PRODUCT, "text/html"), ()),
+    (requests.ConnectionError("reset"), ()),
+])
+def test_incomplete_pages_fall_back_to_the_browser(page, required):
+    fetcher, adapter = stubbed({"https://www.amazon.it/dp/B01": page})
+    assert fetcher.get("https://www.amazon.it/dp/B01", required=required) is None
+    assert len(adapter.sent) == 1
+
+def test_browser_cookies_are_sent_to_their_domain():
+    fetcher, adapter = stubbed({}, user_agent="Mozilla/5.0 HeadlessChrome/120.0")
+    fetcher.sync_cookies([
+        {"name": "session-id", "value": "262-1", "domain": ".amazon.it", "path": "/", "secure": True, "httpOnly": False},
+        {"name": "i18n-prefs", "value": "EUR", "domain": ".amazon.it"},
+        {"name": "tracker", "value": "x", "domain": ".example.com", "path": "/"},
+    ])
+    fetcher.get("https://www.amazon.it/dp/B01")
+    fetcher.get("https://www.example.org/")
+    amazon, other = adapter.sent
+    assert sorted(amazon.headers["Cookie"].split("; ")) == ["i18n-prefs=EUR", "session-id=262-1"]
+    assert amazon.headers["User-Agent"] == "Mozilla/5.0 Chrome/120.0"
+    assert "Cookie" not in other.headers
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+from indexing import SoupIndex, matches, similar
+
+CLASSES = ["card", "deal", "price", "badge", "a-last", "a-size-base"]
+
+def random_page(seed=1, elements=400):
+    rng = random.Random(seed)
+    soup = BeautifulSoup("<html><body></body></html>", "html.parser")
+    parents = [soup.body]
+    for i in range(elements):
+        attrs = {}
+        if rng.random() < 0.7:
+            attrs["class"] = rng.sample(CLASSES, rng.randint(1, 3))
+        if rng.random() < 0.2:
+            attrs["id"] = f"item{rng.randint(0, 20)}"
+        if rng.random() < 0.3:
+            attrs["data-deal-id"] = str(rng.randint(0, 30))
+        if rng.random() < 0.2:
+            attrs["href"] = f"/dp/{rng.randint(0, 10)}"
+        tag = soup.new_tag(rng.choice(["div", "span", "a", "li"]), attrs=attrs)
+        rng.choice(parents[-8:]).append(tag)
+        parents.append(tag)
+    return soup
+
+FILTERS = [
+    {"class": "card"},
+    {"class": "card", "data-deal-id": "3"},
+    {"class": "price", "id": "item4"},
+    {"href": "/dp/2"},
+    {"class": "deal", "href": "/dp/5"},
+    {"class": "missing"},
+    {"data-deal-id": "7", "id": "item1"},
+    {},
+]
+
+def linear(scope, filters):
+    return [element for element in scope.find_all() if all(matches(element, key, value) for key, value in filters.items())]
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_find_all_matches_a_linear_scan(filters):
+    soup = random_page()
+    index = SoupIndex(soup)
+    assert index.find_all(soup, filters) == linear(soup, filters)
+    # Scoped to any element of the tree
+    for scope in soup.find_all(class_="badge")[:20]:
+        assert index.find_all(scope, filters) == linear(scope, filters)
+
+def test_scopes_outside_of_the_tree_are_scanned():
+    index = SoupIndex(random_page(1))
+    other = random_page(2)
+    assert index.find_all(other, {"class": "card"}) == linear(other, {"class": "card"})
+
+SIMILAR_FILTERS = [{"class": "cart"}, {"class": "a-lasts", "data-deal-id": "3"}, {"id": "itemm4"}, {"class": "prise", "href": "/dp/2"}]
+
+@pytest.mark.parametrize("filters", SIMILAR_FILTERS)
+@pytest.mark.parametrize("threshold", [0.2, 0.5])
+def test_find_similar_matches_a_linear_scan(filters, threshold):
+    soup = random_page(3)
+    index = SoupIndex(soup)
+    expected = [element for element in soup.find_all() if all(similar(element, key, value, threshold) for key, value in filters.items())]
+    assert index.find_similar(soup, filters, threshold) == expected
@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+import pytest
+
+from normalize import normalize_records, parse_counts, parse_percentages, parse_prices
+from records import DealRecord, parse_count, parse_percentage, parse_price
+
+CORPUS = [
+    "1.234,56 €", "€ 19,99", "1,234.56", "19,99 €", "1 234 567,8", "1 234,50 €", "1'234.5", "12.345.678",
+    "1.024 valutazioni", "2,5 stelle", "1.,5", "1,,5", "0,99", "7.", "Prezzo: 3.999,00€ (-20%)", "12345678901234567890",
+    "0.1234567890123456789", "-35%", "Sconto del 12,5 %", "1.234,5%", "12.5.3%", "5% 10%", "% 30%", "-%", "10 %",
+    "1.234%", "50%%", "a1.5 b 20%", "30 %", "30 %", "Risparmi 1,234.5%", "١٢%", "٣٤,٥ €", "nessuno", " ",
+    "%", "99,9% di 100%", "1 000", "1  000", "1 0000", "3,\t5%",
+]
+
+ALPHABET = "0123456789" * 3 + ".,.,%%' -€a  \t ١"
+
+def fuzz(count, seed=25):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 24))) for _ in range(count)]
+
+def scalar(parse, values):
+    return [parse(value) for value in values]
+
+def vectorized(column):
+    return [float(value) if valid else None for value, valid in zip(column.values, column.valid)]
+
+@pytest.mark.parametrize("parse_column, parse", [(parse_prices, parse_price), (parse_percentages, parse_percentage),
+                                                 (parse_counts, parse_count)])
+def test_column_parsers_match_the_scalar_ones(parse_column, parse):
+    values = CORPUS + fuzz(5000)
+    assert vectorized(parse_column(values)) == scalar(parse, values)
+
+def test_percentage_follows_the_pattern():
+    assert vectorized(parse_percentages(["1.234,5%", "12.5.3%", "5% 10%", "% 30%"])) == [234.5, 5.3, 5.0, 30.0]
+
+def test_failed_values_are_reported():
+    column = parse_prices(["19,99 €", "NaN", "gratis", None])
+    assert column.failed.tolist() == [2]
+
+def test_normalize_records_matches_deal_records():
+    records = [{"label": f"Deal {i}", "deal_id": str(i) if i % 3 else "NaN", "price": price, "percentage": percentage,
+                "rating": rating, "coupon": "coupon" if i % 2 else "NaN"}
+               for i, (price, percentage, rating) in enumerate(zip(fuzz(300, 1), fuzz(300, 2), fuzz(300, 3)))]
+    batch = normalize_records(records).batch
+    assert list(batch) == [DealRecord.from_dict(record) for record in records]
+    assert np.frombuffer(batch.numeric("price")[1], dtype=np.int8).tolist() == \
+        [int(parse_price(record["price"]) is not None) for record in records]
@@ -0,0 +1,96 @@
+from pagination import Paginator
+from scraper import WebScraper
+from parsing import SoupParser
+
+LISTING = "https://example.com/deals"
+
+class FakeBrowser:
+    """A listing of pages stepped through with a "next" click, and product pages in other tabs."""
+    def __init__(self):
+        self.tabs = {"listing": LISTING}
+        self.tab = "listing"
+        self.opened = 0
+        self.window_handles = ["listing"]
+        self.switch_to = self
+
+    @property
+    def current_url(self):
+        return self.tabs[self.tab]
+
+    @property
+    def current_window_handle(self):
+        return self.tab
+
+    def get(self, url):
+        self.tabs[self.tab] = url
+
+    def next_page(self):
+        page = int(self.current_url.partition("page=")[2] or 0)
+        self.tabs[self.tab] = f"{LISTING}?page={page + 1}"
+
+    def execute_script(self, script):
+        self.opened += 1
+        handle = f"tab{self.opened}"
+        self.tabs[handle] = "about:blank"
+        self.window_handles.append(handle)
+
+    def window(self, handle):
+        self.tab = handle
+
+    def close(self):
+        del self.tabs[self.tab]
+        self.window_handles.remove(self.tab)
+
+    @property
+    def page_source(self):
+        return f"<html><body><p>{self.current_url}</p></body></html>"
+
+def paginator(browser):
+    return Paginator(LISTING, browser.get, browser.next_page, lambda: None, lambda: browser.current_url)
+
+def test_moving_forward_costs_one_transition_per_page():
+    pages = paginator(FakeBrowser())
+    for page in range(5):
+        pages.go_to(page)
+    assert pages.transitions == 5
+
+def test_starts_over_when_the_browser_left_the_listing():
+    browser = FakeBrowser()
+    pages = paginator(browser)
+    pages.go_to(2)
+    browser.get("https://example.com/dp/1")
+    assert pages.lost()
+    pages.go_to(3)
+    assert browser.current_url == f"{LISTING}?page=3"
+    assert pages.transitions == 3 + 4
+
+class NoElements:
+    def invalidate(self):
+        pass
+
+def scraper_on(browser):
+    scraper = WebScraper.__new__(WebScraper)
+    scraper.driver = browser
+    scraper.driver_elements = NoElements()
+    scraper.parser = SoupParser("html.parser")
+    scraper.soup = scraper.soup_index = None
+    scraper.soup_scoped = False
+    scraper.active_resources = None
+    return scraper
+
+def test_new_tab_keeps_the_listing_position_and_soup():
+    browser = FakeBrowser()
+    scraper = scraper_on(browser)
+    pages = paginator(browser)
+    pages.go_to(2)
+    scraper.reset_soup()
+    listing = scraper.soup
+    with scraper.new_tab():
+        browser.get("https://example.com/dp/1")
+        scraper.reset_soup()
+        assert "dp/1" in scraper.soup.get_text()
+    assert not pages.lost()
+    assert scraper.soup is listing and "page=2" in listing.get_text()
+    assert browser.window_handles == ["listing"]
+    pages.go_to(3)
+    assert pages.transitions == 4
@@ -0,0 +1,16 @@
+from extraction import ExtractionSchema, Field
+from parallel import ParallelExtractor
+
+SCHEMA = ExtractionSchema(container=".card", fields={"label": Field(attribute="aria-label"), "price": Field(".price", default="NaN")})
+
+def page(*cards):
+    return "<html><body>" + "".join(f'<div class="card" aria-label="{label}"><span class="price">{price}</span></div>'
+                                    for label, price in cards) + "</body></html>"
+
+def test_pages_are_extracted_in_spawned_workers():
+    with ParallelExtractor(SCHEMA, backend="html.parser", workers=2) as extractor:
+        assert extractor.executor._mp_context.get_start_method() == "spawn"
+        assert len(extractor.executor._processes) == 2
+        assert extractor.extract(page(("Deal", "19,99 €"))) == [{"label": "Deal", "price": "19,99 €"}]
+        pages = [page((f"Deal {i}", f"{i},00 €")) for i in range(5)]
+        assert [records[0]["label"] for records in extractor.extract_many(pages)] == [f"Deal {i}" for i in range(5)]
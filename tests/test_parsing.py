@@ -0,0 +1,37 @@
+import pytest
+
+from extraction import ExtractionSchema, Field, Selector
+from parsing import ScopeStrainer, SoupParser
+
+PAGE = """<html><head><title>Deals</title><script>var x = 1;</script></head><body>
+<nav><a href="/">Home</a></nav>
+<div class="card deal" aria-label="Deal 1"><span class="price">19,99 €</span></div>
+<div class="card deal" aria-label="Deal 2"><span class="price">5,00 €</span></div>
+<ul><li class="a-last"><a href="?page=2">Avanti</a></li></ul>
+</body></html>"""
+
+SCHEMA = ExtractionSchema(container=".card", fields={"label": Field(attribute="aria-label"), "price": Field(".price")})
+
+def test_scoped_parse_keeps_only_the_matching_subtrees():
+    soup = SoupParser("html.parser").parse(PAGE, (".card", ".a-last"))
+    assert [tag.name for tag in soup.find_all(recursive=False)] == ["div", "div", "li"]
+    assert soup.find("nav") is None and soup.find("script") is None
+    assert SCHEMA.extract(soup) == [{"label": "Deal 1", "price": "19,99 €"}, {"label": "Deal 2", "price": "5,00 €"}]
+
+def test_scope_accepts_selector_objects():
+    parser = SoupParser("html.parser")
+    soup = parser.parse(PAGE, (SCHEMA.container, ".a-last"))
+    assert len(soup.select(".card")) == 2 and soup.select_one(".a-last a")["href"] == "?page=2"
+    assert parser.parse(PAGE, (".card", ".a-last")) is soup
+    assert ScopeStrainer((Selector("div.deal"),)).selectors == ("div.deal",)
+
+def test_scope_rejects_descendant_combinators():
+    with pytest.raises(ValueError):
+        ScopeStrainer(("div .price",))
+
+def test_unscoped_parse_is_cached_until_released():
+    parser = SoupParser("html.parser")
+    soup = parser.parse(PAGE)
+    assert parser.parse(PAGE) is soup
+    parser.release(soup)
+    assert parser.parse(PAGE) is not soup
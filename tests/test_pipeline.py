@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from pipeline import Pipeline
+
+def test_items_flow_through_every_stage():
+    pipeline = Pipeline() \
+        .stage("pages", lambda page: [f"{page}-{card}" for card in range(3)], many=True) \
+        .stage("details", lambda card: None if card.endswith("-1") else card.upper(), workers=3) \
+        .stage("save", lambda card: card)
+    assert sorted(pipeline.run(range(4))) == sorted(f"{page}-{card}" for page in range(4) for card in (0, 2))
+    assert pipeline.processed == {"pages": 4, "details": 12, "save": 8}
+
+def test_errors_drop_only_their_item():
+    errors = []
+    def parse(page):
+        if page == 2:
+            raise ValueError("no cards")
+        return page
+    pipeline = Pipeline(on_error=lambda stage, item, error: errors.append((stage, item, str(error)))).stage("parse", parse)
+    assert sorted(pipeline.run(range(4))) == [0, 1, 3]
+    assert pipeline.failed["parse"] == 1 and errors == [("parse", 2, "no cards")]
+
+def test_full_queues_hold_the_input_back():
+    fed = []
+    release = threading.Event()
+    def items():
+        for i in range(20):
+            fed.append(i)
+            yield i
+    def slow(item):
+        release.wait(5)
+        return item
+    pipeline = Pipeline(queue_size=2).stage("slow", slow)
+    thread = threading.Thread(target=lambda: pipeline.run(items()))
+    thread.start()
+    release.wait(0.3)
+    # One item in the worker, two in its queue, one blocked in put
+    assert len(fed) <= 4
+    release.set()
+    thread.join(5)
+    assert len(fed) == 20
+
+def test_a_pipeline_needs_stages():
+    with pytest.raises(ValueError):
+        Pipeline().run([1])
@@ -0,0 +1,66 @@
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from scraper import WebScraperPool, WebScraperUser
+
+class FakeDriver:
+    current_url = "about:blank"
+
+class FakeScraper:
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+        self.page_count = 0
+        self.driver = FakeDriver()
+        self.profile = ""
+        self.quits = 0
+
+    def quit(self):
+        self.quits += 1
+
+@pytest.fixture
+def pool(monkeypatch):
+    started = []
+    def start(self):
+        scraper = FakeScraper()
+        started.append(scraper)
+        with self.lock:
+            self.scrapers.add(scraper)
+        return scraper
+    monkeypatch.setattr(WebScraperPool, "_start", start)
+    pool = WebScraperPool(1)
+    pool.started = started
+    yield pool
+    pool.close()
+
+def test_job_errors_keep_the_scraper(pool):
+    with pytest.raises(KeyError):
+        with pool.session() as scraper:
+            raise KeyError("price")
+    assert pool.checkout() is scraper
+    assert len(pool.started) == 1 and scraper.quits == 0
+
+def test_driver_errors_recycle_the_scraper(pool):
+    with pytest.raises(WebDriverException):
+        with pool.session() as scraper:
+            raise WebDriverException("chrome not reachable")
+    assert scraper.quits == 1
+    assert pool.checkout() is pool.started[1]
+
+def test_submitted_job_errors_reach_the_future(pool):
+    future = pool.submit(lambda scraper: [][0])
+    with pytest.raises(IndexError):
+        future.result(timeout=5)
+    assert len(pool.started) == 1
+
+def test_user_passes_only_scraper_arguments_to_the_pool(monkeypatch):
+    received = {}
+    def init(self, size, *args, **kwargs):
+        received.update(kwargs)
+    monkeypatch.setattr(WebScraperPool, "__init__", init)
+    monkeypatch.setattr(WebScraperPool, "close", lambda self: None)
+    ran = []
+    WebScraperUser(run=ran.append, pool_size=1, scraper_class=FakeScraper, standby=True, replay="archive.zip",
+                   delays=True, log_level=2)
+    assert ran and ran[0].pool is not None
+    # standby is for the main scraper only: pooled scrapers each have their own profile
+    assert received == {"log_level": 2}
@@ -0,0 +1,31 @@
+import pytest
+
+from records import DealBatch, DealRecord
+
+CARDS = [
+    {"deal_id": "a1", "label": "Deal 1", "percentage": "-30%", "link": "/dp/1", "coupon": "NaN"},
+    {"deal_id": "NaN", "deal_label_1": "Sconto del 12,5 %", "label": "Deal 2", "coupon": "badge"},
+]
+DETAILS = [{"price": "1.234,56 €", "rating": "1.024 valutazioni"}, {"price": "NaN", "rating": "NaN", "error": True}]
+
+def test_records_are_parsed_from_extracted_dicts():
+    first, second = (DealRecord.from_dict(card) for card in CARDS)
+    assert first == DealRecord(deal_id="a1", label="Deal 1", link="/dp/1", percentage=30.0)
+    assert second.deal_id is None and second.percentage == 12.5 and second.coupon is True
+    assert first.merge(DETAILS[0]).to_dict() == {"deal_id": "a1", "label": "Deal 1", "link": "/dp/1", "percentage": 30.0,
+                                                  "price": 1234.56, "rating": 1024}
+
+def test_batch_round_trip():
+    batch = DealBatch(CARDS)
+    assert len(batch) == 2
+    assert list(batch) == [DealRecord.from_dict(card) for card in CARDS]
+    assert batch[-1] == batch[1] and batch.column("percentage") == [30.0, 12.5]
+    with pytest.raises(IndexError):
+        batch[2]
+
+def test_batch_merge_matches_record_merge():
+    merged = DealBatch(CARDS).merge(DealBatch(DETAILS))
+    assert list(merged) == [DealRecord.from_dict(card).merge(details) for card, details in zip(CARDS, DETAILS)]
+    assert merged.to_dicts()[1] == {"label": "Deal 2", "percentage": 12.5, "coupon": True, "error": True}
+    with pytest.raises(ValueError):
+        merged.merge(DealBatch(DETAILS[:1]))
@@ -0,0 +1,85 @@
+import pytest
+
+from extraction import ExtractionSchema, Field
+from replay import RecordingWebScraper, ReplayMissError, ReplayWebScraper
+from scraper import WebScraper
+
+LISTING = "https://www.amazon.it/deals"
+CARDS = ExtractionSchema(container=".card", fields={"label": Field(attribute="aria-label"), "link": Field("a", attribute="href")})
+DETAILS = ExtractionSchema(fields={"price": Field(".price span", default="NaN")})
+
+def listing(page):
+    return "<html><body>" + "".join(f'<div class="card" aria-label="Deal {page}-{i}"><a href="/dp/{page}{i}">Vai</a></div>'
+                                    for i in range(3)) + '<li class="a-last">Avanti</li></body></html>'
+
+def product(price):
+    return f'<html><body><div id="productTitle">Prodotto</div><div class="price"><span>{price}</span></div></body></html>'
+
+class FakeBrowser:
+    def __init__(self):
+        self.current_url = None
+        self.page_source = None
+
+    def get(self, url):
+        self.current_url = url
+        self.page_source = listing(1) if url == LISTING else product("7,00 €")
+
+    def next_page(self):
+        self.page_source = listing(2)
+
+    def get_cookies(self):
+        return [{"name": "session-id", "value": "1"}]
+
+    def maximize_window(self):
+        pass
+
+    def execute_cdp_cmd(self, command, arguments):
+        pass
+
+    def quit(self):
+        pass
+
+class FakeDrivers:
+    def start(self, options, standby=False):
+        return FakeBrowser()
+
+class FakeFetcher:
+    """The HTTP path: the first product page is complete, the second one needs the browser."""
+    def get(self, url, required=()):
+        return product("19,99 €") if "/dp/10" in url else None
+
+def test_recorded_pages_are_replayed(tmp_path, monkeypatch):
+    archive = str(tmp_path / "run.zip")
+    monkeypatch.setattr(WebScraper, "http_fetcher", lambda self: FakeFetcher())
+    recorder = RecordingWebScraper(record=archive, headless=False, driver_manager=FakeDrivers(), parser="html.parser")
+    recorder.navigate_to(LISTING)
+    recorded = [recorder.extract(CARDS)]
+    recorder.driver.next_page()
+    recorder.reset_soup()
+    recorded.append(recorder.extract(CARDS))
+    assert recorder.fetch("https://www.amazon.it/dp/10?ref=x", required=("productTitle",))
+    recorded.append(recorder.extract(DETAILS))
+    assert not recorder.fetch("https://www.amazon.it/dp/11", required=("productTitle",))
+    recorded.append(recorder.extract(DETAILS))
+    recorder.quit()
+
+    replay = ReplayWebScraper(replay=archive, parser="lxml")
+    replay.navigate_to(LISTING)
+    replayed = [replay.extract(CARDS, in_browser=True)]
+    replay.click_button(None)
+    replay.reset_soup()
+    replayed.append(replay.extract(CARDS))
+    # Looked up by normalized url, so tracking parameters do not matter
+    assert replay.fetch("https://www.amazon.it/dp/10?ref=y", required=("productTitle",))
+    replayed.append(replay.extract(DETAILS))
+    assert not replay.fetch("https://www.amazon.it/dp/11", required=("productTitle",))
+    replayed.append(replay.extract(DETAILS))
+    assert replayed == recorded
+    assert [records[0] for records in replayed[2:]] == [{"price": "19,99 €"}, {"price": "7,00 €"}]
+    assert replay.page_count == 2
+
+    with pytest.raises(ReplayMissError):
+        replay.navigate_to("https://www.amazon.it/dp/12")
+    with pytest.raises(ReplayMissError):
+        replay.reset_soup()
+    replay.quit()
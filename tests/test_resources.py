@@ -0,0 +1,30 @@
+import re
+
+from resources import TYPE_PATTERNS, resource_policy
+from scraper import WebScraper
+
+def blocked(url, patterns):
+    # Network.setBlockedURLs patterns: "*" is the only wildcard
+    return any(re.fullmatch(re.escape(pattern).replace(r"\*", ".*"), url) for pattern in patterns)
+
+def test_script_patterns_do_not_block_json_or_jsp():
+    patterns = TYPE_PATTERNS["script"]
+    assert blocked("https://m.media-amazon.com/app.js", patterns)
+    assert blocked("https://m.media-amazon.com/app.js?v=3", patterns)
+    assert not blocked("https://www.amazon.it/api/deals.json", patterns)
+    assert not blocked("https://www.amazon.it/page.jsp?id=1", patterns)
+
+def test_scrapers_do_not_change_the_default_options(monkeypatch):
+    monkeypatch.setattr(WebScraper, "_start_driver", lambda self: None)
+    arguments = list(WebScraper.default_options.arguments)
+    prefs = WebScraper.default_options.experimental_options.get("prefs")
+    scraper = WebScraper(headless=True, resources="extraction-only")
+    assert "--headless" in scraper.chrome_options.arguments
+    assert scraper.chrome_options.experimental_options["prefs"]["profile.managed_default_content_settings.images"] == 2
+    assert WebScraper.default_options.arguments == arguments
+    assert WebScraper.default_options.experimental_options.get("prefs") == prefs
+
+def test_presets():
+    assert resource_policy(None).blocked_urls() == []
+    assert "*.css" not in resource_policy("extraction-only").blocked_urls()
+    assert "*.css" in resource_policy("html-only").blocked_urls()
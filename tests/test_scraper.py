@@ -0,0 +1,135 @@
+import pytest
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from parsing import SoupParser
+from scraper import DriverElements, WebScraper, node_paths
+
+class FakeElement:
+    def __init__(self, name):
+        self.name = name
+        self.clicks = 0
+
+    def click(self):
+        self.clicks += 1
+
+    def __repr__(self):
+        return f"FakeElement({self.name!r})"
+
+class FakeDriver:
+    def __init__(self, resolved=None):
+        self.resolved = resolved
+        self.lookups = []
+
+    def find_elements(self, by, value):
+        self.lookups.append(value)
+        return [FakeElement(f"{value}#{len(self.lookups)}")]
+
+    def execute_script(self, script, items):
+        return self.resolved
+
+def scraper_on(driver, soup, scoped=False):
+    scraper = WebScraper.__new__(WebScraper)
+    scraper.driver = driver
+    scraper.driver_elements = DriverElements(driver)
+    scraper.log_level = 0
+    scraper.soup = soup
+    scraper.soup_scoped = scoped
+    return scraper
+
+PAGE = '<ul><li class="a-normal">1</li><li class="a-last" id="next">Avanti</li><li class="a-normal">3</li></ul>'
+
+def test_clicks_drop_the_cached_handles():
+    driver = FakeDriver()
+    scraper = scraper_on(driver, BeautifulSoup(PAGE, "html.parser"), scoped=True)
+    button = scraper.soup.find(class_="a-last")
+    for _ in range(2):
+        element, = scraper.get_web_elements([button])
+        scraper.click_button(element)
+    # The second lookup is a new one: the first handle belongs to the page before the click
+    assert driver.lookups == ["li.a-last#next", "li.a-last#next"]
+
+def test_web_elements_keep_the_order_of_the_parsed_elements():
+    soup = BeautifulSoup(PAGE, "html.parser")
+    first, last, third = soup.find_all("li")
+    resolved_first, resolved_third = FakeElement("first"), FakeElement("third")
+    scraper = scraper_on(FakeDriver(resolved=[resolved_first, None, resolved_third]), soup)
+    webelements = scraper.get_web_elements([first, last, third])
+    assert webelements[0] is resolved_first and webelements[2] is resolved_third
+    assert webelements[1].name == "li.a-last#next#1"
+
+class BrowsingDriver(FakeDriver):
+    def __init__(self):
+        super().__init__()
+        self.current_url = None
+        self.sources = 0
+
+    def get(self, url):
+        self.current_url = url
+
+    @property
+    def page_source(self):
+        self.sources += 1
+        return PAGE
+
+def browsing_scraper():
+    scraper = scraper_on(BrowsingDriver(), None)
+    scraper.parser = SoupParser("html.parser")
+    scraper.soup_index = None
+    scraper.cache = None
+    scraper.resources = scraper.active_resources = object()
+    scraper.page_count = 0
+    return scraper
+
+def test_listings_read_in_the_browser_are_not_parsed():
+    scraper = browsing_scraper()
+    pages = scraper.paginator("https://www.amazon.it/deals", lambda: None, parse=False)
+    pages.go_to(0)
+    pages.go_to(2)
+    assert scraper.driver.sources == 0 and scraper.soup is None and scraper.page_count == 1
+    assert scraper.find_web_elements(".a-last")[0].name == ".a-last#1"
+
+    scraper = browsing_scraper()
+    pages = scraper.paginator("https://www.amazon.it/deals", lambda: None)
+    pages.go_to(0)
+    pages.go_to(2)
+    assert scraper.driver.sources == 2 and scraper.soup.find(class_="a-last").text == "Avanti"
+
+NESTED_PAGE = """<!DOCTYPE html>
+<!-- served by the edge -->
+<html lang="it">
+  <head>
+    <title id="t">Offerte</title>
+    <!-- <meta name="x"> -->
+  </head>
+  <body id="b">
+    <div id="grid">
+      <!-- card 1 -->
+      <div id="c1" class="card">  <a id="l1" href="/dp/1">Vai</a>  </div>
+
+      <div id="c2" class="card"><!-- no link --><span id="s2"> -20% </span>
+        text <b id="b2">bold</b><!-- end -->
+      </div>
+    </div>
+    <ul id="pages"><li id="p1">1</li> <li id="p2" class="a-last">Avanti</li></ul>
+  </body>
+</html>"""
+
+def resolve(html, path):
+    # What RESOLVE_PATHS_SCRIPT does: documentElement.children[i]...children[j], skipping text and comments
+    node = html
+    for index in path:
+        node = [child for child in node.children if isinstance(child, Tag)][index]
+    return node
+
+@pytest.mark.parametrize("parser", ["lxml", "html.parser"])
+def test_node_paths_resolve_to_the_same_elements(parser):
+    soup = BeautifulSoup(NESTED_PAGE, parser)
+    elements = soup.html.find_all(True)
+    paths = node_paths(elements)
+    assert all(resolve(soup.html, path) is element for path, element in zip(paths, elements))
+    # The paths do not depend on the parser
+    assert {element["id"]: path for element, path in zip(elements, paths) if element.has_attr("id")} == {
+        "t": [0, 0], "b": [1], "grid": [1, 0], "c1": [1, 0, 0], "l1": [1, 0, 0, 0], "c2": [1, 0, 1], "s2": [1, 0, 1, 0],
+        "b2": [1, 0, 1, 1], "pages": [1, 1], "p1": [1, 1, 0], "p2": [1, 1, 1],
+    }
@@ -0,0 +1,56 @@
+import json
+import os
+
+from records import DealRecord
+from sinks import JsonLinesSink, SQLiteSink, read_jsonl, segment_paths
+
+
+def test_card_only_record_keeps_stored_details(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "deals.db"))
+    sink.write({"deal_id": "a1", "label": "Deal", "percentage": 30.0, "price": 19.99, "rating": 12})
+    sink.flush()
+    # An unchanged card is saved without its details
+    sink.write({"deal_id": "a1", "label": "Deal", "percentage": 35.0})
+    sink.flush()
+
+    (first_seen, last_seen, data), = sink.connection.execute("SELECT first_seen, last_seen, data FROM deals")
+    assert last_seen >= first_seen
+    assert json.loads(data) == {"deal_id": "a1", "label": "Deal", "percentage": 35.0, "price": 19.99, "rating": 12}
+    observations = sink.connection.execute("SELECT percentage, price FROM observations ORDER BY observed_at").fetchall()
+    assert observations == [(30.0, 19.99), (35.0, None)]
+    sink.close()
+
+
+def deals(start, count):
+    return [{"deal_id": f"d{i:03d}", "label": f"Offerta {i}", "percentage": float(i)} for i in range(start, start + count)]
+
+def test_segments_rotate_at_max_segment_bytes(tmp_path):
+    path = str(tmp_path / "out" / "deals")
+    with JsonLinesSink(path, batch_size=1, max_segment_bytes=200) as sink:
+        sink.write_many(deals(0, 20))
+        sink.flush()
+
+    segments = segment_paths(path)
+    assert [os.path.basename(segment) for segment in segments[:2]] == ["deals.00000.jsonl", "deals.00001.jsonl"]
+    sizes = [os.path.getsize(segment) for segment in segments]
+    line = len(json.dumps(deals(0, 1)[0], ensure_ascii=False)) + 1
+    # A segment is closed by the first write that takes it past the limit
+    assert all(200 <= size < 200 + line for size in sizes[:-1]) and sizes[-1] < 200 + line
+    assert list(read_jsonl(path)) == deals(0, 20)
+
+def test_reopening_drops_a_partial_last_record(tmp_path):
+    path = str(tmp_path / "deals")
+    with JsonLinesSink(path, batch_size=1, max_segment_bytes=300) as sink:
+        sink.write_many(deals(0, 8))
+    last = segment_paths(path)[-1]
+    # A crash in the middle of a write
+    with open(last, "a", encoding="utf-8") as file:
+        file.write('{"deal_id": "d008", "lab')
+    assert list(read_jsonl(path)) == deals(0, 8)
+
+    with JsonLinesSink(path, batch_size=1, max_segment_bytes=300) as sink:
+        sink.write(DealRecord.from_dict(deals(8, 1)[0]))
+    assert segment_paths(path)[-1] == last
+    with open(last, encoding="utf-8") as file:
+        assert all(json.loads(line)["deal_id"] for line in file)
+    assert [record["deal_id"] for record in read_jsonl(path)] == [f"d{i:03d}" for i in range(9)]
@@ -0,0 +1,40 @@
+import pytest
+from selenium.common.exceptions import JavascriptException, StaleElementReferenceException, TimeoutException
+
+from waits import DEFAULT_SCRIPT_TIMEOUT, RESOURCE_BUFFER_SIZE, dom_quiescent, network_idle, wait_for
+
+class FakeDriver:
+    def __init__(self, result=True):
+        self.result = result
+        self.script_timeouts = []
+        self.args = None
+
+    def set_script_timeout(self, timeout):
+        self.script_timeouts.append(timeout)
+
+    def execute_async_script(self, script, *args):
+        self.args = args
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+def test_script_timeout_is_restored():
+    driver = FakeDriver()
+    assert dom_quiescent(300)(driver, 2)
+    assert driver.script_timeouts == [7, DEFAULT_SCRIPT_TIMEOUT]
+
+@pytest.mark.parametrize("error", [TimeoutException("script timeout"), JavascriptException("document unloaded while waiting for result")])
+def test_failed_scripts_are_not_met_and_restore_the_script_timeout(error):
+    driver = FakeDriver(error)
+    assert network_idle(500)(driver, 2) is False
+    assert driver.script_timeouts == [7, DEFAULT_SCRIPT_TIMEOUT]
+
+def test_wait_for_does_not_raise():
+    def condition(driver, timeout):
+        raise StaleElementReferenceException("stale element")
+    assert wait_for(FakeDriver(), condition, 1) is False
+
+def test_network_idle_enlarges_the_resource_buffer():
+    driver = FakeDriver(False)
+    assert not network_idle(500)(driver, 1)
+    assert driver.args == (500, RESOURCE_BUFFER_SIZE, 1000)
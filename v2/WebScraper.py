@@ -1,5 +1,8 @@
-from typing import Callable, List
+from contextlib import contextmanager
+from typing import Callable, List, Sequence, Union
 import os
+import sys
+import copy
 import traceback
 import logging
 import time
@@ -13,7 +16,17 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
-from ChromeDownloader import ChromeDownloader
+# Modules shared with v1 live in the parent folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extraction import ExtractionSchema, EXTRACT_SCRIPT
+from parsing import SoupParser
+from fetcher import HttpFetcher
+from sinks import JsonLinesSink, SQLiteSink
+from pagination import Paginator
+from waits import Condition, wait_for
+from resources import ResourcePolicy, resource_policy
+from driver_manager import DriverManager
+from cache import ResponseCache
 
 Logger = logging.getLogger(__name__)
 
@@ -26,6 +39,7 @@ class WebScraperUser:
     def __init__(self, run:Callable, *args, **kwargs):
         starting_time = time.time()
         Logger.info(f"Starting time {time.strftime('%H:%M:%S', time.gmtime(starting_time))}")
+        self.scraper = None
         try:
             self.scraper = WebScraper(*args, **kwargs)
             run(self.scraper)
@@ -36,14 +50,15 @@ class WebScraperUser:
         finally:
             ending_time = time.time()
             Logger.info(f"Elapsed time: {time.strftime('%H:%M:%S', time.gmtime(ending_time - starting_time))}")
-            self.scraper.quit()
+            if self.scraper is not None:
+                self.scraper.quit()
 
 class WebScraper:
     """
     WebScraper class for scraping websites using Selenium and BeautifulSoup libraries.
     The class is meant to be used as a base class for other classes that will implement the scraping logic.
     The class provides methods for navigating to a website, entering values in inputs, clicking buttons, etc.
-    If chromedriver is not found, it will be downloaded automatically.
+    A chromedriver matching the installed Chrome is downloaded automatically and cached (see driver_manager.py).
     Default options for Chrome are:
         --disable-extensions
         --disable-gpu
@@ -56,6 +71,19 @@ class WebScraper:
     log_level = 0: no logs (default)
     log_level = 1: only errors 
     log_level = 2: errors and info
+
+    parser selects the BeautifulSoup backend ("lxml", "html.parser", "html5lib"), by default the fastest installed.
+    Parsed pages are cached by a hash of their source, so get_soup on an unchanged page does not re-parse it.
+    Listing pages can be parsed scoped to their containers (only=selectors), and a replaced soup is decomposed,
+    so memory stays flat over long runs.
+
+    resources is a ResourcePolicy or a preset name ("none", "extraction-only", "html-only") of resources
+    the browser does not download (see resources.py); navigate_to can override it for a single page.
+
+    driver_manager starts the drivers (by default one DriverManager shared by all scrapers). With standby,
+    a second browser is kept running in the background, so restart() does not wait for a cold start.
+
+    cache is an optional ResponseCache (see cache.py) used by fetch, both over HTTP and for its browser fallback.
     """
     default_options = Options()
     default_options.add_argument("--disable-extensions")
@@ -66,45 +94,174 @@ class WebScraper:
     soup: BeautifulSoup
     
     
-    def __init__(self, chrome_options:Options=default_options, headless:bool=True):
+    def __init__(self, chrome_options:Options=default_options, headless:bool=True, parser:str=None,
+                 resources:Union[str, ResourcePolicy]=None, driver_manager:DriverManager=None, standby:bool=False,
+                 cache:ResponseCache=None):
+        self.parser = SoupParser(parser)
+        self.soup = None
+        self.fetcher = None
+        self.cache = cache
+        self.cookies_synced = False
+        self.resources = resource_policy(resources)
+        self.active_resources = None
+        # The options are changed below, and the default ones are shared by every scraper
+        chrome_options = copy.deepcopy(chrome_options)
         if headless:
             chrome_options.add_argument("--headless")
             Logger.info('Running in headless mode')
+        self.resources.apply_preferences(chrome_options)
 
-        chromedriver_path = os.path.join(os.path.dirname(__file__), 'chrome', 'chromedriver.exe')
-        for i in range(3):
-            try:
-                self.driver = webdriver.Chrome(executable_path=chromedriver_path, options=chrome_options)
-                self.driver.maximize_window()
-                Logger.info('Chrome driver started')
-                #self.localStorageManager = LocalStorageCRUD(driver=self.driver)
-                break
-            except Exception:
-                
-                Logger.info("Chromedriver not found, downloading...")
-                try:
-                    ChromeDownloader().run()
-                    Logger.info("Chromedriver downloaded.")
-                except Exception as e:
-                    Logger.error(f"Error: {e}")
-                    Logger.error("Chromedriver download failed, retrying...")
-
-                if i == 2:
-                    raise Exception("Chromedriver downloading failed. Download manually and retry.")
+        self.chrome_options = chrome_options
+        self.standby = standby
+        self.driver_manager = driver_manager or DriverManager.shared()
+        self._start_driver()
+
+    def _start_driver(self):
+        self.driver = self.driver_manager.start(self.chrome_options, standby=self.standby)
+        self.driver.maximize_window()
+        Logger.info('Chrome driver started')
+        #self.localStorageManager = LocalStorageCRUD(driver=self.driver)
+        self.active_resources = None
+        self._use_resources(self.resources)
+
+    def restart(self):
+        """Quits the browser and continues on a new one, which is already running when standby is set."""
+        self.driver.quit()
+        Logger.info('Chrome driver restarting')
+        self._start_driver()
+        self.cookies_synced = False
     
     def quit(self):
         self.driver.quit()
         Logger.info('Chrome driver stopped')
     
-    def navigate_to(self, url:str):
+    def wait_for(self, condition:Condition, timeout:float=10) -> bool:
+        """
+        Waits until condition (see waits.py: element_present, elements_rendered, dom_quiescent, network_idle, all_of)
+        is met, for at most timeout seconds. Returns False if it was not met in time.
+        """
+        return wait_for(self.driver, condition, timeout)
+
+    def _use_resources(self, policy:ResourcePolicy):
+        if policy is self.active_resources:
+            return
+        try:
+            policy.apply(self.driver)
+            self.active_resources = policy
+        except Exception as e:
+            Logger.error(f"Resource policy not applied: {e}")
+
+    def navigate_to(self, url:str, wait:Condition=None, timeout:float=10, resources:Union[str, ResourcePolicy]=None, cached:bool=False,
+                    only:Sequence[str]=None, parse:bool=True):
+        """
+        Loads url in the browser, optionally waiting for a condition (see wait_for).
+        resources overrides the resource policy for this page only (e.g. "none" for a page that needs its scripts).
+        cached: serve the page from the response cache when it holds a fresh copy, without moving the driver,
+                and store the rendered page otherwise (only for pages that are read, not interacted with)
+        only: parse only the subtrees matching these selectors (see get_soup)
+        parse: False for a page that is only read in the browser (extract(in_browser=True), find_driver_element):
+               its source is neither transferred nor parsed, and the soup is empty until get_soup
+        """
+        if cached and self.cache is not None:
+            entry = self.cache.get(url)
+            if entry is not None and entry.fresh:
+                Logger.info(f'Served {url} from the cache')
+                self._set_soup(self.parser.parse(entry.body, only))
+                return
+
+        self._use_resources(self.resources if resources is None else resource_policy(resources))
         self.driver.get(url)
+        if wait is not None:
+            self.wait_for(wait, timeout)
         Logger.info(f'Navigated to {url}')
-        self.get_soup()
+        self.cookies_synced = False
+        if not parse:
+            self._set_soup(None)
+            return
+        html = self.driver.page_source
+        self._set_soup(self.parser.parse(html, only))
+        if cached and self.cache is not None:
+            self.cache.put(url, html)
+
+    def fetch(self, url:str, required=(), only:Sequence[str]=None) -> bool:
+        """
+        Loads url into the soup with a plain HTTP GET over a pooled session carrying the browser's cookies,
+        falling back to navigate_to when the response looks JS-gated or incomplete.
+        required: substrings a complete page must contain (e.g. the id of the element to scrape)
+        The driver does not move when the HTTP path succeeds.
+        Returns True if the page was served over HTTP.
+        """
+        html = self.http_fetcher().get(url, required)
+        if html is None:
+            Logger.info(f'HTTP fetch of {url} incomplete, using the browser')
+            self.navigate_to(url, cached=True, only=only)
+            return False
+        Logger.info(f'Fetched {url}')
+        self._set_soup(self.parser.parse(html, only))
+        return True
     
-    def get_soup(self):
-        self.soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+    def paginator(self, url:str, next_page:Callable, page_url:Callable=None, only:Sequence[str]=None, parse:bool=True) -> Paginator:
+        """
+        Returns a Paginator over the listing at url, which keeps its position across go_to(page) calls.
+        next_page() must move the browser to the next page; page_url(url, page), if given, builds page urls directly.
+        only: parse the listing pages scoped to these selectors (see get_soup)
+        parse: False when the listing pages are only read in the browser (see navigate_to)
+        """
+        refresh = (lambda: self.get_soup(only)) if parse else (lambda: self._set_soup(None))
+        return Paginator(url, lambda url: self.navigate_to(url, only=only, parse=parse), next_page, refresh,
+                         lambda: self.driver.current_url, page_url)
+
+    @contextmanager
+    def new_tab(self):
+        """
+        Runs the block in a new browser tab, then closes it and returns to the page and soup it left,
+        e.g. to visit a detail page without moving a listing off the position its Paginator keeps.
+        """
+        previous = self.driver.current_window_handle
+        handles = set(self.driver.window_handles)
+        soup = self.soup
+        active_resources = self.active_resources
+        # The soup of the page is kept for when the block is done, instead of being released by the next page
+        self.soup = None
+        self.driver.execute_script("window.open('about:blank')")
+        self.driver.switch_to.window(next(handle for handle in self.driver.window_handles if handle not in handles))
+        # The resource policy is set per tab
+        self.active_resources = None
+        try:
+            yield
+        finally:
+            self._set_soup(soup)
+            self.driver.close()
+            self.driver.switch_to.window(previous)
+            self.active_resources = active_resources
+
+    def http_fetcher(self) -> HttpFetcher:
+        """
+        The pooled HTTP fetcher used by fetch, with the browser's user agent and up to date cookies.
+        Its get() is safe to call from other threads (e.g. a ConcurrentFetcher work function).
+        """
+        if self.fetcher is None:
+            self.fetcher = HttpFetcher(user_agent=self.driver.execute_script("return navigator.userAgent"), cache=self.cache)
+        if not self.cookies_synced:
+            self.fetcher.sync_cookies(self.driver.get_cookies())
+            self.cookies_synced = True
+        return self.fetcher
+
+    def get_soup(self, only:Sequence[str]=None):
+        """
+        Parses the page the browser is on into the soup.
+        only: selectors of the elements to keep (e.g. the card containers): only their subtrees are built,
+              the rest of the page is skipped while parsing (see parsing.ScopeStrainer)
+        The previous soup is decomposed, so elements found in it must not be used after the soup changes.
+        """
+        self._set_soup(self.parser.parse(self.driver.page_source, only))
         return self.soup
 
+    def _set_soup(self, soup):
+        if self.soup is not None and self.soup is not soup:
+            self.parser.release(self.soup)
+        self.soup = soup
+
     def find_driver_element(self, by, value) -> WebElement:
         return self.driver.find_element(filter_by(by), value)
     
@@ -121,8 +278,43 @@ class WebScraper:
             return element.find_all(tag, attrs)
         return self.soup.find_all(tag, attrs)
 
-    def click_driver_element(self, element):
+    def extract(self, schema:ExtractionSchema, element=False, in_browser:bool=False) -> List[dict]:
+        """
+        Extracts the schema records from element (default: the current soup).
+        With in_browser=True the schema runs in the page and only the records come back over the wire
+        (no page_source transfer and no parsing); if the script fails, the soup is refreshed and used instead.
+        """
+        if in_browser and not element:
+            try:
+                records = schema.from_script(self.driver.execute_script(EXTRACT_SCRIPT, *schema.script_arguments()))
+                Logger.info(f"Extracted {len(records)} records in browser")
+                return records
+            except Exception as e:
+                Logger.error(f"Error: {e}")
+                Logger.error("In browser extraction failed, parsing the page")
+                self.get_soup()
+        records = schema.extract(element if element else self.soup)
+        Logger.info(f"Extracted {len(records)} records")
+        return records
+
+    def open_sink(self, file_name:str, **kwargs) -> JsonLinesSink:
+        """
+        Opens a streaming JSON Lines sink in the scraped folder (segments scraped/<file_name>.00000.jsonl, ...).
+        kwargs are passed to JsonLinesSink (batch_size, flush_interval, max_segment_bytes).
+        """
+        return JsonLinesSink(os.path.join(os.getcwd(), 'scraped', file_name), **kwargs)
+
+    def open_store(self, file_name:str, **kwargs) -> SQLiteSink:
+        """
+        Opens a SQLite results store in the scraped folder.
+        kwargs are passed to SQLiteSink (batch_size, key_fields, observed).
+        """
+        return SQLiteSink(os.path.join(os.getcwd(), 'scraped', file_name), **kwargs)
+
+    def click_driver_element(self, element, wait:Condition=None, timeout:float=10):
         element.click()
+        if wait is not None:
+            self.wait_for(wait, timeout)
     
     def enter_value_driver_element(self, element, value, enter=True):
         element.clear()
@@ -1,107 +1,157 @@
 from WebScraper import WebScraper, WebScraperUser
-import time
+from extraction import ExtractionSchema, Field
+from cache import ResponseCache, normalize_url
+from dedup import ChangeTracker, SQLiteDedupStore
+from fetcher import ConcurrentFetcher
+from parallel import ParallelExtractor
+from pipeline import Pipeline
+from normalize import log_failures, normalize_records
+from waits import all_of, dom_quiescent, network_idle
+import os
 import logging
-import json
+import threading
 
 logging.basicConfig(filename='info.log', encoding='utf-8', level=logging.INFO)
 Logger = logging.getLogger(__name__)
 
+DEAL_CARD_SCHEMA = ExtractionSchema(
+    container="div.DealCardDynamic-module__card_byn3MbtqkJHcIi783X3tE",
+    fields={
+        'label': Field(attribute='aria-label', default="NaN"),
+        'link': Field("a.DealCardDynamic-module__linkOutlineOffset_2XU8RDGmNg2HG1E-ESseNq", attribute='href', default="NaN"),
+        'deal_label_1': Field(".BadgeAutomatedLabel-module__badgeAutomatedLabel_2Teem9LTaUlj6gBh5R45wd", default="NaN"),
+        'deal_label_2': Field(".DealMessaging-module__dealMessaging_1EIwT6BUaB6vCKvPVEbAEV", default="NaN"),
+    })
+
+DEAL_DETAILS_SCHEMA = ExtractionSchema(
+    fields={
+        'price': Field("span.a-offscreen", default="NaN"),
+        'coupon': Field("i.newCouponBadge", attribute='class'),
+    })
+
+# Product pages are reused for a few minutes, listings are always loaded again
+CACHE_RULES = [("*/deals*", None), ("*/dp/*", 5 * 60)]
+
+# The next page is loaded once its requests are done and the cards stopped changing
+PAGE_LOADED = all_of(network_idle(300), dom_quiescent(300))
+
 def run(scraper: WebScraper):
-    items = dict()
+    deals_link = "https://www.amazon.it/deals?deals-widget=%257B%2522version%2522%253A1%252C%2522viewIndex%2522%253A0%252C%2522presetId%2522%253A%2522deals-collection-lightning-deals%2522%252C%2522dealType%2522%253A%2522LIGHTNING_DEAL%2522%252C%2522sorting%2522%253A%2522BY_DISCOUNT_ASCENDING%2522%257D"
+
+    def next_page():
+        link_element = scraper.find_driver_element("PARTIAL_LINK_TEXT", 'Avanti')
+        scraper.click_driver_element(link_element, wait=PAGE_LOADED)
+
+    # Keeps the listing position between pages, so page x+1 is one click away from page x.
+    # The cards are extracted in the browser, so the listing pages are not parsed
+    pages = scraper.paginator(deals_link, next_page, parse=False)
 
     def navigate_to_page(x):
         Logger.info(f"Navigating to deals page {x}")
-        deals_link = "https://www.amazon.it/deals?deals-widget=%257B%2522version%2522%253A1%252C%2522viewIndex%2522%253A0%252C%2522presetId%2522%253A%2522deals-collection-lightning-deals%2522%252C%2522dealType%2522%253A%2522LIGHTNING_DEAL%2522%252C%2522sorting%2522%253A%2522BY_DISCOUNT_ASCENDING%2522%257D"
-        scraper.navigate_to(deals_link)
+        pages.go_to(x)
 
         if x == 0:
             Logger.info("Rejecting cookies")
             button = scraper.find_driver_element("ID", "sp-cc-rejectall-link")
             scraper.click_driver_element(button)
-
-        for _ in range(x):
-            link_element = scraper.find_driver_element("PARTIAL_LINK_TEXT", 'Avanti')
-            scraper.click_driver_element(link_element)
-            time.sleep(1)
-        
-        scraper.get_soup()
-    
-
-    def get_text(element):
-        try:
-            return element.text
-        except:
-            return "NaN"
-    
-
-    def get_attr(element, key):
-        try:
-            return element.attrs[key]
-        except:
-            return "NaN"
     
 
     def gather_page_informations(x):
-        navigate_to_page(x)
-        deals_divs = scraper.find_soup_elements("div", {'class':"DealCardDynamic-module__card_byn3MbtqkJHcIi783X3tE"})
-        Logger.info(f"Found {len(deals_divs)} deals divs")
+        with browser:
+            navigate_to_page(x)
+            deals = scraper.extract(DEAL_CARD_SCHEMA, in_browser=True)
+        Logger.info(f"Found {len(deals)} deals divs")
 
         Logger.info("Gathering basic informations")
-        to_gather = []
-        for div in deals_divs:
-            label = get_attr(div, 'aria-label')
-            if label == "Nan":
+        items = []
+        for item in deals:
+            label = item['label']
+            if label == "NaN":
                 continue
 
             label = label [9:]    
-            if label in items:
-                continue
+            # Deals whose card did not change since their details were gathered are saved without them
+            changed = tracker.needs_refresh(label, item)
             
-            item = {
-                'label':label
-            }
-            items[label] = item
-            try:
-                item['link'] = get_attr(scraper.find_soup_element('a', {'class':"DealCardDynamic-module__linkOutlineOffset_2XU8RDGmNg2HG1E-ESseNq"}, div), 'href')
-                item['deal_label_1'] = get_text(scraper.find_soup_element(None, {'class':"BadgeAutomatedLabel-module__badgeAutomatedLabel_2Teem9LTaUlj6gBh5R45wd"}, div))
-                item['deal_label_2'] = get_text(scraper.find_soup_element(None, {'class': "DealMessaging-module__dealMessaging_1EIwT6BUaB6vCKvPVEbAEV"}, div))
-            except Exception as e:
-                Logger.error(f"Error while gathering basic informations [{label}]: {e}")
-                item['error'] = True
-            finally:
-                to_gather.append(label)
+            item['label'] = label
+            items.append((item, changed))
+        return items
 
+    def gather_advanced_informations(cards):
         Logger.info("Gathering advanced informations")
-        for label in to_gather:
-            item = items[label]
-
+        items = [item for item, changed in cards if changed]
+        with browser:
+            http_fetcher = scraper.http_fetcher()
+        def get_advanced_informations(item):
+            html = http_fetcher.get(item['link'], required=("productTitle",))
+            if html is None:
+                return None
+            # Parsed in a worker process while this thread goes on fetching
+            return extractor.submit(html)
+
+        fetcher = ConcurrentFetcher(work=get_advanced_informations, url=lambda item: item['link'])
+        pairs = []
+        failed = []
+        for item, details, error in fetcher.iter_records(items):
+            if error is not None:
+                failed.append(item)
+                continue
             try:
-                Logger.info(f"Navigating to {label}")
-                # Navigate to deal link
-                scraper.navigate_to(item['link'])
-                item['price'] = get_text(scraper.find_soup_element('span', {'class':"a-offscreen"}))
-
-                coupon_badge = scraper.find_soup_element('i', {'class':"newCouponBadge"})
-                if coupon_badge is not None:
-                    item['coupon'] = True #get_text(scraper.find_soup_element('label', None, coupon_badge))
-
+                pairs.append((item, details.result()[0]))
             except Exception as e:
-                Logger.error(f"Error while gathering advanced informations [{label}]: {e}")
-                item['error'] = True
-            finally:
-
-                with open(f"scraped/data_{x}.txt", "a") as f:
-                    print(json.dumps(item, indent= 2), file=f)
-    
+                # A page the worker could not parse is read again through the browser
+                Logger.error(f"Error while extracting advanced informations [{item['label']}]: {e}")
+                failed.append(item)
 
-    for x in range(100):
-        try:
-            gather_page_informations(x)
-        except Exception as e:
-            Logger.error(f"Error while gathering page informations [{x}]: {e}")
+        # The browser only takes over once every HTTP fetch is done, so it never holds them up
+        for item in failed:
+            Logger.info(f"Navigating to {item['label']}")
+            try:
+                # In its own tab, so the listing stays on the page the paginator left it on
+                with browser, scraper.new_tab():
+                    scraper.navigate_to(item['link'], cached=True)
+                    details = scraper.extract(DEAL_DETAILS_SCHEMA)[0]
+            except Exception as e:
+                Logger.error(f"Error while gathering advanced informations [{item['label']}]: {e}")
+                details = {'error': True}
+            pairs.append((item, details))
+        pairs.extend((item, {}) for item, changed in cards if not changed)
+        return pairs
+
+    def normalize_informations(pairs):
+        # The prices and discounts of the whole page are parsed as columns
+        items = [item for item, _ in pairs]
+        details = [details for _, details in pairs]
+        cards, advanced = normalize_records(items), normalize_records(details)
+        log_failures(cards, items)
+        log_failures(advanced, details, labels=[item['label'] for item in items])
+        return items, cards.batch.merge(advanced.batch)
+
+    def save_informations(page):
+        items, batch = page
+        for item, record in zip(items, batch):
+            sink.write(record)
+            store.write(record)
+            if not record.error and record.price is not None:
+                tracker.mark(item['label'], item)
+
+    # The browser is shared by the cards stage and the browser fallback of the details stage
+    browser = threading.Lock()
+    pipeline = Pipeline(queue_size=2) \
+        .stage("cards", gather_page_informations) \
+        .stage("details", gather_advanced_informations) \
+        .stage("normalize", normalize_informations) \
+        .stage("save", save_informations)
+
+    with scraper.open_sink("data") as sink, scraper.open_store("deals.db", key_fields=('label',), observed={'percentage': 'percentage', 'price': 'price'}) as store, \
+            SQLiteDedupStore(os.path.join("scraped", "seen.db"), ttl=24 * 60 * 60) as seen, \
+            ParallelExtractor(DEAL_DETAILS_SCHEMA, backend=scraper.parser.backend) as extractor:
+        tracker = ChangeTracker(seen, fields=('link', 'deal_label_1', 'deal_label_2'), normalize={'link': normalize_url})
+        pipeline.run(range(100))
 
     while True:
         pass
 
 if __name__ == "__main__":
-    user = WebScraperUser(run=run, headless=True)
+    with ResponseCache(os.path.join("scraped", "cache.db"), rules=CACHE_RULES) as cache:
+        user = WebScraperUser(run=run, headless=True, resources="extraction-only", cache=cache)
@@ -0,0 +1,114 @@
+import logging
+import time
+from typing import Callable
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+Logger = logging.getLogger(__name__)
+
+# Script timeout of a new session (seconds)
+DEFAULT_SCRIPT_TIMEOUT = 30
+# Resource timing entries the page keeps while network_idle counts them
+RESOURCE_BUFFER_SIZE = 100000
+
+# A condition is called with (driver, timeout in seconds) and returns True once met, False on timeout
+Condition = Callable[[object, float], bool]
+
+# Resolves once no DOM mutation happened for quietMs, or with false after timeoutMs
+DOM_QUIESCENT_SCRIPT = """
+var quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var quietTimer, deadline;
+var observer = new MutationObserver(function () {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(finish, quietMs, true);
+});
+function finish(result) {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(deadline);
+    done(result);
+}
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+quietTimer = setTimeout(finish, quietMs, true);
+deadline = setTimeout(finish, timeoutMs, false);
+"""
+
+# Resolves once the document is loaded and no resource (including fetch/XHR) completed for idleMs.
+# The resource timing buffer holds 250 entries by default, after which the count stops growing: it is enlarged first.
+NETWORK_IDLE_SCRIPT = """
+var idleMs = arguments[0], bufferSize = arguments[1], timeoutMs = arguments[2], done = arguments[arguments.length - 1];
+var start = Date.now(), idleSince = Date.now(), last = -1;
+performance.setResourceTimingBufferSize(bufferSize);
+(function check() {
+    var count = performance.getEntriesByType('resource').length;
+    if (count !== last || document.readyState !== 'complete') {
+        last = count;
+        idleSince = Date.now();
+    }
+    if (Date.now() - idleSince >= idleMs) {
+        return done(true);
+    }
+    if (Date.now() - start >= timeoutMs) {
+        return done(false);
+    }
+    setTimeout(check, 50);
+})();
+"""
+
+def _until(driver, timeout:float, predicate) -> bool:
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.05).until(predicate)
+        return True
+    except TimeoutException:
+        return False
+
+def _async_script(driver, timeout:float, script:str, *args) -> bool:
+    # Selenium 3 cannot read the current script timeout, so the W3C default is restored
+    timeouts = getattr(driver, "timeouts", None)
+    previous = timeouts.script if timeouts is not None else DEFAULT_SCRIPT_TIMEOUT
+    driver.set_script_timeout(timeout + 5)
+    try:
+        return bool(driver.execute_async_script(script, *args, int(timeout * 1000)))
+    except WebDriverException as e:
+        # e.g. a script timeout, or "document unloaded" when the page navigated while waiting
+        Logger.info(f"Wait script did not complete: {e}")
+        return False
+    finally:
+        driver.set_script_timeout(previous)
+
+def element_present(by, value) -> Condition:
+    """Met once an element matching (by, value) is in the DOM."""
+    return lambda driver, timeout: _until(driver, timeout, expected_conditions.presence_of_element_located((by, value)))
+
+def elements_rendered(css_selector:str, count:int=1) -> Condition:
+    """Met once at least count elements match css_selector (e.g. N deal cards rendered)."""
+    script = "return document.querySelectorAll(arguments[0]).length;"
+    return lambda driver, timeout: _until(driver, timeout, lambda driver: driver.execute_script(script, css_selector) >= count)
+
+def dom_quiescent(quiet_ms:int=300) -> Condition:
+    """Met once the DOM did not change for quiet_ms milliseconds (MutationObserver in the page)."""
+    return lambda driver, timeout: _async_script(driver, timeout, DOM_QUIESCENT_SCRIPT, quiet_ms)
+
+def network_idle(idle_ms:int=500) -> Condition:
+    """Met once the page is loaded and no request completed for idle_ms milliseconds."""
+    return lambda driver, timeout: _async_script(driver, timeout, NETWORK_IDLE_SCRIPT, idle_ms, RESOURCE_BUFFER_SIZE)
+
+def all_of(*conditions:Condition) -> Condition:
+    """Met once every condition is met, in order, within the same overall timeout."""
+    def all_met(driver, timeout):
+        deadline = time.monotonic() + timeout
+        return all(condition(driver, max(0, deadline - time.monotonic())) for condition in conditions)
+    return all_met
+
+def wait_for(driver, condition:Condition, timeout:float=10) -> bool:
+    """Waits for condition, returning False (instead of raising) when it is not met within timeout seconds."""
+    try:
+        met = condition(driver, timeout)
+    except WebDriverException as e:
+        Logger.info(f"Wait condition failed: {e}")
+        met = False
+    if not met:
+        Logger.info(f"Wait condition not met within {timeout}s")
+    return met